@@ -29,7 +29,7 @@ def create_app(config_class=Config):
         return User.query.get(int(user_id))
     
     # Регистрация blueprints
-    from app.routes import main_bp, auth_bp, admin_bp, tokens_bp, vpn_bp, marking_bp, extension_api_bp, wildberries_bp
+    from app.routes import main_bp, auth_bp, admin_bp, tokens_bp, vpn_bp, marking_bp, extension_api_bp, wildberries_bp, jobs_bp, exports_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -39,6 +39,8 @@ def create_app(config_class=Config):
     app.register_blueprint(marking_bp)
     app.register_blueprint(extension_api_bp)
     app.register_blueprint(wildberries_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(exports_bp)
     
     # Создание таблиц базы данных
     with app.app_context():
@@ -7,15 +7,19 @@ from app.models.token import Token
 from app.models.product import Product, Warehouse
 from app.models.wildberries import WBSale, WBOrder, WBIncome, WBIncomeItem, WBStock, WBGood
 from app.models.ozon import OzonStock, OzonSale, OzonOrder, OzonSupplyOrder, OzonSupplyItem
-from app.models.sync import CollectionLog, SyncState
+from app.models.sync import CollectionLog, SyncState, BackgroundJob
 from app.models.vpn import VPNUser
+from app.models.stats import DailyTokenTotal, CurrentStock, WBArticleGroup, OrderStatusCube, RollupCoverage
+from app.models.marking import KizFile, KizCode
 
 __all__ = [
     'db', 'User', 'Token',
     'Product', 'Warehouse',
     'WBSale', 'WBOrder', 'WBIncome', 'WBIncomeItem', 'WBStock', 'WBGood',
     'OzonStock', 'OzonSale', 'OzonOrder', 'OzonSupplyOrder', 'OzonSupplyItem',
-    'CollectionLog', 'SyncState',
-    'VPNUser'
+    'CollectionLog', 'SyncState', 'BackgroundJob',
+    'VPNUser',
+    'DailyTokenTotal', 'CurrentStock', 'WBArticleGroup', 'OrderStatusCube', 'RollupCoverage',
+    'KizFile', 'KizCode'
 ]
 
@@ -0,0 +1,49 @@
+from app.models import db
+from datetime import datetime
+
+
+class KizFile(db.Model):
+    """
+    Модель проиндексированного CSV с кодами маркировки в папке КМ на SMB шаре.
+    Файл переиндексируется, когда меняются его размер или время изменения.
+    """
+    __tablename__ = 'kiz_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(255), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)  # last_write_time на шаре (unix time)
+    codes_count = db.Column(db.Integer, default=0)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('folder', 'file_name', name='uix_kiz_files_folder_file'),
+    )
+
+    def __repr__(self):
+        return f'<KizFile {self.folder}/{self.file_name}>'
+
+
+class KizCode(db.Model):
+    """Модель кода маркировки из проиндексированного файла (строка CSV)"""
+    __tablename__ = 'kiz_codes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('kiz_files.id', ondelete='CASCADE'), nullable=False)
+    folder = db.Column(db.String(255), nullable=False)
+    line_number = db.Column(db.Integer, nullable=False)
+    code = db.Column(db.String(512), nullable=False)
+    gtin = db.Column(db.String(14), nullable=True)  # 14 символов после "01" в начале кода
+
+    file = db.relationship('KizFile', backref=db.backref('codes', lazy=True, passive_deletes=True))
+
+    # Поиск подстроки кода на PostgreSQL - GIN pg_trgm из migrations/migrate_add_kiz_index.py
+    __table_args__ = (
+        db.Index('idx_kiz_codes_gtin_folder', 'gtin', 'folder'),
+        db.Index('idx_kiz_codes_file', 'file_id'),
+    )
+
+    def __repr__(self):
+        return f'<KizCode {self.folder}:{self.line_number}>'
@@ -13,6 +13,9 @@ class OzonStock(db.Model):
 
     # Ozon specific fields
     offer_id = db.Column(db.String(200), nullable=False)
+    # Разобранный offer_id (заполняется коллектором), ключ поиска по артикулу/размеру
+    article = db.Column(db.String(200), nullable=True)
+    size_norm = db.Column(db.String(50), nullable=True)
     product_sku = db.Column(db.BigInteger, nullable=True)
     fbo_present = db.Column(db.Integer, default=0)
     fbo_reserved = db.Column(db.Integer, default=0)
@@ -30,6 +33,7 @@ class OzonStock(db.Model):
         db.Index('idx_ozon_stocks_token_date', 'token_id', 'date'),
         db.Index('idx_ozon_stocks_product', 'product_id'),
         db.Index('idx_ozon_stocks_offer_id', 'offer_id'),
+        db.Index('idx_ozon_stocks_token_article_size', 'token_id', 'article', 'size_norm'),
     )
 
     def __repr__(self):
@@ -118,11 +122,16 @@ class OzonOrder(db.Model):
 
     # Unique identifier (posting can have multiple products, so unique by posting+sku)
     posting_number = db.Column(db.String(200), nullable=False)
+    # ID покупателя - первое число posting_number (заполняется коллектором)
+    buyer_id = db.Column(db.String(50), nullable=True)
     order_id = db.Column(db.BigInteger, nullable=True)
     order_number = db.Column(db.String(200), nullable=True)
 
     # Product info
     offer_id = db.Column(db.String(200), nullable=False)
+    # Разобранный offer_id (заполняется коллектором), ключ поиска по артикулу/размеру
+    article = db.Column(db.String(200), nullable=True)
+    size_norm = db.Column(db.String(50), nullable=True)
     sku = db.Column(db.BigInteger, nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
 
@@ -150,8 +159,11 @@ class OzonOrder(db.Model):
 
     __table_args__ = (
         db.Index('idx_ozon_orders_token_date', 'token_id', 'shipment_date'),
+        db.Index('idx_ozon_orders_token_in_process', 'token_id', 'in_process_at'),
         db.Index('idx_ozon_orders_product', 'product_id'),
         db.Index('idx_ozon_orders_posting', 'posting_number'),
+        db.Index('idx_ozon_orders_token_article_size', 'token_id', 'article', 'size_norm'),
+        db.Index('idx_ozon_orders_buyer_in_process', 'buyer_id', 'in_process_at'),
     )
 
     def __repr__(self):
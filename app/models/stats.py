@@ -0,0 +1,151 @@
+from app.models import db
+from datetime import datetime
+
+
+class DailyTokenTotal(db.Model):
+    """Модель дневных итогов заказов и продаж по токену (rollup для дашборда)"""
+    __tablename__ = 'daily_token_totals'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    orders_count = db.Column(db.Integer, default=0)
+    orders_sum = db.Column(db.Numeric(14, 2), default=0)
+    sales_count = db.Column(db.Integer, default=0)
+    sales_sum = db.Column(db.Numeric(14, 2), default=0)
+    cancellations_count = db.Column(db.Integer, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    token = db.relationship('Token', backref=db.backref('daily_totals', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('token_id', 'day', name='uix_daily_token_totals_token_day'),
+        db.Index('idx_daily_token_totals_day', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyTokenTotal {self.token_id}:{self.day}>'
+
+
+class CurrentStock(db.Model):
+    """
+    Модель актуальных остатков (последний снимок collect_stocks по каждому токену).
+    История остатков по дням остаётся в wb_stocks / ozon_stocks.
+    """
+    __tablename__ = 'current_stock'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False)
+    # WB ссылается на карточку wb_goods, Ozon - на products
+    wb_good_id = db.Column(db.Integer, db.ForeignKey('wb_goods.id'), nullable=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouses.id'), nullable=True)
+
+    # Артикул/размер Ozon (как ozon_stocks.article/size_norm)
+    article = db.Column(db.String(200), nullable=True)
+    size_norm = db.Column(db.String(50), nullable=True)
+
+    quantity = db.Column(db.Integer, default=0)
+    quantity_full = db.Column(db.Integer, nullable=True)
+    reserved = db.Column(db.Integer, nullable=True)
+    in_way_to_client = db.Column(db.Integer, nullable=True)
+    in_way_from_client = db.Column(db.Integer, nullable=True)
+
+    as_of = db.Column(db.DateTime, nullable=False)
+
+    token = db.relationship('Token', backref=db.backref('current_stock', lazy=True))
+
+    __table_args__ = (
+        db.Index('idx_current_stock_token', 'token_id'),
+        db.Index('idx_current_stock_wb_good', 'wb_good_id'),
+        db.Index('idx_current_stock_token_article_size', 'token_id', 'article', 'size_norm'),
+    )
+
+    def __repr__(self):
+        return f'<CurrentStock {self.token_id}:{self.wb_good_id or self.article}>'
+
+
+class WBArticleGroup(db.Model):
+    """
+    Модель группировки артикулов WB для страницы /wildberries/article-grouping:
+    остаток vendor_code по токену с imt_id и "моим артикулом" (первые 4 символа).
+    Пересчитывается коллектором после collect_stocks / collect_goods.
+    """
+    __tablename__ = 'wb_article_groups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    my_article = db.Column(db.String(4), nullable=False)
+    imt_id = db.Column(db.BigInteger, nullable=False)
+    vendor_code = db.Column(db.String(200), nullable=False)
+    stock = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    token = db.relationship('Token', backref=db.backref('wb_article_groups', lazy=True))
+
+    __table_args__ = (
+        db.Index('idx_wb_article_groups_order', 'my_article', 'imt_id', 'vendor_code'),
+        db.Index('idx_wb_article_groups_token', 'token_id'),
+        db.Index('idx_wb_article_groups_vendor_code', 'vendor_code'),
+    )
+
+    def __repr__(self):
+        return f'<WBArticleGroup {self.token_id}:{self.vendor_code}>'
+
+
+class OrderStatusCube(db.Model):
+    """
+    Модель куба статусов заказов: (токен, день, артикул, размер) -> количества и суммы.
+    Для Ozon артикул/размер - ozon_orders.article/size_norm, для WB - supplier_article/tech_size.
+    Пересчитывается вместе с daily_token_totals (datacollector/rollup.py).
+    """
+    __tablename__ = 'order_status_cube'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    article = db.Column(db.String(200), nullable=False, default='')
+    size_norm = db.Column(db.String(50), nullable=False, default='')
+
+    ordered_count = db.Column(db.Integer, default=0)
+    ordered_sum = db.Column(db.Numeric(14, 2), default=0)
+    delivered_count = db.Column(db.Integer, default=0)
+    delivered_sum = db.Column(db.Numeric(14, 2), default=0)
+    cancelled_count = db.Column(db.Integer, default=0)
+    delivering_count = db.Column(db.Integer, default=0)
+
+    token = db.relationship('Token', backref=db.backref('order_status_cube', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('token_id', 'day', 'article', 'size_norm', name='uix_order_status_cube_key'),
+        db.Index('idx_order_status_cube_article', 'article', 'size_norm', 'day'),
+        db.Index('idx_order_status_cube_day', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<OrderStatusCube {self.token_id}:{self.day}:{self.article}/{self.size_norm}>'
+
+
+class RollupCoverage(db.Model):
+    """
+    Модель покрытия rollup токена: daily_token_totals и order_status_cube полны с covered_from.
+    Записывается полной перестройкой (datacollector/rollup.py rebuild_token); дальше
+    дни поддерживают коллекторы. Дни раньше covered_from читаются из сырых таблиц.
+    """
+    __tablename__ = 'rollup_coverage'
+
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False, unique=True)
+    covered_from = db.Column(db.Date, nullable=False)
+    rebuilt_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    token = db.relationship('Token', backref=db.backref('rollup_coverage', lazy=True))
+
+    def __repr__(self):
+        return f'<RollupCoverage {self.token_id}:{self.covered_from}>'
@@ -74,3 +74,53 @@ class ManualTask(db.Model):
 
     def __repr__(self):
         return f'<ManualTask {self.token_id}:{self.task_type} - {self.status}>'
+
+
+class ImportProgress(db.Model):
+    """Модель выполненных единиц работы для возобновляемых импортов"""
+    __tablename__ = 'import_progress'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)  # ozon_finance
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    unit_key = db.Column(db.String(50), nullable=False)  # например, месяц '2024-05'
+    operations_count = db.Column(db.Integer, default=0)
+    saved_count = db.Column(db.Integer, default=0)
+    pages_count = db.Column(db.Integer, default=0)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    token = db.relationship('Token', backref=db.backref('import_progress', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('job', 'token_id', 'unit_key', name='uix_import_progress_unit'),
+    )
+
+    def __repr__(self):
+        return f'<ImportProgress {self.job}:{self.token_id}:{self.unit_key}>'
+
+
+class BackgroundJob(db.Model):
+    """Модель фоновой задачи веб-интерфейса (долгие операции вне HTTP-запроса)"""
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    job_type = db.Column(db.String(50), nullable=False)  # kiz_order, vps_sync, service_status...
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    progress = db.Column(db.Integer, default=0)  # 0-100
+    message = db.Column(db.String(500), nullable=True)
+    params = db.Column(db.Text, nullable=True)  # JSON
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error_message = db.Column(db.Text, nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_background_jobs_status', 'status'),
+        db.Index('idx_background_jobs_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id}:{self.job_type} - {self.status}>'
@@ -10,6 +10,9 @@ class WBSale(db.Model):
     token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
     warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouses.id'), nullable=True)
+    # Карточка размера по штрихкоду продажи (заполняется коллектором)
+    wb_good_id = db.Column(db.Integer, db.ForeignKey('wb_goods.id'), nullable=True)
+    tech_size = db.Column(db.String(50), nullable=True)
 
     date = db.Column(db.DateTime, nullable=False)
     last_change_date = db.Column(db.DateTime, nullable=True)
@@ -33,10 +36,12 @@ class WBSale(db.Model):
     token = db.relationship('Token', backref=db.backref('wb_sales', lazy=True))
     product = db.relationship('Product', backref=db.backref('wb_sales', lazy=True))
     warehouse = db.relationship('Warehouse', backref=db.backref('wb_sales', lazy=True))
+    wb_good = db.relationship('WBGood', backref=db.backref('wb_sales', lazy=True))
 
     __table_args__ = (
         db.Index('idx_wb_sales_token_date', 'token_id', 'date'),
         db.Index('idx_wb_sales_product', 'product_id'),
+        db.Index('idx_wb_sales_token_wb_good', 'token_id', 'wb_good_id'),
         db.Index('idx_wb_sales_srid', 'srid'),
     )
 
@@ -52,6 +57,8 @@ class WBOrder(db.Model):
     token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
     warehouse_id = db.Column(db.Integer, db.ForeignKey('warehouses.id'), nullable=True)
+    # Карточка размера по штрихкоду заказа (заполняется коллектором)
+    wb_good_id = db.Column(db.Integer, db.ForeignKey('wb_goods.id'), nullable=True)
 
     # Основные идентификаторы
     srid = db.Column(db.String(200), nullable=False, unique=True)
@@ -103,10 +110,12 @@ class WBOrder(db.Model):
     token = db.relationship('Token', backref=db.backref('wb_orders', lazy=True))
     product = db.relationship('Product', backref=db.backref('wb_orders', lazy=True))
     warehouse = db.relationship('Warehouse', backref=db.backref('wb_orders', lazy=True))
+    wb_good = db.relationship('WBGood', backref=db.backref('wb_orders', lazy=True))
 
     __table_args__ = (
         db.Index('idx_wb_orders_token_date', 'token_id', 'date'),
         db.Index('idx_wb_orders_product', 'product_id'),
+        db.Index('idx_wb_orders_token_wb_good', 'token_id', 'wb_good_id'),
         db.Index('idx_wb_orders_srid', 'srid'),
     )
 
@@ -224,6 +233,8 @@ class WBGood(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Индексы поиска (text_pattern_ops, pg_trgm) - только PostgreSQL,
+    # создаются migrations/migrate_wb_goods_search_indexes.py
     __table_args__ = (
         db.Index('idx_wb_goods_vendor_code', 'vendor_code'),
     )
@@ -6,6 +6,8 @@ from app.routes.vpn import vpn_bp
 from app.routes.marking import marking_bp
 from app.routes.extension_api import extension_api_bp
 from app.routes.wildberries import wildberries_bp
+from app.routes.jobs import jobs_bp
+from app.routes.exports import exports_bp
 
-__all__ = ['main_bp', 'auth_bp', 'admin_bp', 'tokens_bp', 'vpn_bp', 'marking_bp', 'extension_api_bp', 'wildberries_bp']
+__all__ = ['main_bp', 'auth_bp', 'admin_bp', 'tokens_bp', 'vpn_bp', 'marking_bp', 'extension_api_bp', 'wildberries_bp', 'jobs_bp', 'exports_bp']
 
@@ -6,6 +6,7 @@ import logging
 import time
 from app.models import db, User
 from app.forms import ChangeRoleForm, CreateUserForm
+from app.services.job_runner import job_runner
 
 logger = logging.getLogger(__name__)
 
@@ -162,10 +163,17 @@ ALLOWED_SERVICES = ['datacollector', 'marketplacer']
 @login_required
 @admin_required
 def service_status(service_name):
-    """Получить статус сервиса"""
+    """Запустить проверку статуса сервиса (фоновая задача, ответ - её id)"""
     if service_name not in ALLOWED_SERVICES:
         return jsonify({'error': 'Недопустимый сервис'}), 400
 
+    job_id = job_runner.submit('service_status', {'service_name': service_name}, user_id=current_user.id)
+    return jsonify({'success': True, 'job_id': job_id})
+
+
+@job_runner.register('service_status', max_workers=2)
+def _service_status_job(job, service_name):
+    """Фоновая задача: статус сервиса через systemctl"""
     try:
         result = subprocess.run(
             ['/usr/bin/sudo', '/bin/systemctl', 'status', f'{service_name}.service'],
@@ -173,19 +181,16 @@ def service_status(service_name):
             text=True,
             timeout=10
         )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError('Таймаут при получении статуса')
 
-        is_active = 'active (running)' in result.stdout
+    is_active = 'active (running)' in result.stdout
 
-        return jsonify({
-            'service': service_name,
-            'active': is_active,
-            'status': 'running' if is_active else 'stopped'
-        })
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Таймаут при получении статуса'}), 500
-    except Exception as e:
-        logger.error(f"Ошибка получения статуса {service_name}: {e}")
-        return jsonify({'error': str(e)}), 500
+    return {
+        'service': service_name,
+        'active': is_active,
+        'status': 'running' if is_active else 'stopped'
+    }
 
 
 @admin_bp.route('/service/<service_name>/restart', methods=['POST'])
@@ -214,8 +219,21 @@ def restart_service(service_name):
                 'message': f'Сервис {service_name} будет перезапущен через 1 секунду'
             })
 
-        # Для других сервисов - мягкий перезапуск с таймаутом
+        # Другие сервисы перезапускаются фоновой задачей (остановка может занять несколько секунд)
+        job_id = job_runner.submit('service_restart', {'service_name': service_name}, user_id=current_user.id)
+        return jsonify({'success': True, 'job_id': job_id})
+
+    except Exception as e:
+        logger.error(f"Ошибка перезапуска {service_name}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@job_runner.register('service_restart', max_workers=1)
+def _restart_service_job(job, service_name):
+    """Фоновая задача: мягкий перезапуск сервиса с таймаутом"""
+    try:
         # Сначала пробуем SIGTERM (даём 5 сек на корректное завершение)
+        job.progress(10, 'Остановка (SIGTERM)')
         subprocess.run(
             ['/usr/bin/sudo', '/bin/systemctl', 'kill', '-s', 'SIGTERM', f'{service_name}.service'],
             capture_output=True,
@@ -237,6 +255,7 @@ def restart_service(service_name):
         # Если всё ещё активен - принудительно убиваем
         if check.stdout.strip() == 'active':
             logger.warning(f"Сервис {service_name} не остановился по SIGTERM, используем SIGKILL")
+            job.progress(40, 'Остановка (SIGKILL)')
             subprocess.run(
                 ['/usr/bin/sudo', '/bin/systemctl', 'kill', '-s', 'SIGKILL', f'{service_name}.service'],
                 capture_output=True,
@@ -246,29 +265,20 @@ def restart_service(service_name):
             time.sleep(1)
 
         # Запускаем сервис заново
+        job.progress(70, 'Запуск')
         result = subprocess.run(
             ['/usr/bin/sudo', '/bin/systemctl', 'start', f'{service_name}.service'],
             capture_output=True,
             text=True,
             timeout=10
         )
-
-        if result.returncode == 0:
-            logger.info(f"Сервис {service_name} успешно перезапущен")
-            return jsonify({
-                'success': True,
-                'message': f'Сервис {service_name} успешно перезапущен'
-            })
-        else:
-            logger.error(f"Ошибка перезапуска {service_name}: {result.stderr}")
-            return jsonify({
-                'success': False,
-                'error': result.stderr or 'Неизвестная ошибка'
-            }), 500
-
     except subprocess.TimeoutExpired:
         logger.error(f"Таймаут при перезапуске {service_name}")
-        return jsonify({'error': 'Таймаут при перезапуске сервиса'}), 500
-    except Exception as e:
-        logger.error(f"Ошибка перезапуска {service_name}: {e}")
-        return jsonify({'error': str(e)}), 500
+        raise RuntimeError('Таймаут при перезапуске сервиса')
+
+    if result.returncode != 0:
+        logger.error(f"Ошибка перезапуска {service_name}: {result.stderr}")
+        raise RuntimeError(result.stderr or 'Неизвестная ошибка')
+
+    logger.info(f"Сервис {service_name} успешно перезапущен")
+    return {'message': f'Сервис {service_name} успешно перезапущен'}
@@ -0,0 +1,254 @@
+from flask import Blueprint, request
+from flask_login import login_required
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.models import db, Token, WBOrder, WBSale, WBGood, OzonOrder, CurrentStock, Warehouse
+from app.services.export_service import FORMATS, export_response, stream_rows
+from app.services.order_stats_service import OrderStatsService
+from app.routes.main import get_size_sort_key
+from app.decorators import section_required
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/export')
+
+# Колонки выгрузок: (заголовок, выражение)
+WB_ORDER_COLUMNS = [
+    ('Дата', WBOrder.date),
+    ('Кабинет', Token.name),
+    ('SRID', WBOrder.srid),
+    ('Артикул', WBOrder.supplier_article),
+    ('Размер', WBOrder.tech_size),
+    ('Штрихкод', WBOrder.barcode),
+    ('Артикул WB', WBOrder.nm_id),
+    ('Склад', WBOrder.warehouse_name),
+    ('Регион', WBOrder.region_name),
+    ('Цена', WBOrder.total_price),
+    ('Скидка, %', WBOrder.discount_percent),
+    ('Цена со скидкой', WBOrder.price_with_disc),
+    ('Цена для покупателя', WBOrder.finished_price),
+    ('Отменён', WBOrder.is_cancel),
+    ('Дата отмены', WBOrder.cancel_date),
+]
+
+WB_SALE_COLUMNS = [
+    ('Дата', WBSale.date),
+    ('Кабинет', Token.name),
+    ('SRID', WBSale.srid),
+    ('ID продажи', WBSale.sale_id),
+    ('Артикул', WBGood.vendor_code),
+    ('Размер', WBSale.tech_size),
+    ('Штрихкод', WBGood.barcode),
+    ('Регион', WBSale.region_name),
+    ('Цена', WBSale.total_price),
+    ('Цена со скидкой', WBSale.price_with_disc),
+    ('Цена для покупателя', WBSale.finished_price),
+    ('К перечислению', WBSale.for_pay),
+]
+
+OZON_ORDER_COLUMNS = [
+    ('Дата', OzonOrder.in_process_at),
+    ('Кабинет', Token.name),
+    ('Отправление', OzonOrder.posting_number),
+    ('Артикул продавца', OzonOrder.offer_id),
+    ('Артикул', OzonOrder.article),
+    ('Размер', OzonOrder.size_norm),
+    ('SKU', OzonOrder.sku),
+    ('Количество', OzonOrder.quantity),
+    ('Цена', OzonOrder.price),
+    ('К выплате', OzonOrder.payout),
+    ('Статус', OzonOrder.status),
+    ('Схема', OzonOrder.delivery_schema),
+]
+
+STOCK_COLUMNS = [
+    ('Кабинет', Token.name),
+    ('Маркетплейс', CurrentStock.marketplace),
+    ('Артикул', func.coalesce(CurrentStock.article, WBGood.vendor_code)),
+    ('Размер', func.coalesce(CurrentStock.size_norm, WBGood.tech_size)),
+    ('Штрихкод', WBGood.barcode),
+    ('Склад', Warehouse.name),
+    ('Количество', CurrentStock.quantity),
+    ('Резерв', CurrentStock.reserved),
+    ('В пути к клиенту', CurrentStock.in_way_to_client),
+    ('В пути от клиента', CurrentStock.in_way_from_client),
+    ('На дату', CurrentStock.as_of),
+]
+
+BUYOUT_HEADERS = ['Кабинет', 'Маркетплейс', 'Артикул', 'Размер', 'Заказано', 'Выкуплено',
+                  'Отменено', 'В доставке', '% выкупа', 'Сумма выкупов']
+
+
+def _export_params():
+    """Формат, период и токен выгрузки из query string
+
+    Период по умолчанию - сегодня, пустые date_from и date_to - всё время
+    (как на странице статистики выкупов).
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+
+    today = datetime.now().date()
+    date_from = today
+    date_to = today
+
+    if date_from_str and date_to_str:
+        try:
+            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
+            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    elif date_from_str == '' and date_to_str == '':
+        date_from = None
+        date_to = None
+
+    return fmt, date_from, date_to, request.args.get('token_id', type=int)
+
+
+def _token_ids(marketplace, token_id=None):
+    """Активные токены маркетплейса (или один из них)"""
+    query = db.session.query(Token.id).filter_by(is_active=True, marketplace=marketplace)
+    if token_id:
+        query = query.filter(Token.id == token_id)
+    return [row[0] for row in query.all()]
+
+
+def _period_filters(column, date_from, date_to):
+    """Условия периода по столбцу даты (диапазон, чтобы использовался индекс)"""
+    filters = []
+    if date_from:
+        filters.append(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        filters.append(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return filters
+
+
+def _filename(name, date_from, date_to):
+    if date_from and date_to:
+        return f"{name}_{date_from:%Y-%m-%d}_{date_to:%Y-%m-%d}"
+    return f"{name}_all"
+
+
+def _export_query(fmt, name, sheet_title, columns, query):
+    """Выгрузить строки запроса с колонками columns"""
+    return export_response(
+        fmt, name, [header for header, _ in columns], stream_rows(query), sheet_title
+    )
+
+
+@exports_bp.route('/wb-orders')
+@login_required
+@section_required('statistics')
+def wb_orders():
+    """Заказы WB за период"""
+    fmt, date_from, date_to, token_id = _export_params()
+    query = db.session.query(
+        *[column for _, column in WB_ORDER_COLUMNS]
+    ).join(
+        Token, Token.id == WBOrder.token_id
+    ).filter(
+        WBOrder.token_id.in_(_token_ids('wildberries', token_id)),
+        *_period_filters(WBOrder.date, date_from, date_to)
+    ).order_by(WBOrder.date, WBOrder.id)
+
+    return _export_query(fmt, _filename('wb_orders', date_from, date_to), 'Заказы WB', WB_ORDER_COLUMNS, query)
+
+
+@exports_bp.route('/wb-sales')
+@login_required
+@section_required('statistics')
+def wb_sales():
+    """Продажи WB за период"""
+    fmt, date_from, date_to, token_id = _export_params()
+    query = db.session.query(
+        *[column for _, column in WB_SALE_COLUMNS]
+    ).join(
+        Token, Token.id == WBSale.token_id
+    ).outerjoin(
+        WBGood, WBGood.id == WBSale.wb_good_id
+    ).filter(
+        WBSale.token_id.in_(_token_ids('wildberries', token_id)),
+        *_period_filters(WBSale.date, date_from, date_to)
+    ).order_by(WBSale.date, WBSale.id)
+
+    return _export_query(fmt, _filename('wb_sales', date_from, date_to), 'Продажи WB', WB_SALE_COLUMNS, query)
+
+
+@exports_bp.route('/ozon-orders')
+@login_required
+@section_required('statistics')
+def ozon_orders():
+    """Заказы Ozon за период"""
+    fmt, date_from, date_to, token_id = _export_params()
+    query = db.session.query(
+        *[column for _, column in OZON_ORDER_COLUMNS]
+    ).join(
+        Token, Token.id == OzonOrder.token_id
+    ).filter(
+        OzonOrder.token_id.in_(_token_ids('ozon', token_id)),
+        *_period_filters(OzonOrder.in_process_at, date_from, date_to)
+    ).order_by(OzonOrder.in_process_at, OzonOrder.id)
+
+    return _export_query(fmt, _filename('ozon_orders', date_from, date_to), 'Заказы Ozon', OZON_ORDER_COLUMNS, query)
+
+
+@exports_bp.route('/stocks')
+@login_required
+@section_required('statistics')
+def stocks():
+    """Актуальные остатки (последний снимок current_stock)"""
+    fmt, _, _, token_id = _export_params()
+    token_ids = _token_ids('wildberries', token_id) + _token_ids('ozon', token_id)
+    query = db.session.query(
+        *[column for _, column in STOCK_COLUMNS]
+    ).join(
+        Token, Token.id == CurrentStock.token_id
+    ).outerjoin(
+        WBGood, WBGood.id == CurrentStock.wb_good_id
+    ).outerjoin(
+        Warehouse, Warehouse.id == CurrentStock.warehouse_id
+    ).filter(
+        CurrentStock.token_id.in_(token_ids)
+    ).order_by(CurrentStock.token_id, CurrentStock.id)
+
+    name = f"stocks_{datetime.now():%Y-%m-%d}"
+    return _export_query(fmt, name, 'Остатки', STOCK_COLUMNS, query)
+
+
+@exports_bp.route('/buyouts')
+@login_required
+@section_required('statistics')
+def buyouts():
+    """Выкупы по артикулам и размерам за период (из куба статусов заказов)"""
+    fmt, date_from, date_to, token_id = _export_params()
+    tokens = {
+        token.id: token.name or token.get_marketplace_display()
+        for token in Token.query.filter(
+            Token.is_active.is_(True),
+            Token.marketplace.in_(['wildberries', 'ozon'])
+        ).all()
+        if not token_id or token.id == token_id
+    }
+
+    # Срез куба - одна строка на токен/артикул/размер, его размер не зависит от длины периода
+    stats = OrderStatsService.get_slice(
+        ('token_id', 'marketplace', 'article', 'size_norm'),
+        token_ids=list(tokens.keys()),
+        date_from=date_from,
+        date_to=date_to
+    )
+    keys = sorted(stats.keys(), key=lambda key: (tokens[key[0]], key[2], get_size_sort_key(key[3])))
+
+    def rows():
+        for key in keys:
+            token_id_, marketplace, article, size_norm = key
+            row_stats = stats[key]
+            yield (
+                tokens[token_id_], marketplace, article, size_norm,
+                row_stats['ordered'], row_stats['delivered'], row_stats['cancelled'], row_stats['delivering'],
+                OrderStatsService.buyout_percent(row_stats), row_stats['delivered_sum']
+            )
+
+    return export_response(fmt, _filename('buyouts', date_from, date_to), BUYOUT_HEADERS, rows(), 'Выкупы')
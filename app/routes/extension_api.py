@@ -1,31 +1,21 @@
 """API endpoints для Chrome расширения OZON и WB"""
-from flask import Blueprint, jsonify, request
-from datetime import datetime, timezone
-from app.models import db, Token, OzonOrder, OzonStock
-from app.models.wildberries import WBGood, WBOrder, WBSale, WBStock
+import gzip
+import json
+from flask import Blueprint, jsonify, request, make_response
+from app.models import db, Token, CurrentStock
+from app.models.wildberries import WBGood, WBSale
 from sqlalchemy import func, distinct
+from collections import defaultdict
+from app.services.offer_utils import normalize_size
+from app.services.response_cache import response_cache
+from app.services.order_stats_service import OrderStatsService
 
 extension_api_bp = Blueprint('extension_api', __name__, url_prefix='/api/extension')
 
-
-def normalize_size(size: str) -> str:
-    """Нормализация размера (65 -> 6.5, 75 -> 7.5 и т.д.)"""
-    if not size:
-        return size
-
-    if size.isdigit() and len(size) in [2, 3]:
-        try:
-            num = int(size)
-            # Размеры вида 65, 75, 85, 95 -> 6.5, 7.5, 8.5, 9.5
-            if len(size) == 2 and num % 10 == 5 and num >= 65 and num <= 95:
-                return f"{num // 10}.5"
-            # Размеры вида 105, 115 -> 10.5, 11.5
-            elif len(size) == 3 and num % 10 == 5 and num >= 105 and num <= 115:
-                return f"{num // 10}.5"
-        except ValueError:
-            pass
-
-    return size
+# Максимум товаров в одном пакетном запросе
+BATCH_MAX_ITEMS = 200
+# Ответы меньше этого размера (в байтах) не сжимаются
+GZIP_MIN_SIZE = 1024
 
 
 def get_size_variants(size: str) -> list:
@@ -50,24 +40,106 @@ def get_size_variants(size: str) -> list:
     return list(set(variants))  # убираем дубли
 
 
+def _active_token_ids(marketplace: str) -> list:
+    """ID активных токенов маркетплейса"""
+    return [row[0] for row in db.session.query(Token.id).filter_by(
+        marketplace=marketplace,
+        is_active=True
+    ).all()]
+
+
+def _catalog_version() -> int:
+    """
+    Версия каталога артикулов WB.
+    collect_goods меняет у существующих карточек только imt_id/фото, vendor_code
+    появляются только с новыми строками, поэтому версия = максимальный id в wb_goods.
+    """
+    return db.session.query(func.max(WBGood.id)).scalar() or 0
+
+
+def _front_code(articles: list) -> str:
+    """
+    Компактная запись отсортированного списка: строка на артикул,
+    "<длина общего префикса с предыдущим>:<остаток>"
+    """
+    lines = []
+    previous = ''
+    for article in articles:
+        prefix = 0
+        limit = min(len(previous), len(article))
+        while prefix < limit and previous[prefix] == article[prefix]:
+            prefix += 1
+        lines.append(f"{prefix}:{article[prefix:]}")
+        previous = article
+    return '\n'.join(lines)
+
+
+def _articles_payload(version: int, since: int, compact: bool) -> tuple:
+    """Список артикулов (полный или новые после since) для кэша ответов"""
+    query = db.session.query(
+        distinct(WBGood.vendor_code)
+    ).filter(
+        WBGood.vendor_code.isnot(None),
+        WBGood.vendor_code != ''
+    )
+    if since is not None:
+        query = query.filter(WBGood.id > since)
+
+    articles = sorted(a[0] for a in query.all() if a[0])
+
+    payload = {
+        'success': True,
+        'version': version,
+        'count': len(articles)
+    }
+    if since is not None:
+        payload['since'] = since
+        payload['delta'] = True
+    if compact:
+        payload['encoding'] = 'front-coded'
+        payload['articles'] = _front_code(articles)
+    else:
+        payload['articles'] = articles
+    return payload, 200
+
+
 @extension_api_bp.route('/articles')
 def get_articles():
-    """Получить список всех уникальных артикулов (vendor_code) из WBGood"""
+    """Получить список всех уникальных артикулов (vendor_code) из WBGood
+
+    Query params:
+        since: версия каталога, уже имеющаяся у клиента - вернуть только новые артикулы
+        format: 'compact' - отсортированный список с общими префиксами (см. _front_code)
+
+    Ответ содержит ETag по версии каталога (If-None-Match -> 304) и сжимается gzip.
+    """
+    compact = request.args.get('format') == 'compact'
+    since = request.args.get('since', type=int)
+
     try:
-        articles = db.session.query(
-            distinct(WBGood.vendor_code)
-        ).filter(
-            WBGood.vendor_code.isnot(None),
-            WBGood.vendor_code != ''
-        ).all()
+        version = _catalog_version()
 
-        result = [a[0] for a in articles if a[0]]
+        # Версия клиента новее БД (каталог пересоздан) - отдаём полный список
+        if since is not None and (since < 0 or since > version):
+            since = None
 
-        return jsonify({
-            'success': True,
-            'articles': result,
-            'count': len(result)
-        })
+        payload, status = response_cache.get_or_compute(
+            ('extension_articles', version, since, compact),
+            lambda: _articles_payload(version, since, compact)
+        )
+
+        response = make_response(json.dumps(payload, ensure_ascii=False), status)
+        response.mimetype = 'application/json'
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+
+        body = response.get_data()
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response.set_data(gzip.compress(body))
+            response.headers['Content-Encoding'] = 'gzip'
+
+        response.set_etag(f"articles-{version}-{since if since is not None else 'full'}-{'compact' if compact else 'list'}")
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -75,6 +147,75 @@ def get_articles():
         }), 500
 
 
+def _ozon_products_info(items: list, ozon_token_ids: list) -> list:
+    """
+    Статистика Ozon по парам (артикул, размер) для тултипов.
+    Остатки, заказы и наличие в WBGood считаются сгруппированными запросами
+    сразу по всем артикулам (поиск по индексу token_id, article, size_norm).
+
+    Args:
+        items: [(article, size)]
+
+    Returns:
+        список словарей в порядке items
+    """
+    articles = list({article for article, _ in items})
+
+    # 1. Актуальные остатки: {(article, size_norm): stock}
+    stocks = {
+        (row.article, row.size_norm or ''): int(row.total_stock or 0)
+        for row in db.session.query(
+            CurrentStock.article,
+            CurrentStock.size_norm,
+            func.sum(CurrentStock.quantity).label('total_stock')
+        ).filter(
+            CurrentStock.token_id.in_(ozon_token_ids),
+            CurrentStock.article.in_(articles)
+        ).group_by(CurrentStock.article, CurrentStock.size_norm).all()
+    }
+
+    # 2. Статистика заказов (все статусы) из куба: {(article, size_norm): stats}
+    orders = OrderStatsService.get_slice(
+        ('article', 'size_norm'),
+        token_ids=ozon_token_ids,
+        marketplace='ozon',
+        articles=articles
+    )
+
+    # 3. Размеры этих артикулов в WBGood
+    wb_sizes = defaultdict(set)
+    for vendor_code, tech_size in db.session.query(
+        WBGood.vendor_code, WBGood.tech_size
+    ).filter(WBGood.vendor_code.in_(articles)).all():
+        wb_sizes[vendor_code].add(tech_size)
+
+    result = []
+    for article, size in items:
+        size_norm = normalize_size(size) or ''
+        stats = orders.get((article, size_norm), OrderStatsService.EMPTY)
+
+        if size:
+            product_exists = any(variant in wb_sizes.get(article, ()) for variant in get_size_variants(size))
+        else:
+            product_exists = article in wb_sizes
+
+        result.append({
+            'success': True,
+            'article': article,
+            'size': size,
+            'offer_id': f"{article}/{size}" if size else article,
+            'product_exists': product_exists,
+            'stock': stocks.get((article, size_norm), 0),
+            'orders_total': stats['ordered'],
+            'delivered': stats['delivered'],
+            'cancelled': stats['cancelled'],
+            'delivering': stats['delivering'],
+            'buyout_percent': OrderStatsService.buyout_percent(stats)
+        })
+
+    return result
+
+
 @extension_api_bp.route('/product-info')
 def get_product_info():
     """Получить информацию по товару для тултипа
@@ -93,17 +234,8 @@ def get_product_info():
         }), 400
 
     try:
-        # Формируем варианты offer_id для поиска
-        # В базе может быть: "12345/75", "'12345/75", "12345/7.5" и т.д.
-        offer_id = f"{article}/{size}" if size else article
-        offer_id_with_quote = f"'{article}/{size}" if size else f"'{article}"
-
         # Получаем все активные OZON токены
-        ozon_tokens = Token.query.filter_by(
-            marketplace='ozon',
-            is_active=True
-        ).all()
-        ozon_token_ids = [t.id for t in ozon_tokens]
+        ozon_token_ids = _active_token_ids('ozon')
 
         if not ozon_token_ids:
             return jsonify({
@@ -111,70 +243,98 @@ def get_product_info():
                 'error': 'Нет активных OZON токенов'
             }), 404
 
-        # 1. Остатки на сегодня
-        today = datetime.now(timezone.utc).date()
+        return jsonify(_ozon_products_info([(article, size)], ozon_token_ids)[0])
 
-        # Ищем по offer_id с учётом разных форматов (LIKE для гибкости)
-        # offer_id в базе содержит полный артикул типа "12345/75" или "'12345/75"
-        stock_query = db.session.query(
-            func.sum(OzonStock.fbo_present + OzonStock.fbs_present).label('total_stock')
-        ).filter(
-            OzonStock.token_id.in_(ozon_token_ids),
-            db.or_(
-                OzonStock.offer_id == offer_id,
-                OzonStock.offer_id == offer_id_with_quote,
-                OzonStock.offer_id.like(f"%{article}/{size}") if size else OzonStock.offer_id.like(f"%{article}")
-            ),
-            func.date(OzonStock.date) == today
-        ).first()
-
-        stock = int(stock_query.total_stock or 0) if stock_query and stock_query.total_stock else 0
-
-        # 2. Статистика заказов (все статусы)
-        orders_stats = db.session.query(
-            func.count(OzonOrder.id).label('total'),
-            func.sum(db.case((OzonOrder.status == 'delivered', 1), else_=0)).label('delivered'),
-            func.sum(db.case((OzonOrder.status == 'cancelled', 1), else_=0)).label('cancelled'),
-            func.sum(db.case((OzonOrder.status.in_(['delivering', 'awaiting_deliver', 'awaiting_packaging']), 1), else_=0)).label('delivering')
-        ).filter(
-            OzonOrder.token_id.in_(ozon_token_ids),
-            db.or_(
-                OzonOrder.offer_id == offer_id,
-                OzonOrder.offer_id == offer_id_with_quote,
-                OzonOrder.offer_id.like(f"%{article}/{size}") if size else OzonOrder.offer_id.like(f"%{article}")
-            )
-        ).first()
-
-        total_orders = int(orders_stats.total or 0) if orders_stats else 0
-        delivered = int(orders_stats.delivered or 0) if orders_stats else 0
-        cancelled = int(orders_stats.cancelled or 0) if orders_stats else 0
-        delivering = int(orders_stats.delivering or 0) if orders_stats else 0
-
-        # 3. Процент выкупа
-        buyout_base = delivered + cancelled
-        buyout_percent = round((delivered / buyout_base * 100), 1) if buyout_base > 0 else 0
-
-        # 4. Проверяем существование товара в WBGood
-        size_variants = get_size_variants(size)
-
-        product_exists = db.session.query(WBGood).filter(
-            WBGood.vendor_code == article,
-            WBGood.tech_size.in_(size_variants) if size else True
-        ).first() is not None
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
+
+@extension_api_bp.route('/product-info/batch', methods=['POST'])
+def get_product_info_batch():
+    """Получить информацию по многим товарам одним запросом (для всех карточек страницы)
+
+    JSON body:
+        marketplace: 'ozon' или 'wb'
+        items: [{"article": "...", "size": "..."}] (size для WB не используется)
+
+    Returns:
+        items: ответы в формате /product-info (Ozon) или /wb/product-info (WB);
+        для WB артикулы без карточек возвращаются с success=False
+    """
+    data = request.get_json(silent=True) or {}
+    marketplace = data.get('marketplace', 'ozon')
+    raw_items = data.get('items') or []
+
+    if marketplace not in ('ozon', 'wb'):
         return jsonify({
-            'success': True,
-            'article': article,
-            'size': size,
-            'offer_id': offer_id,
-            'product_exists': product_exists,
-            'stock': stock,
-            'orders_total': total_orders,
-            'delivered': delivered,
-            'cancelled': cancelled,
-            'delivering': delivering,
-            'buyout_percent': buyout_percent
-        })
+            'success': False,
+            'error': 'Неизвестный маркетплейс'
+        }), 400
+
+    if not isinstance(raw_items, list) or len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            'success': False,
+            'error': f'Нужен список items (не более {BATCH_MAX_ITEMS})'
+        }), 400
+
+    # Убираем пустые и повторяющиеся пары, сохраняя порядок
+    items = []
+    seen = set()
+    for item in raw_items:
+        if not isinstance(item, dict):
+            continue
+        article = str(item.get('article') or '').strip()
+        size = str(item.get('size') or '').strip() if marketplace == 'ozon' else ''
+        if article and (article, size) not in seen:
+            seen.add((article, size))
+            items.append((article, size))
+
+    if not items:
+        return jsonify({'success': True, 'items': []})
+
+    try:
+        if marketplace == 'ozon':
+            ozon_token_ids = _active_token_ids('ozon')
+            if not ozon_token_ids:
+                return jsonify({
+                    'success': False,
+                    'error': 'Нет активных OZON токенов'
+                }), 404
+            return jsonify({'success': True, 'items': _ozon_products_info(items, ozon_token_ids)})
+
+        wb_tokens = Token.query.filter_by(
+            marketplace='wildberries',
+            is_active=True
+        ).order_by(Token.id).all()
+        if not wb_tokens:
+            return jsonify({
+                'success': False,
+                'error': 'Нет активных WB токенов'
+            }), 404
+
+        sizes_by_article = _wb_products_info([article for article, _ in items], wb_tokens)
+        token_names = [t.name or f"Токен {t.id}" for t in wb_tokens]
+        result = []
+        for article, _ in items:
+            sizes_data = sizes_by_article.get(article)
+            if sizes_data:
+                result.append({
+                    'success': True,
+                    'article': article,
+                    'sizes': sizes_data,
+                    'token_names': token_names
+                })
+            else:
+                result.append({
+                    'success': False,
+                    'article': article,
+                    'error': 'Товар не найден в базе'
+                })
+
+        return jsonify({'success': True, 'items': result})
 
     except Exception as e:
         return jsonify({
@@ -183,10 +343,98 @@ def get_product_info():
         }), 500
 
 
+def _wb_products_info(articles: list, wb_tokens: list) -> dict:
+    """
+    Статистика WB по артикулам: размеры × токены.
+    Остатки, заказы и продажи считаются тремя сгруппированными запросами
+    сразу по всем артикулам и токенам.
+
+    Returns:
+        {article: [{'size': ..., 'tokens': [...]}]}, артикулы без карточек не попадают
+    """
+    token_ids = [t.id for t in wb_tokens]
+
+    # Все размеры этих артикулов
+    products = WBGood.query.filter(
+        WBGood.vendor_code.in_(articles)
+    ).order_by(WBGood.vendor_code, WBGood.tech_size).all()
+    if not products:
+        return {}
+    product_ids = [p.id for p in products]
+
+    # 1. Актуальные остатки: {(token_id, wb_good_id): (stock, in_way)}
+    stocks = {
+        (row.token_id, row.wb_good_id): (int(row.total_stock or 0), int(row.in_way or 0))
+        for row in db.session.query(
+            CurrentStock.token_id,
+            CurrentStock.wb_good_id,
+            func.sum(CurrentStock.quantity).label('total_stock'),
+            func.sum(CurrentStock.in_way_to_client).label('in_way')
+        ).filter(
+            CurrentStock.token_id.in_(token_ids),
+            CurrentStock.wb_good_id.in_(product_ids)
+        ).group_by(CurrentStock.token_id, CurrentStock.wb_good_id).all()
+    }
+
+    # 2. Заказы по размеру из куба: {(token_id, article, tech_size): stats}
+    orders = OrderStatsService.get_slice(
+        ('token_id', 'article', 'size_norm'),
+        token_ids=token_ids,
+        marketplace='wildberries',
+        articles=articles
+    )
+
+    # 3. Продажи (выкуплено): {(token_id, wb_good_id): delivered}
+    sales = {
+        (row.token_id, row.wb_good_id): int(row.delivered or 0)
+        for row in db.session.query(
+            WBSale.token_id,
+            WBSale.wb_good_id,
+            func.count(WBSale.id).label('delivered')
+        ).filter(
+            WBSale.token_id.in_(token_ids),
+            WBSale.wb_good_id.in_(product_ids)
+        ).group_by(WBSale.token_id, WBSale.wb_good_id).all()
+    }
+
+    result = {}
+    for product in products:
+        tokens_data = []
+        for token in wb_tokens:
+            stock, in_way_to_client = stocks.get((token.id, product.id), (0, 0))
+            order_stats = orders.get((token.id, product.vendor_code, product.tech_size or ''), OrderStatsService.EMPTY)
+            total_orders, cancelled = order_stats['ordered'], order_stats['cancelled']
+            delivered = sales.get((token.id, product.id), 0)
+
+            # Процент выкупа
+            buyout_base = delivered + cancelled
+            buyout_percent = round((delivered / buyout_base * 100), 1) if buyout_base > 0 else 0
+
+            tokens_data.append({
+                'token_id': token.id,
+                'token_name': token.name or f"Токен {token.id}",
+                'stock': stock,
+                'in_way_to_client': in_way_to_client,
+                'orders_total': total_orders,
+                'delivered': delivered,
+                'cancelled': cancelled,
+                'buyout_percent': buyout_percent
+            })
+
+        result.setdefault(product.vendor_code, []).append({
+            'size': product.tech_size or '-',
+            'tokens': tokens_data
+        })
+
+    return result
+
+
 @extension_api_bp.route('/wb/product-info')
 def get_wb_product_info():
     """Получить информацию по товару WB для тултипа (по всем размерам и токенам)
 
+    Ответ кэшируется по артикулу до следующей синхронизации (см. response_cache).
+
     Query params:
         article: артикул (vendor_code / supplier_article)
     """
@@ -198,111 +446,36 @@ def get_wb_product_info():
             'error': 'Не указан артикул'
         }), 400
 
-    try:
+    def compute():
         # Получаем все активные WB токены
         wb_tokens = Token.query.filter_by(
             marketplace='wildberries',
             is_active=True
-        ).all()
+        ).order_by(Token.id).all()
 
         if not wb_tokens:
-            return jsonify({
+            return {
                 'success': False,
                 'error': 'Нет активных WB токенов'
-            }), 404
-
-        today = datetime.now(timezone.utc).date()
+            }, 404
 
-        # Находим все размеры для этого артикула
-        products = WBGood.query.filter(
-            WBGood.vendor_code == article
-        ).order_by(WBGood.tech_size).all()
-
-        if not products:
-            return jsonify({
+        sizes_data = _wb_products_info([article], wb_tokens).get(article)
+        if not sizes_data:
+            return {
                 'success': False,
                 'error': 'Товар не найден в базе'
-            }), 404
-
-        sizes_data = []
-
-        for product in products:
-            size = product.tech_size or '-'
-            product_id = product.id
-
-            tokens_data = []
-
-            for token in wb_tokens:
-                token_id = token.id
-                token_name = token.name or f"Токен {token.id}"
-
-                # 1. Остатки на сегодня
-                stock = 0
-                in_way_to_client = 0
-                stock_query = db.session.query(
-                    func.sum(WBStock.quantity).label('total_stock'),
-                    func.sum(WBStock.in_way_to_client).label('in_way')
-                ).filter(
-                    WBStock.token_id == token_id,
-                    WBStock.product_id == product_id,
-                    func.date(WBStock.date) == today
-                ).first()
-
-                if stock_query:
-                    stock = int(stock_query.total_stock or 0)
-                    in_way_to_client = int(stock_query.in_way or 0)
-
-                # 2. Статистика заказов по размеру
-                orders_query = db.session.query(
-                    func.count(WBOrder.id).label('total'),
-                    func.sum(db.case((WBOrder.is_cancel == True, 1), else_=0)).label('cancelled')
-                ).filter(
-                    WBOrder.token_id == token_id,
-                    WBOrder.supplier_article == article,
-                    WBOrder.tech_size == product.tech_size
-                )
-
-                orders_stats = orders_query.first()
-                total_orders = int(orders_stats.total or 0) if orders_stats else 0
-                cancelled = int(orders_stats.cancelled or 0) if orders_stats else 0
-
-                # 3. Статистика продаж (выкуплено)
-                sales_query = db.session.query(
-                    func.count(WBSale.id).label('delivered')
-                ).filter(
-                    WBSale.token_id == token_id,
-                    WBSale.product_id == product_id
-                )
-
-                sales_stats = sales_query.first()
-                delivered = int(sales_stats.delivered or 0) if sales_stats else 0
-
-                # 4. Процент выкупа
-                buyout_base = delivered + cancelled
-                buyout_percent = round((delivered / buyout_base * 100), 1) if buyout_base > 0 else 0
-
-                tokens_data.append({
-                    'token_id': token_id,
-                    'token_name': token_name,
-                    'stock': stock,
-                    'in_way_to_client': in_way_to_client,
-                    'orders_total': total_orders,
-                    'delivered': delivered,
-                    'cancelled': cancelled,
-                    'buyout_percent': buyout_percent
-                })
+            }, 404
 
-            sizes_data.append({
-                'size': size,
-                'tokens': tokens_data
-            })
-
-        return jsonify({
+        return {
             'success': True,
             'article': article,
             'sizes': sizes_data,
             'token_names': [t.name or f"Токен {t.id}" for t in wb_tokens]
-        })
+        }, 200
+
+    try:
+        payload, status = response_cache.get_or_compute(('extension_wb_product_info', article), compute)
+        return jsonify(payload), status
 
     except Exception as e:
         return jsonify({
@@ -315,6 +488,7 @@ def get_wb_product_info():
 def add_cors_headers(response):
     """Добавляем CORS заголовки для доступа из расширения"""
     response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'ETag'
     return response
@@ -0,0 +1,17 @@
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+from app.services.job_runner import job_runner
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@jobs_bp.route('/<job_id>')
+@login_required
+def job_status(job_id):
+    """Статус, прогресс и результат фоновой задачи (для опроса со страницы)"""
+    job = job_runner.get(job_id)
+    # Чужие задачи видит только администратор
+    if job is None or (job.created_by_id != current_user.id and not current_user.is_admin()):
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+
+    return jsonify({'success': True, 'job': job_runner.to_dict(job)})
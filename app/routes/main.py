@@ -1,17 +1,21 @@
 from flask import Blueprint, render_template, jsonify, request, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timezone, timedelta
-from app.models import Token, OzonOrder, OzonStock, db
-from app.models.wildberries import WBStock, WBGood, WBOrder
-from app.models.product import Product
+from app.models import Token, OzonOrder, CurrentStock, db
+from app.models.wildberries import WBGood
 from app.models.sync import SyncState
 from app.services.sales_service import SalesService
+from app.services.order_stats_service import OrderStatsService
+from app.services.response_cache import response_cache
+from app.services.offer_utils import normalize_size
 from app.decorators import section_required, admin_required
 from sqlalchemy import distinct, func
-from collections import defaultdict
 
 main_bp = Blueprint('main', __name__)
 
+# Покупателей на одной странице списка выкупов
+BUYOUTS_LIST_PER_PAGE = 50
+
 
 @main_bp.route('/')
 def index():
@@ -54,6 +58,11 @@ def index():
     return render_template('index.html')
 
 
+def _is_active_token(token_id: int) -> bool:
+    """Проверить, что токен существует и активен"""
+    return db.session.query(Token.id).filter_by(id=token_id, is_active=True).first() is not None
+
+
 @main_bp.route('/api/orders/<int:token_id>')
 @login_required
 def get_token_orders(token_id):
@@ -62,17 +71,19 @@ def get_token_orders(token_id):
     if not current_user.has_access_to('dashboard'):
         return jsonify({'success': False, 'error': 'Нет доступа'}), 403
 
-    # Проверяем, что токен существует и активен
-    token = Token.query.filter_by(id=token_id, is_active=True).first()
+    def compute():
+        # Проверяем, что токен существует и активен
+        if not _is_active_token(token_id):
+            return {'success': False, 'error': 'Токен не найден или неактивен'}, 404
 
-    if not token:
-        return jsonify({'success': False, 'error': 'Токен не найден или неактивен'}), 404
+        # Получаем данные о заказах из базы данных
+        # Для WB берем из wb_orders, для Ozon - из ozon_orders
+        return SalesService.get_today_orders_by_token(token_id), 200
 
-    # Получаем данные о заказах из базы данных
-    # Для WB берем из wb_orders, для Ozon - из ozon_sales
-    orders_info = SalesService.get_today_orders_by_token(token_id)
-
-    return jsonify(orders_info)
+    payload, status = response_cache.get_or_compute(
+        ('orders', token_id, datetime.now().date()), compute
+    )
+    return jsonify(payload), status
 
 
 @main_bp.route('/api/sales/<int:token_id>')
@@ -83,16 +94,18 @@ def get_token_sales(token_id):
     if not current_user.has_access_to('dashboard'):
         return jsonify({'success': False, 'error': 'Нет доступа'}), 403
 
-    # Проверяем, что токен существует и активен
-    token = Token.query.filter_by(id=token_id, is_active=True).first()
+    def compute():
+        # Проверяем, что токен существует и активен
+        if not _is_active_token(token_id):
+            return {'success': False, 'error': 'Токен не найден или неактивен'}, 404
 
-    if not token:
-        return jsonify({'success': False, 'error': 'Токен не найден или неактивен'}), 404
+        # Получаем данные о продажах из базы данных
+        return SalesService.get_today_sales_by_token(token_id), 200
 
-    # Получаем данные о продажах из базы данных
-    sales_info = SalesService.get_today_sales_by_token(token_id)
-
-    return jsonify(sales_info)
+    payload, status = response_cache.get_or_compute(
+        ('sales', token_id, datetime.now().date()), compute
+    )
+    return jsonify(payload), status
 
 
 @main_bp.route('/dashboard')
@@ -109,51 +122,6 @@ def profile():
     return render_template('profile.html')
 
 
-def parse_offer_id(offer_id: str) -> tuple:
-    """Парсинг offer_id для извлечения артикула и размера"""
-    if not offer_id:
-        return '', ''
-
-    # Убираем лишние символы в начале (например, ')
-    offer_id = offer_id.lstrip("'\"")
-
-    # Обычно offer_id имеет формат "артикул/размер" или "артикул_размер"
-    if '/' in offer_id:
-        parts = offer_id.split('/')
-        article = parts[0]
-        size = parts[1] if len(parts) > 1 else ''
-    elif '_' in offer_id:
-        parts = offer_id.split('_')
-        article = parts[0]
-        size = parts[1] if len(parts) > 1 else ''
-    else:
-        article = offer_id
-        size = ''
-
-    return article, size
-
-
-def normalize_size(size: str) -> str:
-    """Нормализация размера для использования как ключ (65 -> 6.5, 75 -> 7.5 и т.д.)"""
-    if not size:
-        return size
-
-    # Преобразуем числовые размеры вида 65, 75, 85, 95, 105, 115 в формат с точкой
-    if size.isdigit() and len(size) in [2, 3]:
-        try:
-            num = int(size)
-            # Размеры вида 65, 75, 85, 95
-            if len(size) == 2 and num % 10 == 5 and num >= 65 and num <= 95:
-                return f"{num // 10}.5"
-            # Размеры вида 105, 115
-            elif len(size) == 3 and num % 10 == 5 and num >= 105 and num <= 115:
-                return f"{num // 10}.5"
-        except ValueError:
-            pass
-
-    return size
-
-
 def parse_size_display(size: str) -> str:
     """Преобразование размера для отображения (например, 65 -> 6.5)"""
     if not size:
@@ -291,155 +259,109 @@ def buyouts():
 
     # Получаем данные Ozon
     if ozon_token_ids:
-        # Получаем остатки на сегодня (только ненулевые)
+        # Актуальные остатки (только ненулевые) - последний снимок из current_stock
         stocks = db.session.query(
-            OzonStock.offer_id,
-            func.sum(OzonStock.fbo_present + OzonStock.fbs_present).label('total_stock')
+            CurrentStock.article,
+            CurrentStock.size_norm,
+            func.sum(CurrentStock.quantity).label('total_stock')
         ).filter(
-            OzonStock.token_id.in_(ozon_token_ids),
-            func.date(OzonStock.date) == today
-        ).group_by(OzonStock.offer_id).having(
-            func.sum(OzonStock.fbo_present + OzonStock.fbs_present) > 0
+            CurrentStock.token_id.in_(ozon_token_ids),
+            CurrentStock.article.isnot(None),
+            CurrentStock.article != ''
+        ).group_by(CurrentStock.article, CurrentStock.size_norm).having(
+            func.sum(CurrentStock.quantity) > 0
         ).all()
 
         # Добавляем остатки в статистику
         for stock in stocks:
-            article, size = parse_offer_id(stock.offer_id)
-            if not article:
-                continue
-            # Нормализуем размер для единообразия ключей (75 -> 7.5)
-            size = normalize_size(size)
-            key = (article, size)
+            key = (stock.article, stock.size_norm or '')
             if key not in all_products_stats:
                 all_products_stats[key] = {'ozon_delivered': 0, 'ozon_cancelled': 0, 'ozon_stock': 0}
-            all_products_stats[key]['ozon_stock'] = int(stock.total_stock or 0)
-
-        # Строим запрос с учётом фильтрации по датам
-        query = db.session.query(
-            OzonOrder.offer_id,
-            OzonOrder.status
-        ).filter(
-            OzonOrder.token_id.in_(ozon_token_ids),
-            OzonOrder.status.in_(['cancelled', 'delivered', 'delivering'])
+            all_products_stats[key]['ozon_stock'] += int(stock.total_stock or 0)
+
+        # Выкупы и отмены из куба статусов заказов: одна строка на артикул/размер
+        orders = OrderStatsService.get_slice(
+            ('article', 'size_norm'),
+            token_ids=ozon_token_ids,
+            marketplace='ozon',
+            date_from=date_from,
+            date_to=date_to
         )
 
-        # Если указаны даты, добавляем фильтр по дате
-        if date_from and date_to:
-            from datetime import timedelta
-            query = query.filter(
-                OzonOrder.in_process_at >= date_from,
-                OzonOrder.in_process_at < date_to + timedelta(days=1)
-            )
-
-        orders = query.all()
-
         # Добавляем заказы в статистику
-        for order in orders:
-            article, size = parse_offer_id(order.offer_id)
+        for (article, size_norm), stats in orders.items():
             if not article:
                 continue
-
-            # Нормализуем размер для единообразия ключей (75 -> 7.5)
-            size = normalize_size(size)
-            key = (article, size)
+            key = (article, size_norm)
             if key not in all_products_stats:
                 all_products_stats[key] = {'ozon_delivered': 0, 'ozon_cancelled': 0, 'ozon_stock': 0}
 
-            if order.status == 'delivered':
-                all_products_stats[key]['ozon_delivered'] += 1
-            elif order.status == 'cancelled':
-                all_products_stats[key]['ozon_cancelled'] += 1
-
-    # Получаем остатки WB для каждого токена
-    wb_stocks_by_token = {}  # {token_id: {'name': ..., 'stocks': {key: qty}, 'orders': {key: {...}}}}
-    wb_token_ids = [t['id'] for t in wb_tokens]
+            all_products_stats[key]['ozon_delivered'] += stats['delivered']
+            all_products_stats[key]['ozon_cancelled'] += stats['cancelled']
 
-    for wb_token in wb_tokens:
-        token_id = wb_token['id']
-        token_name = wb_token['name']
+    # Получаем остатки и заказы WB сразу по всем токенам (группировка по token_id)
+    # {token_id: {'name': ..., 'stocks': {key: qty}, 'orders': {key: {...}}}}
+    wb_stocks_by_token = {
+        wb_token['id']: {'name': wb_token['name'], 'stocks': {}, 'orders': {}}
+        for wb_token in wb_tokens
+    }
+    wb_token_ids = list(wb_stocks_by_token.keys())
 
-        # Получаем остатки на сегодня для данного токена
+    if wb_token_ids:
+        # Актуальные остатки
         stocks = db.session.query(
+            CurrentStock.token_id,
             WBGood.vendor_code,
             WBGood.tech_size,
-            func.sum(WBStock.quantity).label('total_quantity')
+            func.sum(CurrentStock.quantity).label('total_quantity')
         ).join(
-            WBStock, WBStock.product_id == WBGood.id
+            CurrentStock, CurrentStock.wb_good_id == WBGood.id
         ).filter(
-            WBStock.token_id == token_id,
-            func.date(WBStock.date) == today
+            CurrentStock.token_id.in_(wb_token_ids)
         ).group_by(
+            CurrentStock.token_id,
             WBGood.vendor_code,
             WBGood.tech_size
         ).having(
-            func.sum(WBStock.quantity) > 0
+            func.sum(CurrentStock.quantity) > 0
         ).all()
 
-        # Формируем словарь остатков для этого токена
-        token_stocks = {}
         for stock in stocks:
             if stock.vendor_code:
                 key = f"{stock.vendor_code}|{stock.tech_size or ''}"
-                token_stocks[key] = int(stock.total_quantity or 0)
+                wb_stocks_by_token[stock.token_id]['stocks'][key] = int(stock.total_quantity or 0)
                 # Добавляем в общий список артикулов
                 product_key = (stock.vendor_code, stock.tech_size or '')
                 if product_key not in all_products_stats:
                     all_products_stats[product_key] = {'ozon_delivered': 0, 'ozon_cancelled': 0, 'ozon_stock': 0}
 
-        # Получаем статистику заказов для данного токена
-        orders_query = db.session.query(
-            WBGood.vendor_code,
-            WBGood.tech_size,
-            func.count(WBOrder.id).label('total_orders'),
-            func.sum(db.case((WBOrder.is_cancel == False, 1), else_=0)).label('delivered'),
-            func.sum(db.case((WBOrder.is_cancel == True, 1), else_=0)).label('cancelled')
-        ).select_from(WBOrder).join(
-            Product, WBOrder.product_id == Product.id
-        ).join(
-            WBGood, Product.barcode == WBGood.barcode
-        ).filter(
-            WBOrder.token_id == token_id
+        # Статистика заказов из куба статусов (выкуп WB - заказ без отмены)
+        orders_stats = OrderStatsService.get_slice(
+            ('token_id', 'article', 'size_norm'),
+            token_ids=wb_token_ids,
+            marketplace='wildberries',
+            date_from=date_from,
+            date_to=date_to
         )
 
-        # Если указаны даты, добавляем фильтр по дате
-        if date_from and date_to:
-            from datetime import timedelta as td
-            orders_query = orders_query.filter(
-                WBOrder.date >= date_from,
-                WBOrder.date < date_to + td(days=1)
-            )
-
-        orders_stats = orders_query.group_by(
-            WBGood.vendor_code,
-            WBGood.tech_size
-        ).all()
-
-        # Формируем словарь статистики заказов для этого токена
-        token_orders = {}
-        for stat in orders_stats:
-            if stat.vendor_code:
-                key = f"{stat.vendor_code}|{stat.tech_size or ''}"
-                total = int(stat.total_orders or 0)
-                delivered = int(stat.delivered or 0)
-                cancelled = int(stat.cancelled or 0)
+        for (token_id, vendor_code, tech_size), stats in orders_stats.items():
+            if vendor_code:
+                key = f"{vendor_code}|{tech_size}"
+                total = stats['ordered']
+                delivered = stats['delivered']
+                cancelled = stats['cancelled']
                 percent = (delivered / total * 100) if total > 0 else 0
-                token_orders[key] = {
+                wb_stocks_by_token[token_id]['orders'][key] = {
                     'total': total,
                     'delivered': delivered,
                     'cancelled': cancelled,
                     'percent': round(percent, 1)
                 }
                 # Добавляем в общий список артикулов
-                product_key = (stat.vendor_code, stat.tech_size or '')
+                product_key = (vendor_code, tech_size)
                 if product_key not in all_products_stats:
                     all_products_stats[product_key] = {'ozon_delivered': 0, 'ozon_cancelled': 0, 'ozon_stock': 0}
 
-        wb_stocks_by_token[token_id] = {
-            'name': token_name,
-            'stocks': token_stocks,
-            'orders': token_orders
-        }
-
     # Сортируем все артикулы и формируем итоговый список
     sorted_keys = sorted(all_products_stats.keys(), key=lambda x: (x[0], get_size_sort_key(x[1])))
 
@@ -523,16 +445,8 @@ def get_token_sales_range(token_id):
     return jsonify(sales_info)
 
 
-@main_bp.route('/api/sync/last-update')
-@login_required
-def get_last_sync_time():
-    """API endpoint для получения времени последней синхронизации данных.
-
-    Возвращает самое старое время синхронизации среди:
-    - WB orders, WB sales
-    - Ozon orders, Ozon sales
-    """
-    # Получаем все активные токены WB и Ozon
+def _get_last_sync():
+    """Самое старое время успешной синхронизации заказов и продаж среди активных токенов"""
     token_ids = db.session.query(Token.id).filter(
         Token.is_active == True,
         Token.marketplace.in_(['wildberries', 'ozon'])
@@ -540,27 +454,82 @@ def get_last_sync_time():
     token_ids = [t[0] for t in token_ids]
 
     if not token_ids:
-        return jsonify({'success': False, 'last_sync': None})
+        return None
 
     # Ищем самую старую успешную синхронизацию среди всех endpoints
     # WB: orders, sales; Ozon: ozon_orders, ozon_sales
     endpoints = ['orders', 'sales', 'ozon_orders', 'ozon_sales']
 
-    last_sync = db.session.query(
+    return db.session.query(
         func.min(SyncState.last_successful_sync)
     ).filter(
         SyncState.token_id.in_(token_ids),
         SyncState.endpoint.in_(endpoints)
     ).scalar()
 
-    if last_sync:
-        return jsonify({
-            'success': True,
-            'last_sync': last_sync.strftime('%H:%M:%S'),
-            'last_sync_full': last_sync.strftime('%d.%m.%Y %H:%M:%S')
-        })
 
-    return jsonify({'success': False, 'last_sync': None})
+@main_bp.route('/api/sync/last-update')
+@login_required
+def get_last_sync_time():
+    """API endpoint для получения времени последней синхронизации данных.
+
+    Возвращает самое старое время синхронизации среди:
+    - WB orders, WB sales
+    - Ozon orders, Ozon sales
+    """
+    def compute():
+        last_sync = _get_last_sync()
+
+        if last_sync:
+            return {
+                'success': True,
+                'last_sync': last_sync.strftime('%H:%M:%S'),
+                'last_sync_full': last_sync.strftime('%d.%m.%Y %H:%M:%S')
+            }, 200
+
+        return {'success': False, 'last_sync': None}, 200
+
+    payload, status = response_cache.get_or_compute(('last_sync',), compute)
+    return jsonify(payload), status
+
+
+@main_bp.route('/api/summary')
+@login_required
+def get_summary():
+    """API endpoint для главной страницы: заказы и продажи по всем токенам одним запросом.
+
+    Без параметров возвращает данные за сегодня, с date_from/date_to - за период.
+    """
+    if not current_user.has_access_to('dashboard'):
+        return jsonify({'success': False, 'error': 'Нет доступа'}), 403
+
+    date_from_str = request.args.get('date_from')
+    date_to_str = request.args.get('date_to')
+
+    date_from = None
+    date_to = None
+    if date_from_str or date_to_str:
+        if not date_from_str or not date_to_str:
+            return jsonify({'success': False, 'error': 'Не указаны параметры date_from и date_to'}), 400
+        try:
+            # Парсим даты в формате YYYY-MM-DD
+            date_from = datetime.strptime(date_from_str, '%Y-%m-%d')
+            date_to = datetime.strptime(date_to_str, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}), 400
+
+    def compute():
+        summary = SalesService.get_summary(date_from, date_to)
+
+        last_sync = _get_last_sync()
+        summary['last_sync'] = last_sync.strftime('%H:%M:%S') if last_sync else None
+        summary['last_sync_full'] = last_sync.strftime('%d.%m.%Y %H:%M:%S') if last_sync else None
+        return summary, 200
+
+    payload, status = response_cache.get_or_compute(
+        ('summary', date_from_str, date_to_str, datetime.now().date()), compute
+    )
+    return jsonify(payload), status
 
 
 @main_bp.route('/api/stocks/refresh', methods=['POST'])
@@ -599,20 +568,6 @@ def refresh_all_stocks():
     })
 
 
-def extract_buyer_id(posting_number: str) -> str:
-    """Извлечение ID покупателя из posting_number.
-
-    posting_number имеет формат число-число-число.
-    Первое число - это идентификатор покупателя.
-    """
-    if not posting_number:
-        return ''
-    parts = posting_number.split('-')
-    if len(parts) >= 1:
-        return parts[0]
-    return ''
-
-
 @main_bp.route('/api/events/feed')
 @login_required
 @admin_required
@@ -623,21 +578,24 @@ def get_events_feed():
     # Ограничиваем максимальное количество
     if limit > 100:
         limit = 100
+    if limit < 1:
+        limit = 1
 
-    events_data = SalesService.get_events_feed(limit=limit)
-    return jsonify(events_data)
+    # Курсор из next_cursor предыдущей страницы для прокрутки в историю
+    cursor = request.args.get('cursor') or None
 
+    payload, status = response_cache.get_or_compute(
+        ('events_feed', limit, cursor),
+        lambda: (SalesService.get_events_feed(limit=limit, cursor=cursor), 200)
+    )
+    return jsonify(payload), status
 
-@main_bp.route('/statistics/buyouts-list')
-@login_required
-@admin_required
-def buyouts_list():
-    """Страница со списком выкупов, сгруппированных по покупателям (только для админа)"""
-    # Получаем параметры дат из query string
+
+def _parse_buyouts_list_dates():
+    """Период списка выкупов из query string (по умолчанию - сегодня)"""
     date_from_str = request.args.get('date_from')
     date_to_str = request.args.get('date_to')
 
-    # По умолчанию - сегодня
     today = datetime.now().date()
     date_from = today
     date_to = today
@@ -654,71 +612,136 @@ def buyouts_list():
         except ValueError:
             pass
 
-    # Получаем все активные Ozon токены
-    ozon_tokens = Token.query.filter_by(is_active=True, marketplace='ozon').all()
-    ozon_token_ids = [t.id for t in ozon_tokens]
+    return date_from, date_to
 
-    # Словарь токенов по id для быстрого доступа
-    tokens_map = {t.id: t.name or t.get_marketplace_display() for t in ozon_tokens}
 
-    # Получаем заказы за указанный период
-    orders = db.session.query(OzonOrder).filter(
+def _buyouts_list_filters(ozon_token_ids, date_from, date_to):
+    """Условия выборки заказов периода (диапазон по in_process_at использует индекс)"""
+    return [
         OzonOrder.token_id.in_(ozon_token_ids),
-        func.date(OzonOrder.in_process_at) >= date_from,
-        func.date(OzonOrder.in_process_at) <= date_to
-    ).order_by(OzonOrder.in_process_at.desc()).all()
+        OzonOrder.in_process_at >= datetime.combine(date_from, datetime.min.time()),
+        OzonOrder.in_process_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()),
+        OzonOrder.buyer_id.isnot(None),
+        OzonOrder.buyer_id != ''
+    ]
 
-    # Группируем заказы по покупателям (первое число в posting_number)
-    buyers = defaultdict(lambda: {
-        'orders': [],
-        'total_count': 0,
-        'delivered_count': 0,
-        'cancelled_count': 0,
-        'total_amount': 0.0
-    })
 
-    for order in orders:
-        buyer_id = extract_buyer_id(order.posting_number)
-        if not buyer_id:
-            continue
+@main_bp.route('/statistics/buyouts-list')
+@login_required
+@admin_required
+def buyouts_list():
+    """Страница со списком выкупов, сгруппированных по покупателям (только для админа)
+
+    Группировка и итоги считаются в БД по ozon_orders.buyer_id, страница содержит
+    BUYOUTS_LIST_PER_PAGE покупателей, заказы покупателя подгружаются при раскрытии.
+    """
+    date_from, date_to = _parse_buyouts_list_dates()
+    page = max(request.args.get('page', 1, type=int), 1)
+    search = request.args.get('q', '').strip()
+    multi_only = request.args.get('multi') == '1'
+
+    # Получаем все активные Ozon токены
+    ozon_token_ids = [row[0] for row in db.session.query(Token.id).filter_by(is_active=True, marketplace='ozon').all()]
+    filters = _buyouts_list_filters(ozon_token_ids, date_from, date_to)
+
+    # Итоги по покупателям: одна строка на buyer_id
+    grouped = db.session.query(
+        OzonOrder.buyer_id.label('buyer_id'),
+        func.count(OzonOrder.id).label('total_count'),
+        func.sum(db.case((OzonOrder.status == 'delivered', 1), else_=0)).label('delivered_count'),
+        func.sum(db.case((OzonOrder.status == 'cancelled', 1), else_=0)).label('cancelled_count'),
+        func.sum(func.coalesce(OzonOrder.price, 0) * OzonOrder.quantity).label('total_amount')
+    ).filter(*filters).group_by(OzonOrder.buyer_id)
+
+    # Общая статистика периода (без учёта поиска)
+    stats = grouped.subquery()
+    totals = db.session.query(
+        func.count(stats.c.buyer_id),
+        func.sum(stats.c.total_count),
+        func.sum(db.case((stats.c.total_count > 1, 1), else_=0))
+    ).one()
+    total_buyers = int(totals[0] or 0)
+    total_orders = int(totals[1] or 0)
+    multi_buyers = int(totals[2] or 0)
+
+    # Поиск по ID покупателя (префикс) или по артикулу в заказах покупателя
+    if search:
+        matching_buyers = db.session.query(OzonOrder.buyer_id).filter(
+            *filters, OzonOrder.offer_id.ilike(f'%{search}%')
+        )
+        grouped = grouped.filter(db.or_(
+            OzonOrder.buyer_id.like(f'{search}%'),
+            OzonOrder.buyer_id.in_(matching_buyers)
+        ))
+    if multi_only:
+        grouped = grouped.having(func.count(OzonOrder.id) > 1)
+
+    filtered_count = grouped.order_by(None).count()
+    pages = max((filtered_count + BUYOUTS_LIST_PER_PAGE - 1) // BUYOUTS_LIST_PER_PAGE, 1)
+    page = min(page, pages)
+
+    rows = grouped.order_by(
+        func.count(OzonOrder.id).desc(), OzonOrder.buyer_id
+    ).offset((page - 1) * BUYOUTS_LIST_PER_PAGE).limit(BUYOUTS_LIST_PER_PAGE).all()
+
+    buyers_list = [{
+        'buyer_id': row.buyer_id,
+        'total_count': int(row.total_count or 0),
+        'delivered_count': int(row.delivered_count or 0),
+        'cancelled_count': int(row.cancelled_count or 0),
+        'total_amount': round(float(row.total_amount or 0), 2)
+    } for row in rows]
+
+    return render_template('buyouts_list.html',
+                          buyers=buyers_list,
+                          date_from=date_from.strftime('%Y-%m-%d'),
+                          date_to=date_to.strftime('%Y-%m-%d'),
+                          total_buyers=total_buyers,
+                          total_orders=total_orders,
+                          multi_buyers=multi_buyers,
+                          filtered_count=filtered_count,
+                          page=page,
+                          pages=pages,
+                          search=search,
+                          multi_only=multi_only)
+
+
+@main_bp.route('/api/statistics/buyouts-list/<buyer_id>/orders')
+@login_required
+@admin_required
+def buyouts_list_orders(buyer_id):
+    """Заказы покупателя за период (подгружаются при раскрытии в списке выкупов)"""
+    date_from, date_to = _parse_buyouts_list_dates()
 
-        buyers[buyer_id]['orders'].append({
+    ozon_tokens = Token.query.filter_by(is_active=True, marketplace='ozon').all()
+    tokens_map = {t.id: t.name or t.get_marketplace_display() for t in ozon_tokens}
+
+    orders = db.session.query(
+        OzonOrder.posting_number,
+        OzonOrder.offer_id,
+        OzonOrder.quantity,
+        OzonOrder.price,
+        OzonOrder.status,
+        OzonOrder.in_process_at,
+        OzonOrder.token_id,
+        OzonOrder.delivery_schema
+    ).filter(
+        *_buyouts_list_filters(list(tokens_map.keys()), date_from, date_to),
+        OzonOrder.buyer_id == buyer_id
+    ).order_by(OzonOrder.in_process_at.desc()).all()
+
+    return jsonify({
+        'success': True,
+        'buyer_id': buyer_id,
+        'orders': [{
             'posting_number': order.posting_number,
             'offer_id': order.offer_id,
             'quantity': order.quantity,
             'price': float(order.price) if order.price else 0.0,
             'status': order.status,
-            'in_process_at': order.in_process_at,
+            'in_process_at': order.in_process_at.strftime('%d.%m.%Y %H:%M') if order.in_process_at else None,
             'token_name': tokens_map.get(order.token_id, 'Неизвестно'),
             'delivery_schema': order.delivery_schema
-        })
-        buyers[buyer_id]['total_count'] += 1
-        if order.status == 'delivered':
-            buyers[buyer_id]['delivered_count'] += 1
-        elif order.status == 'cancelled':
-            buyers[buyer_id]['cancelled_count'] += 1
-        if order.price:
-            buyers[buyer_id]['total_amount'] += float(order.price) * order.quantity
-
-    # Преобразуем в список и сортируем по количеству заказов (от большего к меньшему)
-    buyers_list = []
-    for buyer_id, data in buyers.items():
-        buyers_list.append({
-            'buyer_id': buyer_id,
-            'orders': data['orders'],
-            'total_count': data['total_count'],
-            'delivered_count': data['delivered_count'],
-            'cancelled_count': data['cancelled_count'],
-            'total_amount': round(data['total_amount'], 2)
-        })
-
-    # Сортируем по количеству заказов (покупатели с большим числом заказов сверху)
-    buyers_list.sort(key=lambda x: x['total_count'], reverse=True)
-
-    return render_template('buyouts_list.html',
-                          buyers=buyers_list,
-                          date_from=date_from.strftime('%Y-%m-%d'),
-                          date_to=date_to.strftime('%Y-%m-%d'),
-                          total_buyers=len(buyers_list),
-                          total_orders=len(orders))
+        } for order in orders]
+    })
 
@@ -1,11 +1,13 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
-from flask_login import login_required
-from app.models import db
+from flask_login import login_required, current_user
+from sqlalchemy import func
+from app.models import db, KizFile, KizCode
 from app.models.wildberries import WBGood
 from app.services.smb_service import SMBService
-from app.routes.main import get_size_sort_key
+from app.services.goods_search import goods_search
+from app.services.invoice_service import invoice_service
+from app.services.job_runner import job_runner
 from datetime import datetime
-import requests
 import io
 
 marking_bp = Blueprint('marking', __name__, url_prefix='/marking')
@@ -21,72 +23,25 @@ def batch_order():
 @marking_bp.route('/api/search-goods')
 @login_required
 def search_goods():
-    """API для поиска товаров по артикулу"""
+    """API для поиска товаров по артикулу, штрихкоду или GTIN"""
     article = request.args.get('article', '').strip()
 
     if not article:
         return jsonify({'success': True, 'data': []})
 
-    # Поиск товаров по началу артикула
-    goods = WBGood.query.filter(
-        WBGood.vendor_code.ilike(f'{article}%')
-    ).all()
+    # Ранжированный поиск по индексам, только товары с GTIN.
+    # Порядок GoodsSearch сохраняется: точные совпадения, затем по префиксу, затем по подстроке
+    result, truncated = goods_search.search(article, with_gtin=True)
 
-    result = []
-    for good in goods:
-        if good.gtin:  # Только товары с GTIN
-            result.append({
-                'id': good.id,
-                'article': good.vendor_code,
-                'size': good.tech_size or '',
-                'gtin': good.gtin,
-                'barcode': good.barcode
-            })
-
-    result.sort(key=lambda x: (x['article'], get_size_sort_key(x['size'])))
-
-    return jsonify({'success': True, 'data': result})
+    return jsonify({'success': True, 'data': result, 'truncated': truncated})
 
 
 @marking_bp.route('/api/invoices')
 @login_required
 def get_invoices():
-    """API для получения списка накладных из 1С"""
-    try:
-        response = requests.get(
-            f"{current_app.config['C1_API_URL']}/sales_list",
-            auth=(current_app.config['C1_API_USER'], current_app.config['C1_API_PASSWORD']),
-            timeout=10
-        )
-        response.raise_for_status()
-
-        data = response.json()
-
-        if not isinstance(data, dict) or not data.get('success', False):
-            return jsonify({'success': False, 'error': 'Не удалось получить список накладных'})
-
-        invoices = data.get('data', {}).get('Реализации', [])
-
-        # Сортируем по дате (от новых к старым)
-        invoices.sort(key=lambda x: datetime.fromisoformat(x.get('Дата', '')), reverse=True)
-
-        # Форматируем для фронтенда
-        result = []
-        for inv in invoices:
-            total_quantity = sum(item.get('Количество', 0) for item in inv.get('Товары', []))
-            result.append({
-                'number': inv.get('Номер', ''),
-                'date': inv.get('Дата', ''),
-                'total_quantity': total_quantity,
-                'items': inv.get('Товары', [])
-            })
-
-        return jsonify({'success': True, 'data': result})
-
-    except requests.exceptions.RequestException as e:
-        return jsonify({'success': False, 'error': f'Ошибка при запросе данных: {str(e)}'})
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Ошибка: {str(e)}'})
+    """API для получения списка накладных из 1С (последний снимок фонового обновления)"""
+    force_refresh = request.args.get('refresh') == '1'
+    return jsonify(invoice_service.get(force_refresh=force_refresh))
 
 
 @marking_bp.route('/api/goods-by-barcodes', methods=['POST'])
@@ -123,7 +78,7 @@ def get_goods_by_barcodes():
 @marking_bp.route('/api/create-kiz-order', methods=['POST'])
 @login_required
 def create_kiz_order():
-    """API для создания заказа КИЗ и сохранения на SMB"""
+    """API для создания заказа КИЗ: запись на SMB выполняется фоновой задачей, ответ - её id"""
     try:
         data = request.get_json()
         items = data.get('items', [])
@@ -134,11 +89,8 @@ def create_kiz_order():
         # Генерируем имя файла
         now = datetime.now()
         filename = now.strftime("KIZ_order_%Y-%m-%d_%H-%M-%S.xlsx")
-        folder_name = filename.replace('.xlsx', '')
 
         # Подготавливаем данные для Excel
-        import pandas as pd
-
         excel_data = []
         for item in items:
             gtin = str(item.get('gtin', ''))
@@ -154,38 +106,57 @@ def create_kiz_order():
                 'name': ''
             })
 
-        # Создаем Excel файл
-        df = pd.DataFrame(excel_data)
-        excel_buffer = io.BytesIO()
-        df.to_excel(excel_buffer, index=False)
-        excel_buffer.seek(0)
+        job_id = job_runner.submit(
+            'kiz_order',
+            {'rows': excel_data, 'filename': filename},
+            user_id=current_user.id,
+            message='Заказ в очереди'
+        )
 
-        # Сохраняем на SMB
-        with SMBService() as smb:
-            order_path = current_app.config['SMB_KIZ_ORDER_PATH']
-            km_path = current_app.config['SMB_KIZ_KM_PATH']
+        return jsonify({'success': True, 'job_id': job_id, 'filename': filename})
 
-            # Сохраняем файл в папку Заказ КМ
-            smb.save_file(f'{order_path}/{filename}', excel_buffer)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Ошибка при создании заказа: {str(e)}'})
 
-            # Создаем папку в КМ
-            folder_path = f'{km_path}/{folder_name}'
-            if not smb.directory_exists(folder_path):
-                smb.create_directory(folder_path)
 
-            # Копируем файл в созданную папку
-            excel_buffer.seek(0)
-            smb.save_file(f'{folder_path}/{filename}', excel_buffer)
+@job_runner.register('kiz_order', max_workers=2)
+def _create_kiz_order_job(job, rows, filename):
+    """Фоновая задача: сформировать Excel заказа КИЗ и сохранить его на SMB"""
+    import pandas as pd
 
-        return jsonify({
-            'success': True,
-            'message': f'Заказ создан: {filename}',
-            'filename': filename,
-            'folder': folder_name
-        })
+    folder_name = filename.replace('.xlsx', '')
 
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Ошибка при создании заказа: {str(e)}'})
+    # Создаем Excel файл
+    job.progress(10, 'Формирование Excel')
+    df = pd.DataFrame(rows)
+    excel_buffer = io.BytesIO()
+    df.to_excel(excel_buffer, index=False)
+    excel_buffer.seek(0)
+
+    # Сохраняем на SMB
+    with SMBService() as smb:
+        order_path = current_app.config['SMB_KIZ_ORDER_PATH']
+        km_path = current_app.config['SMB_KIZ_KM_PATH']
+
+        # Сохраняем файл в папку Заказ КМ
+        job.progress(40, 'Сохранение в папку заказов')
+        smb.save_file(f'{order_path}/{filename}', excel_buffer)
+
+        # Создаем папку в КМ
+        job.progress(70, 'Создание папки КМ')
+        folder_path = f'{km_path}/{folder_name}'
+        if not smb.directory_exists(folder_path):
+            smb.create_directory(folder_path)
+
+        # Копируем файл в созданную папку
+        excel_buffer.seek(0)
+        smb.save_file(f'{folder_path}/{filename}', excel_buffer)
+
+    return {
+        'message': f'Заказ создан: {filename}',
+        'filename': filename,
+        'folder': folder_name
+    }
 
 
 @marking_bp.route('/kiz-search')
@@ -198,122 +169,81 @@ def kiz_search():
 @marking_bp.route('/api/search-kiz')
 @login_required
 def search_kiz():
-    """API для поиска КИЗ по артикулу или коду маркировки"""
+    """API для поиска КИЗ по артикулу или коду маркировки (по индексу kiz_codes, без обращения к SMB)"""
     query = request.args.get('query', '').strip()
     search_type = request.args.get('type', 'article')  # 'article' или 'marking_code'
 
     if not query:
         return jsonify({'success': True, 'data': []})
 
-    # Путь к папке КМ на SMB шаре
-    km_path = current_app.config['SMB_KIZ_KM_PATH']
-
     results = []
+    truncated = False
 
     try:
-        with SMBService() as smb:
-            if search_type == 'article':
-                # Поиск по артикулу - ищем GTIN через базу данных
-                goods = WBGood.query.filter(
-                    WBGood.vendor_code.ilike(f'{query}%'),
-                    WBGood.gtin.isnot(None)
-                ).all()
-
-                if not goods:
-                    return jsonify({'success': True, 'data': []})
-
-                # Собираем все GTIN для поиска
-                gtins = set()
-                gtin_to_article = {}
-                for good in goods:
-                    gtin = good.gtin
-                    # Нормализуем GTIN до 14 символов
-                    if len(gtin) == 13:
-                        gtin = '0' + gtin
-                    gtins.add(gtin)
-                    gtin_to_article[gtin] = {
-                        'article': good.vendor_code,
-                        'size': good.tech_size or '',
-                        'gtin': good.gtin
-                    }
-
-                # Ищем в папках
-                results = _search_in_km_folders_smb(smb, km_path, gtins, gtin_to_article)
-
-            else:
-                # Поиск по коду маркировки
-                results = _search_marking_code_smb(smb, km_path, query)
+        if search_type == 'article':
+            # Поиск по началу артикула (только vendor_code, без штрихкодов и GTIN) - ищем GTIN через индекс карточек
+            goods, _ = goods_search.search(query, limit=None, substring=False, with_gtin=True,
+                                            fields=('vendor_code',))
+
+            if not goods:
+                return jsonify({'success': True, 'data': []})
+
+            # Собираем все GTIN для поиска
+            gtins = set()
+            gtin_to_article = {}
+            for good in goods:
+                gtin = good['gtin']
+                # Нормализуем GTIN до 14 символов
+                if len(gtin) == 13:
+                    gtin = '0' + gtin
+                gtins.add(gtin)
+                gtin_to_article[gtin] = {
+                    'article': good['article'],
+                    'size': good['size'],
+                    'gtin': good['gtin']
+                }
+
+            results = _search_gtins_in_index(gtins, gtin_to_article)
+
+        else:
+            # Поиск по коду маркировки
+            results, truncated = _search_marking_code_in_index(query)
 
     except Exception as e:
         return jsonify({'success': False, 'error': f'Ошибка поиска: {str(e)}'})
 
-    return jsonify({'success': True, 'data': results})
+    index_updated_at = db.session.query(func.max(KizFile.indexed_at)).scalar()
+
+    return jsonify({
+        'success': True,
+        'data': results,
+        'truncated': truncated,
+        'index_updated_at': index_updated_at.isoformat() if index_updated_at else None
+    })
 
 
-def _search_in_km_folders_smb(smb, km_path, gtins, gtin_to_article):
-    """Поиск GTIN в CSV файлах в папках КМ через SMB"""
+def _search_gtins_in_index(gtins, gtin_to_article):
+    """Количество кодов по GTIN в каждой папке КМ - один сгруппированный запрос к индексу"""
     results = []
-    # gtin -> {folder -> count}
-    found_folders = {}
 
-    try:
-        # Получаем список папок
-        folders = smb.list_files(km_path)
-    except Exception:
-        return results
-
-    for folder_info in folders:
-        if not folder_info['is_directory']:
-            continue
-
-        folder_name = folder_info['filename']
-        folder_path = f"{km_path}/{folder_name}"
-
-        try:
-            # Получаем список файлов в папке
-            files = smb.list_files(folder_path)
-        except Exception:
-            continue
-
-        for file_info in files:
-            file_name = file_info['filename']
-            if file_name.endswith('.csv') and 'Коды_идентификации' in file_name:
-                csv_path = f"{folder_path}/{file_name}"
-
-                try:
-                    # Читаем CSV файл
-                    file_content = smb.read_file(csv_path)
-                    content = file_content.read().decode('utf-8')
-
-                    for line in content.split('\n'):
-                        line = line.strip()
-                        if not line:
-                            continue
-
-                        # Код маркировки начинается с 01 + GTIN (14 символов)
-                        if line.startswith('01') and len(line) >= 16:
-                            gtin_in_code = line[2:16]
-
-                            if gtin_in_code in gtins:
-                                if gtin_in_code not in found_folders:
-                                    found_folders[gtin_in_code] = {}
-                                if folder_name not in found_folders[gtin_in_code]:
-                                    found_folders[gtin_in_code][folder_name] = 0
-                                found_folders[gtin_in_code][folder_name] += 1
-                except Exception:
-                    continue
+    rows = db.session.query(
+        KizCode.gtin,
+        KizCode.folder,
+        func.count(KizCode.id).label('count')
+    ).filter(
+        KizCode.gtin.in_(list(gtins))
+    ).group_by(KizCode.gtin, KizCode.folder).all()
 
     # Формируем результаты
-    for gtin, folders_counts in found_folders.items():
+    for gtin, folder, count in rows:
         article_info = gtin_to_article.get(gtin, {})
-        for folder, count in folders_counts.items():
-            results.append({
-                'folder': folder,
-                'article': article_info.get('article', ''),
-                'size': article_info.get('size', ''),
-                'gtin': article_info.get('gtin', gtin),
-                'count': count
-            })
+        results.append({
+            'folder': folder,
+            'article': article_info.get('article', ''),
+            'size': article_info.get('size', ''),
+            'gtin': article_info.get('gtin', gtin),
+            'count': count
+        })
 
     # Сортируем по папке
     results.sort(key=lambda x: x['folder'])
@@ -321,62 +251,22 @@ def _search_in_km_folders_smb(smb, km_path, gtins, gtin_to_article):
     return results
 
 
-def _search_marking_code_smb(smb, km_path, query):
-    """Поиск по части кода маркировки через SMB (регистрозависимый)"""
-    results = []
-    found_items = []
+def _search_marking_code_in_index(query):
+    """Поиск по части кода маркировки в индексе (регистрозависимый)"""
+    limit = current_app.config.get('KIZ_SEARCH_LIMIT', 1000)
 
-    try:
-        # Получаем список папок
-        folders = smb.list_files(km_path)
-    except Exception:
-        return results
-
-    for folder_info in folders:
-        if not folder_info['is_directory']:
-            continue
-
-        folder_name = folder_info['filename']
-        folder_path = f"{km_path}/{folder_name}"
-
-        try:
-            # Получаем список файлов в папке
-            files = smb.list_files(folder_path)
-        except Exception:
-            continue
-
-        for file_info in files:
-            file_name = file_info['filename']
-            if file_name.endswith('.csv') and 'Коды_идентификации' in file_name:
-                csv_path = f"{folder_path}/{file_name}"
-
-                try:
-                    # Читаем CSV файл
-                    file_content = smb.read_file(csv_path)
-                    content = file_content.read().decode('utf-8')
-
-                    for line_num, line in enumerate(content.split('\n'), start=1):
-                        line = line.strip()
-                        if not line:
-                            continue
-
-                        # Ищем совпадение в любой части кода (регистрозависимый поиск)
-                        if query in line:
-                            gtin = ''
-                            if line.startswith('01') and len(line) >= 16:
-                                gtin = line[2:16]
-
-                            found_items.append({
-                                'folder': folder_name,
-                                'marking_code': line,
-                                'gtin': gtin,
-                                'line_number': line_num
-                            })
-                except Exception:
-                    continue
+    # Ищем совпадение в любой части кода (LIKE, на PostgreSQL - по trigram-индексу)
+    found_items = db.session.query(
+        KizCode.folder, KizCode.code, KizCode.gtin, KizCode.line_number
+    ).filter(
+        KizCode.code.contains(query, autoescape=True)
+    ).order_by(KizCode.folder, KizCode.file_id, KizCode.line_number).limit(limit + 1).all()
+
+    truncated = len(found_items) > limit
+    found_items = found_items[:limit]
 
     # Получаем информацию об артикулах по GTIN
-    gtins = set(item['gtin'] for item in found_items if item['gtin'])
+    gtins = set(item.gtin for item in found_items if item.gtin)
     gtin_to_article = {}
 
     if gtins:
@@ -401,18 +291,16 @@ def _search_marking_code_smb(smb, km_path, query):
             }
 
     # Формируем результаты
+    results = []
     for item in found_items:
-        article_info = gtin_to_article.get(item['gtin'], {})
+        article_info = gtin_to_article.get(item.gtin, {})
         results.append({
-            'folder': item['folder'],
-            'marking_code': item['marking_code'],
+            'folder': item.folder,
+            'marking_code': item.code,
             'article': article_info.get('article', ''),
             'size': article_info.get('size', ''),
-            'gtin': item['gtin'],
-            'line_number': item['line_number']
+            'gtin': item.gtin or '',
+            'line_number': item.line_number
         })
 
-    # Сортируем по папке
-    results.sort(key=lambda x: x['folder'])
-
-    return results
+    return results, truncated
@@ -3,6 +3,7 @@ from flask_login import login_required
 from app.models import db, Token
 from app.forms import TokenForm
 from app.decorators import admin_required
+from app.services.response_cache import response_cache
 
 tokens_bp = Blueprint('tokens', __name__, url_prefix='/settings/tokens')
 
@@ -40,6 +41,7 @@ def add():
 
         db.session.add(token)
         db.session.commit()
+        response_cache.invalidate()
 
         token_display = f'"{token.name}"' if token.name else token.get_marketplace_display()
         flash(f'Токен {token_display} успешно добавлен.', 'success')
@@ -70,6 +72,7 @@ def edit(token_id):
         token.client_id = form.client_id.data if form.marketplace.data == 'ozon' else None
 
         db.session.commit()
+        response_cache.invalidate()
 
         token_display = f'"{token.name}"' if token.name else token.get_marketplace_display()
         flash(f'Токен {token_display} успешно обновлен.', 'success')
@@ -95,6 +98,7 @@ def toggle(token_id):
     token = Token.query.get_or_404(token_id)
     token.is_active = not token.is_active
     db.session.commit()
+    response_cache.invalidate()
 
     status = 'активирован' if token.is_active else 'деактивирован'
     token_display = f'"{token.name}"' if token.name else token.get_marketplace_display()
@@ -112,6 +116,7 @@ def delete(token_id):
     token_display = f'"{token.name}"' if token.name else token.get_marketplace_display()
     db.session.delete(token)
     db.session.commit()
+    response_cache.invalidate()
 
     flash(f'Токен {token_display} успешно удален.', 'success')
     return redirect(url_for('tokens.list_tokens'))
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from functools import wraps
 from app.models import db, VPNUser
 from app.services.vps_service import VPSService, generate_xray_config
+from app.services.job_runner import job_runner
 import uuid
 
 vpn_bp = Blueprint('vpn', __name__, url_prefix='/server')
@@ -56,6 +57,27 @@ def sync_xray_config():
         return False, str(e)
 
 
+# Все SSH-операции с VPS выполняются фоновыми задачами в общем пуле из одного потока,
+# поэтому запись конфига и чтение статуса не пересекаются
+
+@job_runner.register('vps_sync', pool='vps')
+def _sync_xray_config_job(job):
+    """Фоновая задача: синхронизировать конфиг Xray с VPS"""
+    job.progress(10, 'Синхронизация конфигурации')
+    success, message = sync_xray_config()
+    if not success:
+        raise RuntimeError(message)
+    return {'message': message}
+
+
+@job_runner.register('vps_status', pool='vps')
+def _xray_status_job(job):
+    """Фоновая задача: статус VPS и Xray"""
+    vps = get_vps_service()
+    with vps:
+        return vps.get_xray_status()
+
+
 @vpn_bp.route('/vless')
 @login_required
 @admin_required
@@ -63,20 +85,13 @@ def vless_users():
     """Страница управления VLESS пользователями"""
     users = VPNUser.query.order_by(VPNUser.created_at.desc()).all()
 
-    # Проверяем статус VPS
-    vps_status = None
-    try:
-        vps = get_vps_service()
-        with vps:
-            vps_status = vps.get_xray_status()
-    except Exception as e:
-        vps_status = {'is_active': False, 'error': str(e)}
-
+    # Статус VPS страница запрашивает сама (/vless/status), чтобы SSH не задерживал ответ.
+    # job_id - фоновая задача, запущенная перед переходом сюда: страница ждёт её результат
     return render_template('vpn_users.html',
                           users=users,
+                          job_id=request.args.get('job_id'),
                           server_ip=current_app.config['VPS_HOST'],
-                          public_key=current_app.config['VLESS_PUBLIC_KEY'],
-                          vps_status=vps_status)
+                          public_key=current_app.config['VLESS_PUBLIC_KEY'])
 
 
 @vpn_bp.route('/vless/add', methods=['GET', 'POST'])
@@ -112,14 +127,11 @@ def add_vless_user():
         db.session.add(vpn_user)
         db.session.commit()
 
-        # Синхронизируем с VPS
-        success, message = sync_xray_config()
-        if success:
-            flash(f'Пользователь "{name}" создан и добавлен на VPS.', 'success')
-        else:
-            flash(f'Пользователь "{name}" создан, но ошибка синхронизации: {message}', 'warning')
+        # Синхронизируем с VPS в фоне, результат синхронизации покажет страница списка
+        job_id = job_runner.submit('vps_sync', user_id=current_user.id)
+        flash(f'Пользователь "{name}" создан.', 'success')
 
-        return redirect(url_for('vpn.vless_users'))
+        return redirect(url_for('vpn.vless_users', job_id=job_id))
 
     return render_template('vpn_add_user.html')
 
@@ -208,32 +220,22 @@ def edit_vless_user(user_id):
 @login_required
 @admin_required
 def sync_vless_config():
-    """Синхронизировать конфигурацию с VPS"""
-    success, message = sync_xray_config()
+    """Синхронизировать конфигурацию с VPS (фоновая задача)"""
+    job_id = job_runner.submit('vps_sync', user_id=current_user.id)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return jsonify({'success': success, 'message': message})
+        return jsonify({'success': True, 'job_id': job_id})
 
-    if success:
-        flash(message, 'success')
-    else:
-        flash(f'Ошибка: {message}', 'danger')
-
-    return redirect(url_for('vpn.vless_users'))
+    return redirect(url_for('vpn.vless_users', job_id=job_id))
 
 
 @vpn_bp.route('/vless/status')
 @login_required
 @admin_required
 def vless_status():
-    """Получить статус VPS и Xray"""
-    try:
-        vps = get_vps_service()
-        with vps:
-            status = vps.get_xray_status()
-        return jsonify({'success': True, **status})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+    """Запустить проверку статуса VPS и Xray (фоновая задача, ответ - её id)"""
+    job_id = job_runner.submit('vps_status', user_id=current_user.id)
+    return jsonify({'success': True, 'job_id': job_id})
 
 
 @vpn_bp.route('/vless/export-config')
@@ -254,73 +256,72 @@ def export_xray_config():
 @login_required
 @admin_required
 def import_vless_users():
-    """Импортировать пользователей с VPS сервера"""
-    try:
-        vps = get_vps_service()
-        with vps:
-            config = vps.get_xray_config()
+    """Импортировать пользователей с VPS сервера (фоновая задача)"""
+    job_id = job_runner.submit('vps_import', {'created_by_id': current_user.id}, user_id=current_user.id)
+    return redirect(url_for('vpn.vless_users', job_id=job_id))
 
-        if not config:
-            flash('Не удалось прочитать конфигурацию Xray с сервера.', 'danger')
-            return redirect(url_for('vpn.vless_users'))
 
-        # Получаем список клиентов из конфига
-        clients = []
-        for inbound in config.get('inbounds', []):
-            if inbound.get('protocol') == 'vless':
-                clients.extend(inbound.get('settings', {}).get('clients', []))
+@job_runner.register('vps_import', pool='vps')
+def _import_vless_users_job(job, created_by_id):
+    """Фоновая задача: импорт пользователей из конфигурации Xray на VPS"""
+    job.progress(10, 'Чтение конфигурации Xray')
+    vps = get_vps_service()
+    with vps:
+        config = vps.get_xray_config()
 
-        if not clients:
-            flash('На сервере не найдено пользователей.', 'warning')
-            return redirect(url_for('vpn.vless_users'))
+    if not config:
+        raise RuntimeError('Не удалось прочитать конфигурацию Xray с сервера.')
 
-        imported = 0
-        skipped = 0
+    # Получаем список клиентов из конфига
+    clients = []
+    for inbound in config.get('inbounds', []):
+        if inbound.get('protocol') == 'vless':
+            clients.extend(inbound.get('settings', {}).get('clients', []))
 
-        for client in clients:
-            client_uuid = client.get('id')
-            client_email = client.get('email', '')
+    job.progress(50, 'Импорт пользователей')
+    imported = 0
+    skipped = 0
 
-            # Проверяем, существует ли уже пользователь с таким UUID
-            existing = VPNUser.query.filter_by(uuid=client_uuid).first()
-            if existing:
-                skipped += 1
-                continue
-
-            # Определяем режим доступа из email
-            if '@' in client_email:
-                name_part, mode_part = client_email.rsplit('@', 1)
-                name = name_part.replace('_', ' ').title()
-                if mode_part == 'full':
-                    access_mode = 'full'
-                elif mode_part == 'lan_only':
-                    access_mode = 'lan_only'
-                else:
-                    access_mode = 'proxy_only'
+    for client in clients:
+        client_uuid = client.get('id')
+        client_email = client.get('email', '')
+
+        # Проверяем, существует ли уже пользователь с таким UUID
+        existing = VPNUser.query.filter_by(uuid=client_uuid).first()
+        if existing:
+            skipped += 1
+            continue
+
+        # Определяем режим доступа из email
+        if '@' in client_email:
+            name_part, mode_part = client_email.rsplit('@', 1)
+            name = name_part.replace('_', ' ').title()
+            if mode_part == 'full':
+                access_mode = 'full'
+            elif mode_part == 'lan_only':
+                access_mode = 'lan_only'
             else:
-                name = client_email or f"User-{client_uuid[:8]}"
                 access_mode = 'proxy_only'
+        else:
+            name = client_email or f"User-{client_uuid[:8]}"
+            access_mode = 'proxy_only'
 
-            # Создаём пользователя
-            vpn_user = VPNUser(
-                name=name,
-                uuid=client_uuid,
-                email=client_email or f"{client_uuid[:8]}@imported",
-                access_mode=access_mode,
-                created_by_id=current_user.id
-            )
-
-            db.session.add(vpn_user)
-            imported += 1
-
-        db.session.commit()
+        # Создаём пользователя
+        vpn_user = VPNUser(
+            name=name,
+            uuid=client_uuid,
+            email=client_email or f"{client_uuid[:8]}@imported",
+            access_mode=access_mode,
+            created_by_id=created_by_id
+        )
 
-        if imported > 0:
-            flash(f'Импортировано {imported} пользователей.', 'success')
-        if skipped > 0:
-            flash(f'Пропущено {skipped} существующих пользователей.', 'info')
+        db.session.add(vpn_user)
+        imported += 1
 
-    except Exception as e:
-        flash(f'Ошибка импорта: {str(e)}', 'danger')
+    db.session.commit()
 
-    return redirect(url_for('vpn.vless_users'))
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'message': f'Импортировано {imported} пользователей, пропущено {skipped} существующих.'
+    }
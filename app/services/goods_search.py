@@ -0,0 +1,220 @@
+"""
+Поиск карточек WB (wb_goods) по артикулу, штрихкоду и GTIN для страниц маркировки.
+
+На PostgreSQL запрос обслуживают индексы из migrations/migrate_wb_goods_search_indexes.py:
+lower(vendor_code), barcode и gtin с text_pattern_ops - для поиска по началу строки,
+GIN pg_trgm по lower(vendor_code) - для поиска подстроки в артикуле.
+
+На других СУБД (SQLite при разработке) используется индекс в памяти: отсортированные
+ключи каждого поля, начало строки ищется через bisect, подстрока - проходом по артикулам.
+Индекс перестраивается, когда меняется версия каталога (количество карточек, max id,
+max updated_at); версия читается из БД не чаще раза в GOODS_SEARCH_VERSION_TTL секунд.
+
+Результаты ранжируются: точное совпадение, начало строки, подстрока артикула;
+внутри ранга - по артикулу и размеру. Запросы дольше GOODS_SEARCH_SLOW_MS пишутся в лог.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional, Tuple
+from flask import current_app
+from sqlalchemy import func, case, or_
+from app.models import db, WBGood
+
+logger = logging.getLogger(__name__)
+
+# Ранги совпадения
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_SUBSTRING = 2
+
+# Поля, по которым ищется начало строки
+SEARCH_FIELDS = ('vendor_code', 'barcode', 'gtin')
+
+
+def _escape_like(value: str) -> str:
+    """Экранировать спецсимволы LIKE"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _good_dict(good_id, vendor_code, tech_size, barcode, gtin) -> dict:
+    return {
+        'id': good_id,
+        'article': vendor_code or '',
+        'size': tech_size or '',
+        'gtin': gtin,
+        'barcode': barcode
+    }
+
+
+class _MemoryIndex:
+    """Отсортированные ключи карточек для поиска без индексов СУБД"""
+
+    def __init__(self, rows):
+        self.goods = {}
+        self.keys = {field: [] for field in SEARCH_FIELDS}
+        for good_id, vendor_code, tech_size, barcode, gtin in rows:
+            self.goods[good_id] = (good_id, vendor_code, tech_size, barcode, gtin)
+            for field, value in zip(SEARCH_FIELDS, (vendor_code, barcode, gtin)):
+                if value:
+                    self.keys[field].append((value.lower(), good_id))
+        for keys in self.keys.values():
+            keys.sort()
+
+    def match(self, query: str, substring: bool, fields=SEARCH_FIELDS) -> dict:
+        """{good_id: ранг} для всех совпадений в полях fields"""
+        ranks = {}
+        for field in fields:
+            keys = self.keys[field]
+            pos = bisect_left(keys, (query,))
+            while pos < len(keys) and keys[pos][0].startswith(query):
+                key, good_id = keys[pos]
+                rank = RANK_EXACT if key == query else RANK_PREFIX
+                if rank < ranks.get(good_id, RANK_SUBSTRING + 1):
+                    ranks[good_id] = rank
+                pos += 1
+
+        if substring and 'vendor_code' in fields:
+            for key, good_id in self.keys['vendor_code']:
+                if good_id not in ranks and query in key:
+                    ranks[good_id] = RANK_SUBSTRING
+        return ranks
+
+
+class GoodsSearch:
+    """Ранжированный поиск карточек с лимитом"""
+
+    def __init__(self, limit: int = 500, substring_min: int = 3, version_ttl: float = 30, slow_ms: float = 50):
+        self.limit = limit
+        self.substring_min = substring_min
+        self.version_ttl = version_ttl
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_version = None
+        self._version_checked_at = 0.0
+
+    def _configure(self):
+        """Взять настройки из конфигурации приложения"""
+        self.limit = current_app.config.get('GOODS_SEARCH_LIMIT', self.limit)
+        self.substring_min = current_app.config.get('GOODS_SEARCH_SUBSTRING_MIN', self.substring_min)
+        self.version_ttl = current_app.config.get('GOODS_SEARCH_VERSION_TTL', self.version_ttl)
+        self.slow_ms = current_app.config.get('GOODS_SEARCH_SLOW_MS', self.slow_ms)
+
+    def search(self, query: str, limit: Optional[int] = 0, substring: bool = True,
+               with_gtin: bool = False, fields: tuple = SEARCH_FIELDS) -> Tuple[list, bool]:
+        """
+        Найти карточки по началу артикула, штрихкода или GTIN (и подстроке артикула).
+
+        Args:
+            query: строка поиска (регистр не важен)
+            limit: максимум результатов (0 - GOODS_SEARCH_LIMIT, None - без ограничения)
+            substring: искать подстроку артикула (для запросов от substring_min символов)
+            with_gtin: только карточки с GTIN
+            fields: поля для поиска по началу строки (из SEARCH_FIELDS)
+
+        Returns:
+            (список {'id', 'article', 'size', 'gtin', 'barcode'}, были ли отброшены результаты)
+        """
+        self._configure()
+        query = (query or '').strip().lower()
+        if not query:
+            return [], False
+        unknown = [field for field in fields if field not in SEARCH_FIELDS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля поиска: {', '.join(unknown)}")
+        if limit == 0:
+            limit = self.limit
+        substring = substring and len(query) >= self.substring_min
+
+        started = time.monotonic()
+        if db.engine.dialect.name == 'postgresql':
+            goods = self._search_db(query, limit, substring, with_gtin, fields)
+        else:
+            goods = self._search_memory(query, limit, substring, with_gtin, fields)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if elapsed_ms > self.slow_ms:
+            logger.warning(f"Goods search '{query}' took {elapsed_ms:.0f} ms ({len(goods)} results)")
+
+        truncated = limit is not None and len(goods) > limit
+        return goods[:limit] if truncated else goods, truncated
+
+    def _search_db(self, query: str, limit: Optional[int], substring: bool, with_gtin: bool,
+                   fields: tuple) -> list:
+        """Поиск запросом к PostgreSQL по индексам text_pattern_ops / pg_trgm"""
+        vendor_code = func.lower(WBGood.vendor_code)
+        prefix = _escape_like(query) + '%'
+        columns = {'vendor_code': vendor_code, 'barcode': WBGood.barcode, 'gtin': WBGood.gtin}
+
+        exact = or_(*[columns[field] == query for field in fields])
+        starts = or_(*[columns[field].like(prefix, escape='\\') for field in fields])
+        conditions = [starts]
+        if substring and 'vendor_code' in fields:
+            conditions.append(vendor_code.like('%' + prefix, escape='\\'))
+
+        rank = case((exact, RANK_EXACT), (starts, RANK_PREFIX), else_=RANK_SUBSTRING)
+        select = db.session.query(
+            WBGood.id, WBGood.vendor_code, WBGood.tech_size, WBGood.barcode, WBGood.gtin
+        ).filter(or_(*conditions))
+        if with_gtin:
+            select = select.filter(WBGood.gtin.isnot(None))
+        select = select.order_by(rank, WBGood.vendor_code, WBGood.tech_size, WBGood.id)
+        if limit is not None:
+            # Одна лишняя строка показывает, что результаты обрезаны
+            select = select.limit(limit + 1)
+
+        return [_good_dict(*row) for row in select.all()]
+
+    def _get_index(self) -> _MemoryIndex:
+        """Индекс в памяти, перестроенный при смене версии каталога"""
+        now = time.monotonic()
+        with self._lock:
+            if self._index is not None and now - self._version_checked_at < self.version_ttl:
+                return self._index
+
+        version = tuple(db.session.query(
+            func.count(WBGood.id), func.max(WBGood.id), func.max(WBGood.updated_at)
+        ).one())
+
+        with self._lock:
+            self._version_checked_at = now
+            if self._index is not None and self._index_version == version:
+                return self._index
+
+        rows = db.session.query(
+            WBGood.id, WBGood.vendor_code, WBGood.tech_size, WBGood.barcode, WBGood.gtin
+        ).all()
+        index = _MemoryIndex(rows)
+        logger.info(f"Goods search index rebuilt: {len(index.goods)} goods")
+
+        with self._lock:
+            self._index = index
+            self._index_version = version
+            return index
+
+    def _search_memory(self, query: str, limit: Optional[int], substring: bool, with_gtin: bool,
+                       fields: tuple) -> list:
+        """Поиск по индексу в памяти"""
+        index = self._get_index()
+        ranked = []
+        for good_id, rank in index.match(query, substring, fields).items():
+            good = index.goods[good_id]
+            if with_gtin and not good[4]:
+                continue
+            ranked.append((rank, good[1] or '', good[2] or '', good_id))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit + 1]
+        return [_good_dict(*index.goods[good_id]) for _, _, _, good_id in ranked]
+
+    def invalidate(self):
+        """Сбросить индекс в памяти"""
+        with self._lock:
+            self._index = None
+            self._index_version = None
+
+
+goods_search = GoodsSearch()
@@ -0,0 +1,157 @@
+"""
+Список накладных 1С (sales_list) для пакетного заказа КИЗ.
+
+Запрос к 1С выполняет только фоновый поток: он обновляет снимок раз в
+C1_INVOICES_REFRESH_INTERVAL секунд, сортирует накладные и считает количество
+единиц один раз на снимок. Запрос страницы сразу получает последний удачный
+снимок вместе с его возрастом и ошибкой последнего обновления, поэтому медленный
+сервер 1С не держит воркер Flask. Запросы на принудительное обновление только
+будят поток, так что одновременные обновления не дублируются.
+
+До первого удачного обновления запрос ждёт его не дольше C1_INVOICES_COLD_WAIT секунд.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+import requests
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def _format_invoices(data) -> list:
+    """Ответ sales_list -> накладные для фронтенда (от новых к старым)"""
+    if not isinstance(data, dict) or not data.get('success', False):
+        raise ValueError('Не удалось получить список накладных')
+
+    invoices = data.get('data', {}).get('Реализации', [])
+
+    # Сортируем по дате (от новых к старым)
+    invoices.sort(key=lambda x: datetime.fromisoformat(x.get('Дата', '')), reverse=True)
+
+    # Форматируем для фронтенда
+    result = []
+    for inv in invoices:
+        total_quantity = sum(item.get('Количество', 0) for item in inv.get('Товары', []))
+        result.append({
+            'number': inv.get('Номер', ''),
+            'date': inv.get('Дата', ''),
+            'total_quantity': total_quantity,
+            'items': inv.get('Товары', [])
+        })
+    return result
+
+
+class InvoiceService:
+    """Снимок списка накладных с фоновым обновлением"""
+
+    def __init__(self, refresh_interval: float = 300, cold_wait: float = 10, timeout: float = 30):
+        self.refresh_interval = refresh_interval
+        self.cold_wait = cold_wait
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._loaded = threading.Event()
+        self._thread = None
+        self._settings = None
+        self._invoices = None
+        self._fetched_at = None  # time.time() последнего удачного обновления
+        self._last_error = None
+        self._refreshing = False
+
+    def _start(self):
+        """
+        Запустить фоновый поток (один на процесс) с настройками текущего приложения.
+        Возвращает текст ошибки, если настройки подключения к 1С не заданы (поток не запускается).
+        """
+        with self._lock:
+            if self._thread is not None:
+                return None
+            config = current_app.config
+            missing = [name for name in ('C1_API_URL', 'C1_API_USER', 'C1_API_PASSWORD') if not config.get(name)]
+            if missing:
+                return f"Не заданы настройки 1С: {', '.join(missing)}"
+            self.refresh_interval = config.get('C1_INVOICES_REFRESH_INTERVAL', self.refresh_interval)
+            self.cold_wait = config.get('C1_INVOICES_COLD_WAIT', self.cold_wait)
+            self.timeout = config.get('C1_INVOICES_TIMEOUT', self.timeout)
+            self._settings = (
+                f"{config.get('C1_API_URL')}/sales_list",
+                (config.get('C1_API_USER'), config.get('C1_API_PASSWORD'))
+            )
+            self._thread = threading.Thread(target=self._run, name='invoice-refresher', daemon=True)
+            self._thread.start()
+            return None
+
+    def _run(self):
+        while True:
+            self._refresh()
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def _refresh(self):
+        """Загрузить список из 1С; при ошибке остаётся прежний снимок"""
+        url, auth = self._settings
+        with self._lock:
+            self._refreshing = True
+        try:
+            response = requests.get(url, auth=auth, timeout=self.timeout)
+            response.raise_for_status()
+            invoices = _format_invoices(response.json())
+        except requests.exceptions.RequestException as e:
+            self._set_error(f'Ошибка при запросе данных: {str(e)}')
+        except Exception as e:
+            self._set_error(f'Ошибка: {str(e)}')
+        else:
+            with self._lock:
+                self._invoices = invoices
+                self._fetched_at = time.time()
+                self._last_error = None
+                self._refreshing = False
+            self._loaded.set()
+            logger.info(f"1C invoices refreshed: {len(invoices)} invoices")
+
+    def _set_error(self, error: str):
+        logger.warning(f"1C invoices refresh failed: {error}")
+        with self._lock:
+            self._last_error = error
+            self._refreshing = False
+
+    def get(self, force_refresh: bool = False) -> dict:
+        """
+        Последний снимок накладных.
+
+        Args:
+            force_refresh: разбудить фоновый поток (ответ не ждёт обновления)
+
+        Returns:
+            {'success', 'data', 'age' (секунд с обновления), 'refreshing', 'error'};
+            success=False, пока не было ни одного удачного обновления или не заданы настройки 1С
+        """
+        error = self._start()
+        if error:
+            return {'success': False, 'data': [], 'error': error}
+        if force_refresh:
+            self._wake.set()
+
+        if not self._loaded.is_set():
+            self._loaded.wait(self.cold_wait)
+
+        with self._lock:
+            if self._invoices is None:
+                return {
+                    'success': False,
+                    'data': [],
+                    'loading': self._refreshing,
+                    'error': self._last_error or 'Список накладных загружается, повторите через несколько секунд'
+                }
+            return {
+                'success': True,
+                'data': self._invoices,
+                'age': int(time.time() - self._fetched_at),
+                'refreshing': self._refreshing or force_refresh,
+                'error': self._last_error
+            }
+
+
+invoice_service = InvoiceService()
@@ -0,0 +1,170 @@
+"""
+Фоновые задачи веб-интерфейса (background_jobs).
+
+Долгие операции (запись заказа КИЗ на SMB, SSH к VPS, systemctl) выполняются
+не в HTTP-запросе: обработчик создаёт запись BackgroundJob и сразу возвращает её id,
+а задача выполняется в пуле потоков своего типа. Размер пула ограничивает число
+одновременных задач (max_workers при регистрации, переопределяется JOB_CONCURRENCY
+по имени пула). Типы с общим pool делят один пул - так все SSH-операции с VPS
+выполняются по очереди.
+Статус, прогресс и результат хранятся в БД, поэтому опрос /jobs/<id> работает
+с любого воркера Flask.
+
+Регистрация обработчика:
+    @job_runner.register('kiz_order', max_workers=2)
+    def create_kiz_order_job(job, items):
+        job.progress(50, 'Запись на SMB')
+        return {'filename': ...}
+"""
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+
+class JobContext:
+    """Доступ задачи к своей записи: прогресс и сообщение для опроса"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def progress(self, percent: int, message: str = None):
+        """Сохранить прогресс (0-100) и текущий шаг"""
+        job = db.session.get(BackgroundJob, self.job_id)
+        job.progress = max(0, min(100, int(percent)))
+        if message is not None:
+            job.message = message[:500]
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+
+class JobRunner:
+    """Реестр обработчиков и пулы потоков по типам задач"""
+
+    def __init__(self):
+        self._handlers = {}  # job_type -> (func, pool)
+        self._pool_sizes = {}  # pool -> max_workers
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_type: str, max_workers: int = 1, pool: str = None):
+        """
+        Декоратор: зарегистрировать обработчик типа задачи.
+
+        Args:
+            job_type: тип задачи
+            max_workers: одновременных задач в пуле
+            pool: имя общего пула (по умолчанию - свой пул у типа)
+        """
+        pool = pool or job_type
+
+        def decorator(func):
+            self._handlers[job_type] = (func, pool)
+            self._pool_sizes[pool] = max_workers
+            return func
+        return decorator
+
+    def _executor(self, job_type: str) -> ThreadPoolExecutor:
+        _, pool = self._handlers[job_type]
+        with self._lock:
+            executor = self._executors.get(pool)
+            if executor is None:
+                max_workers = current_app.config.get('JOB_CONCURRENCY', {}).get(pool, self._pool_sizes[pool])
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'job-{pool}')
+                self._executors[pool] = executor
+            return executor
+
+    def submit(self, job_type: str, params: dict = None, user_id: int = None, message: str = None) -> str:
+        """Создать задачу и поставить её в пул своего типа; возвращает id задачи"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+
+        params = params or {}
+        job = BackgroundJob(
+            id=str(uuid.uuid4()),
+            job_type=job_type,
+            status='pending',
+            message=message,
+            params=json.dumps(params, ensure_ascii=False),
+            created_by_id=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        self._executor(job_type).submit(self._run, app, job.id, job_type, params)
+        return job.id
+
+    def _run(self, app, job_id: str, job_type: str, params: dict):
+        func, _ = self._handlers[job_type]
+        with app.app_context():
+            try:
+                job = db.session.get(BackgroundJob, job_id)
+                job.status = 'running'
+                job.started_at = job.updated_at = datetime.utcnow()
+                db.session.commit()
+
+                try:
+                    result = func(JobContext(job_id), **params)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception(f"Job {job_type} {job_id} failed")
+                    job = db.session.get(BackgroundJob, job_id)
+                    job.status = 'failed'
+                    job.error_message = str(e)
+                else:
+                    job = db.session.get(BackgroundJob, job_id)
+                    job.status = 'completed'
+                    job.progress = 100
+                    job.result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+
+                job.finished_at = job.updated_at = datetime.utcnow()
+                db.session.commit()
+            except Exception:
+                logger.exception(f"Job {job_type} {job_id}: cannot update status")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def to_dict(job: BackgroundJob) -> dict:
+        """Статус задачи для опроса"""
+        return {
+            'id': job.id,
+            'type': job.job_type,
+            'status': job.status,
+            'progress': job.progress or 0,
+            'message': job.message,
+            'result': json.loads(job.result) if job.result else None,
+            'error': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def get(self, job_id: str):
+        """
+        Задача по id (None, если нет).
+        Задача, не обновлявшаяся дольше JOB_STALE_TIMEOUT секунд (процесс воркера
+        перезапустили во время выполнения), помечается failed.
+        """
+        job = db.session.get(BackgroundJob, job_id)
+        if job is None:
+            return None
+
+        if job.status in ('pending', 'running'):
+            stale_after = timedelta(seconds=current_app.config.get('JOB_STALE_TIMEOUT', 1800))
+            if job.updated_at and datetime.utcnow() - job.updated_at > stale_after:
+                job.status = 'failed'
+                job.error_message = 'Задача прервана: нет обновлений (сервис перезапускался?)'
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        return job
+
+
+job_runner = JobRunner()
@@ -0,0 +1,97 @@
+"""
+Разбор идентификаторов Ozon: offer_id на артикул и размер, posting_number на покупателя.
+
+Используется и при записи (OzonCollector заполняет ozon_orders.article/size_norm/buyer_id
+и ozon_stocks.article/size_norm), и при чтении, поэтому ключи в БД и в запросах
+всегда совпадают.
+"""
+
+
+def parse_offer_id(offer_id: str) -> tuple:
+    """Парсинг offer_id для извлечения артикула и размера"""
+    if not offer_id:
+        return '', ''
+
+    # Убираем лишние символы в начале (например, ')
+    offer_id = offer_id.lstrip("'\"")
+
+    # Обычно offer_id имеет формат "артикул/размер" или "артикул_размер"
+    if '/' in offer_id:
+        parts = offer_id.split('/')
+        article = parts[0]
+        size = parts[1] if len(parts) > 1 else ''
+    elif '_' in offer_id:
+        parts = offer_id.split('_')
+        article = parts[0]
+        size = parts[1] if len(parts) > 1 else ''
+    else:
+        article = offer_id
+        size = ''
+
+    return article, size
+
+
+def normalize_size(size: str) -> str:
+    """Нормализация размера для использования как ключ (65 -> 6.5, 75 -> 7.5 и т.д.)"""
+    if not size:
+        return size
+
+    # Преобразуем числовые размеры вида 65, 75, 85, 95, 105, 115 в формат с точкой
+    if size.isdigit() and len(size) in [2, 3]:
+        try:
+            num = int(size)
+            # Размеры вида 65, 75, 85, 95
+            if len(size) == 2 and num % 10 == 5 and num >= 65 and num <= 95:
+                return f"{num // 10}.5"
+            # Размеры вида 105, 115
+            elif len(size) == 3 and num % 10 == 5 and num >= 105 and num <= 115:
+                return f"{num // 10}.5"
+        except ValueError:
+            pass
+
+    return size
+
+
+def split_offer_id(offer_id: str) -> tuple:
+    """Артикул и нормализованный размер для колонок article/size_norm"""
+    article, size = parse_offer_id(offer_id)
+    return article[:200], (normalize_size(size) or '')[:50]
+
+
+def split_stored_offer_id(offer_id: str) -> tuple:
+    """Артикул и размер в формате products.article и ozon_supply_items.size.
+
+    Разбирается только "артикул/размер", размер приводится к виду с запятой:
+    3031080131/65 -> (3031080131, 6,5), 3031080131/685 -> (3031080131, 6-8,5).
+    По этим значениям уже сохранены товары и позиции поставок, поэтому формат
+    не меняется; ключи для запросов - в article/size_norm (split_offer_id).
+    """
+    if not offer_id or '/' not in offer_id:
+        return offer_id, ''
+
+    parts = offer_id.split('/')
+    article = parts[0]
+    size = parts[1] if len(parts) > 1 else ''
+
+    if size.isdigit():
+        size_num = int(size)
+        if size_num == 685:
+            size = "6-8,5"
+        elif size_num >= 65 and size_num % 10 == 5:
+            size = f"{size_num // 10},{size_num % 10}"
+
+    return article, size
+
+
+def extract_buyer_id(posting_number: str) -> str:
+    """Извлечение ID покупателя из posting_number.
+
+    posting_number имеет формат число-число-число.
+    Первое число - это идентификатор покупателя.
+    """
+    if not posting_number:
+        return ''
+    parts = posting_number.split('-')
+    if len(parts) >= 1:
+        return parts[0]
+    return ''
@@ -0,0 +1,162 @@
+"""
+Срезы куба статусов заказов (order_status_cube).
+
+Куб хранит по (токен, день, артикул, размер) количества заказов, выкупов, отмен
+и заказов в доставке, поэтому итоги за любой период и набор токенов считаются
+одной агрегацией по предрасчитанным строкам вместо сырых заказов.
+
+Куб полон только с rollup_coverage.covered_from (его записывает перестройка
+datacollector/rollup.py); токены, для которых покрытие не включает период среза,
+пишутся в лог. Покрытие читается из БД один раз на версию данных response_cache,
+и о каждом непокрытом токене в пределах версии предупреждение пишется один раз.
+"""
+import logging
+import threading
+from datetime import date
+from typing import Iterable, Optional
+from sqlalchemy import func
+from app.models import db, OrderStatusCube, RollupCoverage, Token
+from app.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class OrderStatsService:
+    """Сервис итогов по статусам заказов"""
+
+    # Итоги для ключа, которого нет в срезе
+    EMPTY = {'ordered': 0, 'ordered_sum': 0.0, 'delivered': 0, 'delivered_sum': 0.0, 'cancelled': 0, 'delivering': 0}
+
+    # Измерения, по которым можно группировать срез
+    DIMENSIONS = {
+        'token_id': OrderStatusCube.token_id,
+        'marketplace': OrderStatusCube.marketplace,
+        'day': OrderStatusCube.day,
+        'article': OrderStatusCube.article,
+        'size_norm': OrderStatusCube.size_norm,
+    }
+
+    @staticmethod
+    def get_slice(group_by: Iterable[str] = ('article', 'size_norm'),
+                  token_ids: Optional[list] = None,
+                  marketplace: Optional[str] = None,
+                  date_from: Optional[date] = None,
+                  date_to: Optional[date] = None,
+                  articles: Optional[list] = None) -> dict:
+        """
+        Итоги по статусам заказов, сгруппированные по измерениям.
+
+        Args:
+            group_by: измерения из DIMENSIONS (порядок задаёт ключ результата)
+            token_ids: только эти токены (None - все)
+            marketplace: 'wildberries' / 'ozon' (None - оба)
+            date_from, date_to: период включительно (None - без ограничения)
+            articles: только эти артикулы (None - все)
+
+        Returns:
+            {ключ: {'ordered', 'ordered_sum', 'delivered', 'delivered_sum', 'cancelled', 'delivering'}},
+            ключ - кортеж значений измерений в порядке group_by
+        """
+        group_by = list(group_by)
+        unknown = [name for name in group_by if name not in OrderStatsService.DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Неизвестные измерения: {', '.join(unknown)}")
+
+        dimensions = [OrderStatsService.DIMENSIONS[name] for name in group_by]
+        query = db.session.query(
+            *dimensions,
+            func.sum(OrderStatusCube.ordered_count).label('ordered'),
+            func.sum(OrderStatusCube.ordered_sum).label('ordered_sum'),
+            func.sum(OrderStatusCube.delivered_count).label('delivered'),
+            func.sum(OrderStatusCube.delivered_sum).label('delivered_sum'),
+            func.sum(OrderStatusCube.cancelled_count).label('cancelled'),
+            func.sum(OrderStatusCube.delivering_count).label('delivering')
+        )
+
+        if token_ids is not None:
+            if not token_ids:
+                return {}
+            query = query.filter(OrderStatusCube.token_id.in_(token_ids))
+        if marketplace:
+            query = query.filter(OrderStatusCube.marketplace == marketplace)
+        if date_from:
+            query = query.filter(OrderStatusCube.day >= date_from)
+        if date_to:
+            query = query.filter(OrderStatusCube.day <= date_to)
+        if articles is not None:
+            if not articles:
+                return {}
+            query = query.filter(OrderStatusCube.article.in_(articles))
+
+        if dimensions:
+            query = query.group_by(*dimensions)
+
+        OrderStatsService.check_coverage(token_ids, marketplace, date_from)
+
+        result = {}
+        for row in query.all():
+            key = tuple(row[:len(dimensions)])
+            result[key] = {
+                'ordered': int(row.ordered or 0),
+                'ordered_sum': float(row.ordered_sum or 0),
+                'delivered': int(row.delivered or 0),
+                'delivered_sum': float(row.delivered_sum or 0),
+                'cancelled': int(row.cancelled or 0),
+                'delivering': int(row.delivering or 0),
+            }
+        return result
+
+    # Покрытие куба по токенам для версии данных response_cache
+    _coverage_lock = threading.Lock()
+    _coverage_version = None
+    _coverage = {}  # token_id -> (marketplace, covered_from)
+    _coverage_warned = set()
+
+    @classmethod
+    def _get_coverage(cls) -> dict:
+        """Покрытие куба по токенам WB/Ozon (из БД один раз на версию данных)"""
+        version = response_cache.get_version()
+        with cls._coverage_lock:
+            if cls._coverage_version == version:
+                return cls._coverage
+
+        rows = db.session.query(Token.id, Token.marketplace, RollupCoverage.covered_from).outerjoin(
+            RollupCoverage, RollupCoverage.token_id == Token.id
+        ).filter(Token.marketplace.in_(['wildberries', 'ozon'])).all()
+
+        with cls._coverage_lock:
+            cls._coverage = {token_id: (token_marketplace, covered_from)
+                             for token_id, token_marketplace, covered_from in rows}
+            cls._coverage_version = version
+            cls._coverage_warned = set()
+            return cls._coverage
+
+    @classmethod
+    def check_coverage(cls, token_ids: Optional[list] = None, marketplace: Optional[str] = None,
+                       date_from: Optional[date] = None) -> list:
+        """
+        Токены, для которых куб не покрывает период с date_from (None - всё время).
+        Такие токены пишутся в лог (один раз на версию данных): до перестройки куба их итоги занижены.
+        """
+        coverage = cls._get_coverage()
+        selected = coverage.keys() if token_ids is None else [t for t in token_ids if t in coverage]
+
+        uncovered = sorted(
+            token_id for token_id in selected
+            if (not marketplace or coverage[token_id][0] == marketplace)
+            and (coverage[token_id][1] is None or (date_from is not None and coverage[token_id][1] > date_from))
+        )
+
+        with cls._coverage_lock:
+            new_tokens = [token_id for token_id in uncovered if token_id not in cls._coverage_warned]
+            cls._coverage_warned.update(new_tokens)
+        if new_tokens:
+            logger.warning(f"Order status cube is not rebuilt for tokens {new_tokens} since {date_from or 'the start'}; "
+                           f"run python -m datacollector.rollup")
+        return uncovered
+
+    @staticmethod
+    def buyout_percent(stats: dict) -> float:
+        """Процент выкупа: выкуплено / (выкуплено + отменено)"""
+        base = stats['delivered'] + stats['cancelled']
+        return round(stats['delivered'] / base * 100, 1) if base > 0 else 0
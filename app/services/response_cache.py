@@ -0,0 +1,110 @@
+"""
+Кэш JSON-ответов дашборда.
+
+Данные в БД меняются только когда datacollector завершает сбор, поэтому ответы
+кэшируются по ключу endpoint+параметры и считаются актуальными, пока не изменилась
+версия данных: максимальный id в collection_logs (пишется после каждого сбора,
+включая отложенные) и максимальный sync_states.last_successful_sync.
+Версия читается из БД не чаще раза в RESPONSE_CACHE_VERSION_TTL секунд, поэтому
+повторные опросы между синхронизациями не выполняют запросов к данным.
+Размер ограничен RESPONSE_CACHE_SIZE записями, вытесняются давно не использованные.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+from flask import current_app
+from sqlalchemy import func
+from app.models import db, SyncState, CollectionLog
+
+
+class ResponseCache:
+    """LRU-кэш ответов, сбрасываемый при изменении версии данных"""
+
+    def __init__(self, max_entries: int = 512, version_ttl: float = 15):
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._entries = OrderedDict()  # key -> (version, value)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self._local_version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _configure(self):
+        """Взять настройки из конфигурации приложения"""
+        self.max_entries = current_app.config.get('RESPONSE_CACHE_SIZE', self.max_entries)
+        self.version_ttl = current_app.config.get('RESPONSE_CACHE_VERSION_TTL', self.version_ttl)
+
+    def get_version(self) -> tuple:
+        """Текущая версия данных (из БД не чаще раза в version_ttl секунд)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < self.version_ttl:
+                return self._version, self._local_version
+
+        self._configure()
+        row = db.session.query(
+            db.session.query(func.max(CollectionLog.id)).scalar_subquery(),
+            db.session.query(func.max(SyncState.last_successful_sync)).scalar_subquery()
+        ).one()
+        version = (row[0], row[1])
+
+        with self._lock:
+            self._version = version
+            self._version_checked_at = now
+            return self._version, self._local_version
+
+    def invalidate(self):
+        """Сбросить кэш (например, после изменения токенов в веб-интерфейсе)"""
+        with self._lock:
+            self._local_version += 1
+            self._entries.clear()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Tuple[dict, int]]) -> Tuple[dict, int]:
+        """
+        Вернуть закэшированный ответ или вычислить его.
+
+        Args:
+            key: endpoint и параметры запроса
+            compute: функция, возвращающая (payload, status_code)
+
+        Returns:
+            (payload, status_code); кэшируются только успешные ответы со статусом 200
+        """
+        version = self.get_version()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        payload, status = value
+        if status == 200 and payload.get('success', True) is not False:
+            with self._lock:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return value
+
+    def get_stats(self) -> dict:
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'version': str(self._version),
+            }
+
+
+response_cache = ResponseCache()
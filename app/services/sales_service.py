@@ -1,8 +1,9 @@
 """Сервис для получения данных о продажах и заказах из базы данных"""
-from typing import Dict
-from datetime import datetime
-from sqlalchemy import func
-from app.models import db, WBSale, WBOrder, OzonSale, OzonOrder, Token
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, literal, cast, null, union_all, String, Integer
+from app.models import db, WBSale, WBOrder, OzonSale, OzonOrder, Token, Product, DailyTokenTotal, RollupCoverage
+from app.services.offer_utils import split_offer_id
 
 
 class SalesService:
@@ -154,52 +155,33 @@ class SalesService:
                 'error': str
             }
         """
-        try:
-            # Получаем все активные токены
-            tokens = Token.query.filter_by(is_active=True).all()
-
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-
-            tokens_data = []
-            total_sum = 0.0
-            total_count = 0
-
-            for token in tokens:
-                if token.marketplace not in ['wildberries', 'ozon']:
-                    continue
-
-                # Получаем данные для каждого токена
-                token_sales = SalesService.get_today_sales_by_token(token.id)
-
-                if token_sales['success']:
-                    total_sum += token_sales['total']
-                    total_count += token_sales['count']
-
-                    tokens_data.append({
-                        'token_id': token.id,
-                        'token_name': token.name or token.get_marketplace_display(),
-                        'marketplace': token.get_marketplace_display(),
-                        'total': token_sales['total'],
-                        'count': token_sales['count']
-                    })
-
-            return {
-                'success': True,
-                'total_sum': total_sum,
-                'total_count': total_count,
-                'tokens': tokens_data,
-                'error': None
-            }
-
-        except Exception as e:
+        summary = SalesService.get_summary()
+        if not summary['success']:
             return {
                 'success': False,
                 'total_sum': 0.0,
                 'total_count': 0,
                 'tokens': [],
-                'error': f'Ошибка при получении данных: {str(e)}'
+                'error': summary['error']
             }
 
+        return {
+            'success': True,
+            'total_sum': summary['sales']['total'],
+            'total_count': summary['sales']['count'],
+            'tokens': [
+                {
+                    'token_id': token['token_id'],
+                    'token_name': token['token_name'],
+                    'marketplace': token['marketplace'],
+                    'total': token['sales']['total'],
+                    'count': token['sales']['count']
+                }
+                for token in summary['tokens']
+            ],
+            'error': None
+        }
+
     @staticmethod
     def get_today_orders_by_token(token_id: int) -> Dict:
         """
@@ -342,11 +324,7 @@ class SalesService:
             date_from_start = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
             date_to_end = date_to.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-            if token.marketplace == 'wildberries':
-                return SalesService._get_wb_orders_by_range(token_id, date_from_start, date_to_end)
-            elif token.marketplace == 'ozon':
-                return SalesService._get_ozon_orders_by_range(token_id, date_from_start, date_to_end)
-            else:
+            if token.marketplace not in ['wildberries', 'ozon']:
                 return {
                     'success': True,
                     'total': 0.0,
@@ -354,6 +332,18 @@ class SalesService:
                     'error': f'{token.marketplace} не поддерживается'
                 }
 
+            wb_ids = [token_id] if token.marketplace == 'wildberries' else []
+            ozon_ids = [token_id] if token.marketplace == 'ozon' else []
+            totals = SalesService._get_period_totals(wb_ids, ozon_ids, date_from_start, date_to_end)[0]
+            values = totals.get(token_id, {'total': 0.0, 'count': 0})
+
+            return {
+                'success': True,
+                'total': values['total'],
+                'count': values['count'],
+                'error': None
+            }
+
         except Exception as e:
             return {
                 'success': False,
@@ -389,11 +379,7 @@ class SalesService:
             date_from_start = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
             date_to_end = date_to.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-            if token.marketplace == 'wildberries':
-                return SalesService._get_wb_sales_by_range(token_id, date_from_start, date_to_end)
-            elif token.marketplace == 'ozon':
-                return SalesService._get_ozon_sales_by_range(token_id, date_from_start, date_to_end)
-            else:
+            if token.marketplace not in ['wildberries', 'ozon']:
                 return {
                     'success': True,
                     'total': 0.0,
@@ -401,34 +387,15 @@ class SalesService:
                     'error': f'{token.marketplace} не поддерживается'
                 }
 
-        except Exception as e:
-            return {
-                'success': False,
-                'total': 0.0,
-                'count': 0,
-                'error': f'Ошибка при получении данных: {str(e)}'
-            }
-
-    @staticmethod
-    def _get_wb_orders_by_range(token_id: int, date_from: datetime, date_to: datetime) -> Dict:
-        """Получить заказы Wildberries за период из таблицы wb_orders"""
-        try:
-            orders_query = db.session.query(
-                func.count(WBOrder.id).label('count'),
-                func.sum(WBOrder.price_with_disc).label('total')
-            ).filter(
-                WBOrder.token_id == token_id,
-                WBOrder.date >= date_from,
-                WBOrder.date <= date_to
-            ).first()
-
-            count = orders_query.count or 0
-            total = float(orders_query.total or 0.0)
+            wb_ids = [token_id] if token.marketplace == 'wildberries' else []
+            ozon_ids = [token_id] if token.marketplace == 'ozon' else []
+            totals = SalesService._get_period_totals(wb_ids, ozon_ids, date_from_start, date_to_end)[1]
+            values = totals.get(token_id, {'total': 0.0, 'count': 0})
 
             return {
                 'success': True,
-                'total': total,
-                'count': count,
+                'total': values['total'],
+                'count': values['count'],
                 'error': None
             }
 
@@ -437,129 +404,305 @@ class SalesService:
                 'success': False,
                 'total': 0.0,
                 'count': 0,
-                'error': f'Ошибка БД Wildberries: {str(e)}'
+                'error': f'Ошибка при получении данных: {str(e)}'
             }
 
     @staticmethod
-    def _get_wb_sales_by_range(token_id: int, date_from: datetime, date_to: datetime) -> Dict:
-        """Получить продажи Wildberries за период из таблицы wb_sales"""
-        try:
-            sales_query = db.session.query(
-                func.count(WBSale.id).label('count'),
-                func.sum(WBSale.finished_price).label('total')
-            ).filter(
-                WBSale.token_id == token_id,
-                WBSale.date >= date_from,
-                WBSale.date <= date_to
-            ).first()
+    def _aggregate_by_token(token_column, date_column, count_expr, sum_expr, token_ids: List[int],
+                            date_from: datetime, date_to: Optional[datetime], *filters) -> Dict[int, Dict]:
+        """
+        Посчитать количество и сумму за период сразу по всем токенам одним запросом (GROUP BY token_id)
 
-            count = sales_query.count or 0
-            total = float(sales_query.total or 0.0)
+        Returns:
+            {token_id: {'total': float, 'count': int}}
+        """
+        conditions = [token_column.in_(token_ids), date_column >= date_from]
+        if date_to is not None:
+            conditions.append(date_column <= date_to)
+        conditions.extend(filters)
+
+        rows = db.session.query(
+            token_column.label('token_id'),
+            count_expr.label('count'),
+            sum_expr.label('total')
+        ).filter(*conditions).group_by(token_column).all()
+
+        return {
+            row.token_id: {'total': float(row.total or 0.0), 'count': int(row.count or 0)}
+            for row in rows
+        }
 
-            return {
-                'success': True,
-                'total': total,
-                'count': count,
-                'error': None
-            }
+    @staticmethod
+    def _get_raw_totals(wb_ids: List[int], ozon_ids: List[int], date_from: datetime,
+                        date_to: Optional[datetime]) -> Tuple[Dict[int, Dict], Dict[int, Dict]]:
+        """Заказы и продажи по сырым таблицам, один GROUP BY token_id на таблицу"""
+        orders = {}
+        sales = {}
+
+        if wb_ids:
+            # WB заказы: price_with_disc - цена со скидкой WB (до вычета СПП)
+            orders.update(SalesService._aggregate_by_token(
+                WBOrder.token_id, WBOrder.date,
+                func.count(WBOrder.id), func.sum(WBOrder.price_with_disc),
+                wb_ids, date_from, date_to
+            ))
+            # WB продажи: finished_price - финальная цена для покупателя
+            sales.update(SalesService._aggregate_by_token(
+                WBSale.token_id, WBSale.date,
+                func.count(WBSale.id), func.sum(WBSale.finished_price),
+                wb_ids, date_from, date_to
+            ))
+
+        if ozon_ids:
+            # Ozon заказы: in_process_at - дата оформления заказа
+            orders.update(SalesService._aggregate_by_token(
+                OzonOrder.token_id, OzonOrder.in_process_at,
+                func.count(OzonOrder.id), func.sum(OzonOrder.price),
+                ozon_ids, date_from, date_to
+            ))
+            # Ozon продажи: количество - только OperationAgentDeliveredToCustomer,
+            # сумма - по всем операциям (amount с учётом знака)
+            sales.update(SalesService._aggregate_by_token(
+                OzonSale.token_id, OzonSale.operation_date,
+                func.sum(db.case((OzonSale.operation_type == 'OperationAgentDeliveredToCustomer', 1), else_=0)),
+                func.sum(OzonSale.amount),
+                ozon_ids, date_from, date_to
+            ))
+
+        return orders, sales
 
-        except Exception as e:
-            return {
-                'success': False,
-                'total': 0.0,
-                'count': 0,
-                'error': f'Ошибка БД Wildberries: {str(e)}'
+    @staticmethod
+    def _get_period_totals(wb_ids: List[int], ozon_ids: List[int], date_from: datetime,
+                           date_to: Optional[datetime]) -> Tuple[Dict[int, Dict], Dict[int, Dict]]:
+        """
+        Заказы и продажи за период по токенам.
+        Полные дни с начала покрытия rollup (rollup_coverage) до вчера берутся из daily_token_totals,
+        дни до начала покрытия и сегодняшний день - из сырых таблиц.
+        Токены без покрытия считаются по сырым таблицам за весь период.
+
+        Returns:
+            (orders, sales) - {token_id: {'total': float, 'count': int}}
+        """
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        token_ids = wb_ids + ozon_ids
+
+        # Покрытие rollup: {token_id: первый полный день}. Строки daily_token_totals
+        # появляются от коллекторов раньше перестройки истории, поэтому полнота
+        # определяется только по rollup_coverage
+        coverage = {}
+        if token_ids and date_from < today_start:
+            coverage = {
+                row.token_id: row.covered_from for row in db.session.query(
+                    RollupCoverage.token_id, RollupCoverage.covered_from
+                ).filter(RollupCoverage.token_id.in_(token_ids)).all()
+                if row.covered_from < today_start.date()
             }
 
+        orders = {}
+        sales = {}
+
+        def add(target, source):
+            for token_id, values in source.items():
+                current = target.setdefault(token_id, {'total': 0.0, 'count': 0})
+                current['total'] += values['total']
+                current['count'] += values['count']
+
+        # Токены с одинаковым началом покрытия считаются вместе
+        tokens_by_start = {}
+        for token_id, covered_from in coverage.items():
+            start = max(date_from, datetime.combine(covered_from, datetime.min.time()))
+            tokens_by_start.setdefault(start, []).append(token_id)
+
+        last_day = (today_start - timedelta(days=1)).date()
+        if date_to is not None and date_to.date() < last_day:
+            last_day = date_to.date()
+
+        for start, rollup_ids in tokens_by_start.items():
+            rollup_wb = [t for t in wb_ids if t in rollup_ids]
+            rollup_ozon = [t for t in ozon_ids if t in rollup_ids]
+
+            # Дни до начала покрытия - по сырым строкам
+            if start > date_from:
+                raw_until = start - timedelta(microseconds=1)
+                if date_to is not None and date_to < raw_until:
+                    raw_until = date_to
+                raw_orders, raw_sales = SalesService._get_raw_totals(rollup_wb, rollup_ozon, date_from, raw_until)
+                add(orders, raw_orders)
+                add(sales, raw_sales)
+
+            if start.date() <= last_day:
+                rows = db.session.query(
+                    DailyTokenTotal.token_id,
+                    func.sum(DailyTokenTotal.orders_count).label('orders_count'),
+                    func.sum(DailyTokenTotal.orders_sum).label('orders_sum'),
+                    func.sum(DailyTokenTotal.sales_count).label('sales_count'),
+                    func.sum(DailyTokenTotal.sales_sum).label('sales_sum')
+                ).filter(
+                    DailyTokenTotal.token_id.in_(rollup_ids),
+                    DailyTokenTotal.day >= start.date(),
+                    DailyTokenTotal.day <= last_day
+                ).group_by(DailyTokenTotal.token_id).all()
+
+                for row in rows:
+                    add(orders, {row.token_id: {'total': float(row.orders_sum or 0.0), 'count': int(row.orders_count or 0)}})
+                    add(sales, {row.token_id: {'total': float(row.sales_sum or 0.0), 'count': int(row.sales_count or 0)}})
+
+            # Сегодняшний день - по сырым строкам
+            if date_to is None or date_to >= today_start:
+                raw_orders, raw_sales = SalesService._get_raw_totals(
+                    rollup_wb, rollup_ozon, max(date_from, today_start), date_to
+                )
+                add(orders, raw_orders)
+                add(sales, raw_sales)
+
+        # Токены без покрытия - весь период по сырым строкам
+        raw_orders, raw_sales = SalesService._get_raw_totals(
+            [t for t in wb_ids if t not in coverage],
+            [t for t in ozon_ids if t not in coverage],
+            date_from, date_to
+        )
+        add(orders, raw_orders)
+        add(sales, raw_sales)
+
+        return orders, sales
+
     @staticmethod
-    def _get_ozon_orders_by_range(token_id: int, date_from: datetime, date_to: datetime) -> Dict:
-        """Получить заказы Ozon за период из таблицы ozon_orders"""
-        try:
-            orders_query = db.session.query(
-                func.count(OzonOrder.id).label('count'),
-                func.sum(OzonOrder.price).label('total')
-            ).filter(
-                OzonOrder.token_id == token_id,
-                OzonOrder.in_process_at >= date_from,
-                OzonOrder.in_process_at <= date_to
-            ).first()
+    def get_summary(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> Dict:
+        """
+        Получить заказы и продажи за период для всех активных токенов WB и Ozon.
+        Вместо запросов по каждому токену выполняется один GROUP BY token_id на таблицу.
 
-            count = orders_query.count or 0
-            total = float(orders_query.total or 0.0)
+        Args:
+            date_from: Начальная дата (включительно), по умолчанию - сегодня
+            date_to: Конечная дата (включительно), по умолчанию - без ограничения
 
-            return {
-                'success': True,
-                'total': total,
-                'count': count,
-                'error': None
+        Returns:
+            Dict с информацией по токенам и итогами:
+            {
+                'success': bool,
+                'tokens': [
+                    {
+                        'token_id': int,
+                        'token_name': str,
+                        'marketplace': str,
+                        'orders': {'total': float, 'count': int},
+                        'sales': {'total': float, 'count': int}
+                    },
+                    ...
+                ],
+                'orders': {'total': float, 'count': int},
+                'sales': {'total': float, 'count': int},
+                'error': str
             }
+        """
+        try:
+            if date_from is None:
+                date_from = datetime.now()
+            date_from_start = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
+            date_to_end = None
+            if date_to is not None:
+                date_to_end = date_to.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-        except Exception as e:
-            return {
-                'success': False,
-                'total': 0.0,
-                'count': 0,
-                'error': f'Ошибка БД Ozon: {str(e)}'
-            }
+            tokens = Token.query.filter(
+                Token.is_active == True,
+                Token.marketplace.in_(['wildberries', 'ozon'])
+            ).order_by(Token.marketplace, Token.name).all()
 
-    @staticmethod
-    def _get_ozon_sales_by_range(token_id: int, date_from: datetime, date_to: datetime) -> Dict:
-        """Получить продажи Ozon за период из таблицы ozon_sales (finance API)"""
-        try:
-            # Количество продаж - только OperationAgentDeliveredToCustomer
-            count_query = db.session.query(
-                func.count(OzonSale.id).label('count')
-            ).filter(
-                OzonSale.token_id == token_id,
-                OzonSale.operation_date >= date_from,
-                OzonSale.operation_date <= date_to,
-                OzonSale.operation_type == 'OperationAgentDeliveredToCustomer'
-            ).first()
+            wb_ids = [t.id for t in tokens if t.marketplace == 'wildberries']
+            ozon_ids = [t.id for t in tokens if t.marketplace == 'ozon']
 
-            # Сумма - по всем операциям (amount с учётом знака)
-            total_query = db.session.query(
-                func.sum(OzonSale.amount).label('total')
-            ).filter(
-                OzonSale.token_id == token_id,
-                OzonSale.operation_date >= date_from,
-                OzonSale.operation_date <= date_to
-            ).first()
+            orders, sales = SalesService._get_period_totals(wb_ids, ozon_ids, date_from_start, date_to_end)
 
-            count = count_query.count or 0
-            total = float(total_query.total or 0.0)
+            empty = {'total': 0.0, 'count': 0}
+            tokens_data = []
+            orders_total = {'total': 0.0, 'count': 0}
+            sales_total = {'total': 0.0, 'count': 0}
+
+            for token in tokens:
+                token_orders = orders.get(token.id, empty)
+                token_sales = sales.get(token.id, empty)
+
+                orders_total['total'] += token_orders['total']
+                orders_total['count'] += token_orders['count']
+                sales_total['total'] += token_sales['total']
+                sales_total['count'] += token_sales['count']
+
+                tokens_data.append({
+                    'token_id': token.id,
+                    'token_name': token.name or token.get_marketplace_display(),
+                    'marketplace': token.get_marketplace_display(),
+                    'orders': dict(token_orders),
+                    'sales': dict(token_sales)
+                })
 
             return {
                 'success': True,
-                'total': total,
-                'count': count,
+                'tokens': tokens_data,
+                'orders': orders_total,
+                'sales': sales_total,
                 'error': None
             }
 
         except Exception as e:
             return {
                 'success': False,
-                'total': 0.0,
-                'count': 0,
-                'error': f'Ошибка БД Ozon: {str(e)}'
+                'tokens': [],
+                'orders': {'total': 0.0, 'count': 0},
+                'sales': {'total': 0.0, 'count': 0},
+                'error': f'Ошибка при получении данных: {str(e)}'
             }
 
+    # Источники ленты событий: код участвует в сортировке и курсоре
+    EVENT_SOURCES = {
+        1: ('wb_order', 'order', 'wildberries'),
+        2: ('wb_sale', 'sale', 'wildberries'),
+        3: ('ozon_order', 'order', 'ozon'),
+        4: ('ozon_sale', 'sale', 'ozon'),
+    }
+
+    @staticmethod
+    def encode_events_cursor(date: datetime, source: int, row_id: int) -> str:
+        """Курсор ленты событий: дата|источник|id последнего события страницы"""
+        return f'{date.isoformat()}|{source}|{row_id}'
+
+    @staticmethod
+    def decode_events_cursor(cursor: str) -> Optional[Tuple[datetime, int, int]]:
+        """Разобрать курсор ленты событий (None, если курсор некорректный)"""
+        try:
+            date_str, source, row_id = cursor.split('|')
+            return datetime.fromisoformat(date_str), int(source), int(row_id)
+        except (ValueError, AttributeError):
+            return None
+
     @staticmethod
-    def get_events_feed(limit: int = 50) -> Dict:
+    def get_events_feed(limit: int = 50, cursor: Optional[str] = None) -> Dict:
         """
-        Получить ленту событий (заказы и продажи) со всех маркетплейсов за сегодня.
-        События отсортированы по дате (новые сверху).
+        Получить ленту событий (заказы и продажи) со всех маркетплейсов.
+        События отсортированы по (дата, источник, id) от новых к старым,
+        страницы запрашиваются курсором из next_cursor предыдущей страницы.
+
+        Лента строится одним запросом UNION ALL ... ORDER BY ... LIMIT по четырём таблицам;
+        каждая ветка сама отбирает не больше limit строк по индексу (token_id, дата).
 
         Args:
-            limit: Максимальное количество событий
+            limit: Максимальное количество событий на странице
+            cursor: Курсор предыдущей страницы (None - самые новые события)
 
         Returns:
-            Dict с событиями
+            Dict с событиями и курсором следующей страницы
         """
-        from app.models.wildberries import WBOrder, WBSale
 
         try:
-            # Получаем начало сегодняшнего дня
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            position = None
+            if cursor:
+                position = SalesService.decode_events_cursor(cursor)
+                if position is None:
+                    return {
+                        'success': False,
+                        'events': [],
+                        'next_cursor': None,
+                        'error': 'Некорректный курсор'
+                    }
 
             # Получаем все активные токены WB и Ozon
             tokens = Token.query.filter(
@@ -571,146 +714,106 @@ class SalesService:
                 return {
                     'success': True,
                     'events': [],
+                    'next_cursor': None,
                     'error': None
                 }
 
             # Создаём словарь токенов для быстрого доступа
-            tokens_map = {t.id: {'name': t.name or t.get_marketplace_display(), 'marketplace': t.marketplace} for t in tokens}
+            tokens_map = {t.id: t.name or t.get_marketplace_display() for t in tokens}
             token_ids = list(tokens_map.keys())
 
-            events = []
-
-            # Получаем заказы WB за сегодня
-            wb_orders = db.session.query(
-                WBOrder.id,
-                WBOrder.date,
-                WBOrder.price_with_disc,
-                WBOrder.supplier_article,
-                WBOrder.tech_size,
-                WBOrder.token_id
-            ).filter(
-                WBOrder.token_id.in_(token_ids),
-                WBOrder.date >= today_start
-            ).order_by(WBOrder.date.desc()).limit(limit).all()
-
-            for order in wb_orders:
-                token_info = tokens_map.get(order.token_id, {})
-                events.append({
-                    'id': f'wb_order_{order.id}',
-                    'type': 'order',
-                    'marketplace': 'wildberries',
-                    'token_name': token_info.get('name', 'Неизвестно'),
-                    'date': order.date.isoformat() if order.date else None,
-                    'price': float(order.price_with_disc or 0),
-                    'article': order.supplier_article or '',
-                    'size': order.tech_size or ''
-                })
+            def branch(source, id_column, token_column, date_column, price_column,
+                       article_column, size_column, product_column, *filters):
+                """Одна ветка UNION ALL с фильтром по курсору для этого источника"""
+                conditions = [token_column.in_(token_ids), date_column.isnot(None)]
+                conditions.extend(filters)
+                if position is not None:
+                    cursor_date, cursor_source, cursor_id = position
+                    # Порядок: дата DESC, источник DESC, id DESC
+                    if source < cursor_source:
+                        conditions.append(date_column <= cursor_date)
+                    elif source == cursor_source:
+                        conditions.append(db.or_(
+                            date_column < cursor_date,
+                            db.and_(date_column == cursor_date, id_column < cursor_id)
+                        ))
+                    else:
+                        conditions.append(date_column < cursor_date)
+
+                return db.session.query(
+                    literal(source, Integer).label('source'),
+                    id_column.label('id'),
+                    token_column.label('token_id'),
+                    date_column.label('date'),
+                    price_column.label('price'),
+                    article_column.label('article'),
+                    size_column.label('size'),
+                    product_column.label('product_id')
+                ).filter(*conditions).order_by(date_column.desc(), id_column.desc()).limit(limit).subquery().select()
+
+            no_text = cast(null(), String)
+            no_product = cast(null(), Integer)
+
+            feed = union_all(
+                # Заказы WB: артикул и размер есть в самой строке
+                branch(1, WBOrder.id, WBOrder.token_id, WBOrder.date, WBOrder.price_with_disc,
+                       WBOrder.supplier_article, WBOrder.tech_size, no_product),
+                # Продажи WB: размер в строке, артикул подтягивается после выборки страницы
+                branch(2, WBSale.id, WBSale.token_id, WBSale.date, WBSale.finished_price,
+                       no_text, WBSale.tech_size, WBSale.product_id),
+                # Заказы Ozon: offer_id разбирается на артикул/размер
+                branch(3, OzonOrder.id, OzonOrder.token_id, OzonOrder.in_process_at, OzonOrder.price,
+                       OzonOrder.offer_id, no_text, no_product),
+                # Продажи Ozon: только доставка покупателю
+                branch(4, OzonSale.id, OzonSale.token_id, OzonSale.operation_date, OzonSale.accruals_for_sale,
+                       OzonSale.offer_id, no_text, no_product,
+                       OzonSale.operation_type == 'OperationAgentDeliveredToCustomer'),
+            ).subquery()
+
+            rows = db.session.query(feed).order_by(
+                feed.c.date.desc(), feed.c.source.desc(), feed.c.id.desc()
+            ).limit(limit).all()
+
+            # Артикул продаж WB - одним запросом по первичному ключу только для строк страницы
+            product_ids = {row.product_id for row in rows if row.source == 2 and row.product_id}
+            wb_articles = {}
+            if product_ids:
+                wb_articles = dict(db.session.query(
+                    Product.id, Product.article
+                ).filter(Product.id.in_(product_ids)).all())
 
-            # Получаем продажи WB за сегодня (с джойном на Product для получения артикула)
-            from app.models.product import Product
-            from app.models.wildberries import WBGood
-
-            wb_sales = db.session.query(
-                WBSale.id,
-                WBSale.date,
-                WBSale.finished_price,
-                WBSale.token_id,
-                Product.article,
-                WBGood.tech_size
-            ).outerjoin(
-                Product, WBSale.product_id == Product.id
-            ).outerjoin(
-                WBGood, Product.barcode == WBGood.barcode
-            ).filter(
-                WBSale.token_id.in_(token_ids),
-                WBSale.date >= today_start
-            ).order_by(WBSale.date.desc()).limit(limit).all()
+            events = []
+            for row in rows:
+                prefix, event_type, marketplace = SalesService.EVENT_SOURCES[row.source]
 
-            for sale in wb_sales:
-                token_info = tokens_map.get(sale.token_id, {})
-                events.append({
-                    'id': f'wb_sale_{sale.id}',
-                    'type': 'sale',
-                    'marketplace': 'wildberries',
-                    'token_name': token_info.get('name', 'Неизвестно'),
-                    'date': sale.date.isoformat() if sale.date else None,
-                    'price': float(sale.finished_price or 0),
-                    'article': sale.article or '',
-                    'size': sale.tech_size or ''
-                })
+                if row.source == 2:
+                    article, size = wb_articles.get(row.product_id, ''), row.size
+                elif marketplace == 'ozon':
+                    # Артикул и размер из offer_id - тем же разбором, что и у коллектора
+                    article, size = split_offer_id(row.article)
+                else:
+                    article, size = row.article, row.size
 
-            # Получаем заказы Ozon за сегодня
-            ozon_orders = db.session.query(
-                OzonOrder.id,
-                OzonOrder.in_process_at,
-                OzonOrder.price,
-                OzonOrder.offer_id,
-                OzonOrder.token_id
-            ).filter(
-                OzonOrder.token_id.in_(token_ids),
-                OzonOrder.in_process_at >= today_start
-            ).order_by(OzonOrder.in_process_at.desc()).limit(limit).all()
-
-            for order in ozon_orders:
-                token_info = tokens_map.get(order.token_id, {})
-                # Парсим offer_id для получения артикула и размера (формат: артикул/размер)
-                article, size = '', ''
-                if order.offer_id:
-                    parts = order.offer_id.split('/')
-                    article = parts[0] if parts else ''
-                    size = parts[1] if len(parts) > 1 else ''
                 events.append({
-                    'id': f'ozon_order_{order.id}',
-                    'type': 'order',
-                    'marketplace': 'ozon',
-                    'token_name': token_info.get('name', 'Неизвестно'),
-                    'date': order.in_process_at.isoformat() if order.in_process_at else None,
-                    'price': float(order.price or 0),
-                    'article': article,
-                    'size': size
+                    'id': f'{prefix}_{row.id}',
+                    'type': event_type,
+                    'marketplace': marketplace,
+                    'token_name': tokens_map.get(row.token_id, 'Неизвестно'),
+                    'date': row.date.isoformat() if row.date else None,
+                    'price': float(row.price or 0),
+                    'article': article or '',
+                    'size': size or ''
                 })
 
-            # Получаем продажи Ozon за сегодня (только OperationAgentDeliveredToCustomer)
-            ozon_sales = db.session.query(
-                OzonSale.id,
-                OzonSale.operation_date,
-                OzonSale.accruals_for_sale,
-                OzonSale.offer_id,
-                OzonSale.token_id
-            ).filter(
-                OzonSale.token_id.in_(token_ids),
-                OzonSale.operation_type == 'OperationAgentDeliveredToCustomer',
-                OzonSale.operation_date >= today_start
-            ).order_by(OzonSale.operation_date.desc()).limit(limit).all()
-
-            for sale in ozon_sales:
-                token_info = tokens_map.get(sale.token_id, {})
-                # Парсим offer_id для получения артикула и размера (формат: артикул/размер)
-                article, size = '', ''
-                if sale.offer_id:
-                    parts = sale.offer_id.split('/')
-                    article = parts[0] if parts else ''
-                    size = parts[1] if len(parts) > 1 else ''
-                events.append({
-                    'id': f'ozon_sale_{sale.id}',
-                    'type': 'sale',
-                    'marketplace': 'ozon',
-                    'token_name': token_info.get('name', 'Неизвестно'),
-                    'date': sale.operation_date.isoformat() if sale.operation_date else None,
-                    'price': float(sale.accruals_for_sale or 0),
-                    'article': article,
-                    'size': size
-                })
-
-            # Сортируем все события по дате (новые сверху)
-            events.sort(key=lambda x: x['date'] if x['date'] else '', reverse=True)
-
-            # Ограничиваем количество событий
-            events = events[:limit]
+            next_cursor = None
+            if len(rows) == limit:
+                last = rows[-1]
+                next_cursor = SalesService.encode_events_cursor(last.date, last.source, last.id)
 
             return {
                 'success': True,
                 'events': events,
+                'next_cursor': next_cursor,
                 'error': None
             }
 
@@ -718,5 +821,6 @@ class SalesService:
             return {
                 'success': False,
                 'events': [],
+                'next_cursor': None,
                 'error': f'Ошибка при получении ленты событий: {str(e)}'
             }
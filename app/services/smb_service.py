@@ -1,7 +1,152 @@
-"""SMB сервис для работы с сетевыми папками"""
+"""SMB сервис для работы с сетевыми папками
+
+Соединения берутся из общего пула (SMBConnectionPool) по ключу host/port/user/share:
+`with SMBService()` не открывает новую NTLMv2-сессию, а получает свободное соединение
+и возвращает его в пул на выходе. Соединение, простоявшее дольше SMB_POOL_HEALTH_CHECK
+секунд, перед выдачей проверяется echo; простоявшее дольше SMB_POOL_IDLE_TIMEOUT - закрывается.
+Если внутри блока было исключение, соединение закрывается, а не возвращается в пул.
+
+read_files() читает несколько файлов параллельно - каждый поток со своим соединением из пула.
+"""
 import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from smb.SMBConnection import SMBConnection
-from flask import current_app
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+def _config(name, default):
+    """Настройка из конфигурации приложения (вне Flask - значение по умолчанию)"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+class SMBConnectionPool:
+    """Пул соединений к одной шаре"""
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, host, port, username, password, max_size=4, idle_timeout=300,
+                 health_check_after=30, acquire_timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # [(conn, released_at)], последние освобождённые - в конце
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def get(cls, host, port, username, password, share) -> 'SMBConnectionPool':
+        """Общий пул для параметров подключения"""
+        key = (host, port, username, share)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None or pool.password != password:
+                pool = cls(
+                    host, port, username, password,
+                    max_size=_config('SMB_POOL_SIZE', 4),
+                    idle_timeout=_config('SMB_POOL_IDLE_TIMEOUT', 300),
+                    health_check_after=_config('SMB_POOL_HEALTH_CHECK', 30),
+                    acquire_timeout=_config('SMB_POOL_ACQUIRE_TIMEOUT', 30)
+                )
+                cls._pools[key] = pool
+            return pool
+
+    def _open(self) -> SMBConnection:
+        conn = SMBConnection(
+            self.username,
+            self.password,
+            'client',
+            'server',
+            use_ntlm_v2=True,
+            is_direct_tcp=True
+        )
+        if not conn.connect(self.host, self.port):
+            raise ConnectionError(f"SMB authentication failed for {self.host}")
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            conn.echo(b'ping', timeout=5)
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self, now):
+        """Закрыть соединения, простоявшие дольше idle_timeout (под self._cond)"""
+        fresh = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+            else:
+                fresh.append((conn, released_at))
+        self._idle = fresh
+
+    def acquire(self) -> SMBConnection:
+        """Взять соединение из пула (ждёт, если все max_size соединений заняты)"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle or self._in_use < self.max_size:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError(f"No free SMB connection to {self.host} in {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+
+            candidate = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        try:
+            if candidate is not None:
+                conn, released_at = candidate
+                if time.monotonic() - released_at < self.health_check_after or self._is_alive(conn):
+                    return conn
+                logger.info(f"SMB connection to {self.host} failed health check, reconnecting")
+                self._close(conn)
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, broken: bool = False):
+        """Вернуть соединение в пул (broken - закрыть вместо возврата)"""
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """Закрыть свободные соединения"""
+        with self._cond:
+            for conn, _ in self._idle:
+                self._close(conn)
+            self._idle = []
 
 
 class SMBService:
@@ -13,24 +158,19 @@ class SMBService:
         self.username = username or current_app.config['SMB_USER']
         self.password = password or current_app.config['SMB_PASSWORD']
         self.share = share or current_app.config['SMB_SHARE']
+        self.pool = SMBConnectionPool.get(self.host, self.port, self.username, self.password, self.share)
         self.conn = None
 
     def connect(self):
-        """Установить соединение с SMB сервером"""
-        self.conn = SMBConnection(
-            self.username,
-            self.password,
-            'client',
-            'server',
-            use_ntlm_v2=True,
-            is_direct_tcp=True
-        )
-        return self.conn.connect(self.host, self.port)
+        """Взять соединение из пула"""
+        if not self.conn:
+            self.conn = self.pool.acquire()
+        return True
 
-    def disconnect(self):
-        """Закрыть соединение"""
+    def disconnect(self, broken: bool = False):
+        """Вернуть соединение в пул"""
         if self.conn:
-            self.conn.close()
+            self.pool.release(self.conn, broken=broken)
             self.conn = None
 
     def list_files(self, path):
@@ -45,7 +185,8 @@ class SMBService:
                     'filename': f.filename,
                     'is_directory': f.isDirectory,
                     'size': f.file_size,
-                    'create_time': f.create_time
+                    'create_time': f.create_time,
+                    'last_write_time': f.last_write_time
                 })
         return files
 
@@ -88,6 +229,44 @@ class SMBService:
         file_obj.seek(0)
         return file_obj
 
+    def _read_pooled(self, path):
+        """Прочитать файл на отдельном соединении из пула (для потоков read_files)"""
+        conn = self.pool.acquire()
+        try:
+            file_obj = io.BytesIO()
+            conn.retrieveFile(self.share, path, file_obj)
+            file_obj.seek(0)
+        except Exception:
+            self.pool.release(conn, broken=True)
+            raise
+        self.pool.release(conn)
+        return file_obj
+
+    def read_files(self, paths, max_workers=None):
+        """Прочитать несколько файлов параллельно
+
+        Args:
+            paths: пути к файлам на шаре
+            max_workers: потоков чтения (по умолчанию SMB_READ_WORKERS, не больше размера пула)
+
+        Returns:
+            {path: BytesIO или Exception} - ошибка чтения одного файла не прерывает остальные
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+
+        max_workers = min(max_workers or _config('SMB_READ_WORKERS', 4), self.pool.max_size, len(paths))
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {path: executor.submit(self._read_pooled, path) for path in paths}
+            for path, future in futures.items():
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = e
+        return results
+
     def file_exists(self, path):
         """Проверить существование файла"""
         if not self.conn:
@@ -126,4 +305,5 @@ class SMBService:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.disconnect()
+        # После ошибки состояние соединения неизвестно - не возвращаем его в пул
+        self.disconnect(broken=exc_type is not None)
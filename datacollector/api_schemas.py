@@ -389,160 +389,3 @@ class WBCardsListResponse(BaseModel):
 
     cards: List[WBCard]
     cursor: Optional[WBCardsCursor] = None
-
-
-# ==============================================================================
-# Validation Functions
-# ==============================================================================
-
-def validate_ozon_fbs_list(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v3/posting/fbs/list"""
-    try:
-        validated = OzonFBSListResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonFBSListResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_ozon_fbo_list(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v2/posting/fbo/list"""
-    try:
-        validated = OzonFBOListResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonFBOListResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_ozon_finance(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v3/finance/transaction/list"""
-    try:
-        validated = OzonFinanceResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonFinanceResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_ozon_supply_list(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v3/supply-order/list"""
-    try:
-        validated = OzonSupplyOrderListResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonSupplyOrderListResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_ozon_supply_get(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v3/supply-order/get"""
-    try:
-        validated = OzonSupplyOrderGetResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonSupplyOrderGetResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_ozon_bundle(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа /v1/supply-order/bundle"""
-    try:
-        validated = OzonBundleResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, OzonBundleResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_wb_incomes(response_data: list) -> tuple[bool, str, list]:
-    """Валидация ответа WB incomes"""
-    try:
-        if not response_data:
-            return True, "OK (empty)", []
-        for item in response_data[:5]:  # Проверяем первые 5
-            WBIncome(**item)
-        extra_fields = _get_extra_fields_list(response_data, WBIncome)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_wb_sales(response_data: list) -> tuple[bool, str, list]:
-    """Валидация ответа WB sales"""
-    try:
-        if not response_data:
-            return True, "OK (empty)", []
-        for item in response_data[:5]:
-            WBSale(**item)
-        extra_fields = _get_extra_fields_list(response_data, WBSale)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_wb_orders(response_data: list) -> tuple[bool, str, list]:
-    """Валидация ответа WB orders"""
-    try:
-        if not response_data:
-            return True, "OK (empty)", []
-        for item in response_data[:5]:
-            WBOrder(**item)
-        extra_fields = _get_extra_fields_list(response_data, WBOrder)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_wb_stocks(response_data: list) -> tuple[bool, str, list]:
-    """Валидация ответа WB stocks"""
-    try:
-        if not response_data:
-            return True, "OK (empty)", []
-        for item in response_data[:5]:
-            WBStock(**item)
-        extra_fields = _get_extra_fields_list(response_data, WBStock)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def validate_wb_cards(response_data: dict) -> tuple[bool, str, list]:
-    """Валидация ответа WB cards"""
-    try:
-        validated = WBCardsListResponse(**response_data)
-        extra_fields = _get_extra_fields(response_data, WBCardsListResponse)
-        return True, "OK", extra_fields
-    except Exception as e:
-        return False, str(e), []
-
-
-def _get_extra_fields(data: dict, model: type) -> list:
-    """Получить список полей в данных, которых нет в модели"""
-    if not isinstance(data, dict):
-        return []
-
-    model_fields = set(model.model_fields.keys())
-    data_fields = set(data.keys())
-    extra = data_fields - model_fields
-
-    # Рекурсивно проверяем вложенные объекты
-    result = [f"root.{f}" for f in extra]
-
-    return result
-
-
-def _get_extra_fields_list(data: list, model: type) -> list:
-    """Получить список полей из списка объектов"""
-    if not data:
-        return []
-
-    model_fields = set(model.model_fields.keys())
-    all_extra = set()
-
-    for item in data[:10]:  # Проверяем первые 10
-        if isinstance(item, dict):
-            extra = set(item.keys()) - model_fields
-            all_extra.update(extra)
-
-    return list(all_extra)
@@ -1,11 +1,20 @@
 """
 Валидатор ответов API маркетплейсов.
 Проверяет формат ответов и уведомляет при изменениях.
+
+Режимы валидации (DataCollectorConfig.API_VALIDATION_MODE):
+- off        - валидация отключена
+- first_page - только первая страница каждого API в рамках одного запуска задачи
+- sample     - каждая N-я страница (N = DataCollectorConfig.API_VALIDATION_SAMPLE_RATE)
+- full       - каждая страница
 """
 import logging
+import threading
+import time
 from typing import Optional, Tuple, List
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 
+from datacollector.config import DataCollectorConfig
 from datacollector.api_schemas import (
     OzonFBSListResponse,
     OzonFBOListResponse,
@@ -20,10 +29,92 @@ from datacollector.notifier import APIValidationNotifier
 
 logger = logging.getLogger(__name__)
 
+VALIDATION_MODES = ('off', 'first_page', 'sample', 'full')
+
 
 class APIValidator:
     """Валидатор ответов API"""
 
+    # Значения из DataCollectorConfig применяются через configure() при загрузке модуля
+    mode = 'first_page'
+    sample_rate = 10
+
+    _adapters = {}
+    _counters = {}
+    _stats = {}  # api_name -> {'pages', 'validated', 'seconds'}
+    _lock = threading.Lock()
+    _run_state = threading.local()
+
+    @classmethod
+    def configure(cls, mode: str = None, sample_rate: int = None):
+        """Изменить режим валидации"""
+        if mode is not None:
+            if mode not in VALIDATION_MODES:
+                raise ValueError(f"Unknown validation mode: {mode}")
+            cls.mode = mode
+        if sample_rate is not None:
+            cls.sample_rate = max(1, int(sample_rate))
+        logger.info(f"API validation mode: {cls.mode} (sample rate 1/{cls.sample_rate})")
+
+    @classmethod
+    def start_run(cls):
+        """Начать новый запуск (для режима first_page), вызывается в начале задачи"""
+        cls._run_state.validated = set()
+
+    @classmethod
+    def _should_validate(cls, api_name: str) -> bool:
+        """Решить, валидировать ли текущую страницу"""
+        if cls.mode == 'off':
+            return False
+        if cls.mode == 'full':
+            return True
+        if cls.mode == 'first_page':
+            validated = getattr(cls._run_state, 'validated', None)
+            if validated is None:
+                validated = cls._run_state.validated = set()
+            if api_name in validated:
+                return False
+            validated.add(api_name)
+            return True
+        # sample
+        with cls._lock:
+            count = cls._counters.get(api_name, 0)
+            cls._counters[api_name] = count + 1
+        return count % cls.sample_rate == 0
+
+    @classmethod
+    def _get_adapter(cls, model: type) -> TypeAdapter:
+        """TypeAdapter строится один раз на модель"""
+        adapter = cls._adapters.get(model)
+        if adapter is None:
+            adapter = cls._adapters[model] = TypeAdapter(model)
+        return adapter
+
+    @classmethod
+    def _record(cls, api_name: str, validated: bool, seconds: float = 0.0):
+        with cls._lock:
+            stats = cls._stats.setdefault(api_name, {'pages': 0, 'validated': 0, 'seconds': 0.0})
+            stats['pages'] += 1
+            if validated:
+                stats['validated'] += 1
+                stats['seconds'] += seconds
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """Статистика валидации: страниц всего, проверено и затраченное время"""
+        with cls._lock:
+            return {api_name: dict(stats) for api_name, stats in cls._stats.items()}
+
+    @classmethod
+    def log_stats(cls):
+        """Вывести статистику валидации в лог"""
+        for api_name, stats in cls.get_stats().items():
+            avg_ms = stats['seconds'] / stats['validated'] * 1000 if stats['validated'] else 0
+            logger.info(
+                f"API validation [{cls.mode}] {api_name}: {stats['validated']}/{stats['pages']} pages, "
+                f"{stats['seconds']:.2f}s total, {avg_ms:.1f}ms avg"
+            )
+
     @staticmethod
     def _get_extra_fields(data: dict, model_fields: set) -> List[str]:
         """Получить список новых полей, которых нет в модели"""
@@ -32,137 +123,99 @@ class APIValidator:
         data_fields = set(data.keys())
         return list(data_fields - model_fields)
 
-    @staticmethod
-    def validate_ozon_fbs_list(response_data: dict) -> Tuple[bool, Optional[str]]:
-        """Валидация ответа /v3/posting/fbs/list"""
-        api_name = "FBS Orders (/v3/posting/fbs/list)"
+    @classmethod
+    def _validate(cls, marketplace: str, api_name: str, log_name: str, model: type,
+                  response_data, check_extra: bool = True) -> Tuple[bool, Optional[str]]:
+        """Общая валидация ответа с учётом режима и замером времени"""
+        if not cls._should_validate(api_name):
+            cls._record(api_name, validated=False)
+            return True, None
+
+        started = time.perf_counter()
         try:
-            validated = OzonFBSListResponse(**response_data)
+            cls._get_adapter(model).validate_python(response_data)
 
             # Проверяем новые поля
-            extra = APIValidator._get_extra_fields(response_data, set(OzonFBSListResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
+            if check_extra:
+                extra = cls._get_extra_fields(response_data, set(model.model_fields.keys()))
+                if extra:
+                    APIValidationNotifier.notify_new_fields(marketplace, api_name, extra)
 
             return True, None
         except ValidationError as e:
             error_msg = str(e)
-            logger.error(f"Ozon FBS API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
+            logger.error(f"{log_name} API validation error: {error_msg}")
+            APIValidationNotifier.notify_validation_error(marketplace, api_name, error_msg)
             return False, error_msg
+        finally:
+            elapsed = time.perf_counter() - started
+            cls._record(api_name, validated=True, seconds=elapsed)
+            logger.debug(f"{log_name} API validated in {elapsed * 1000:.1f}ms")
+
+    @staticmethod
+    def validate_ozon_fbs_list(response_data: dict) -> Tuple[bool, Optional[str]]:
+        """Валидация ответа /v3/posting/fbs/list"""
+        return APIValidator._validate(
+            "Ozon", "FBS Orders (/v3/posting/fbs/list)", "Ozon FBS", OzonFBSListResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_fbo_list(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v2/posting/fbo/list"""
-        api_name = "FBO Orders (/v2/posting/fbo/list)"
-        try:
-            validated = OzonFBOListResponse(**response_data)
-
-            extra = APIValidator._get_extra_fields(response_data, set(OzonFBOListResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
-
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon FBO API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "FBO Orders (/v2/posting/fbo/list)", "Ozon FBO", OzonFBOListResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_finance(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v3/finance/transaction/list"""
-        api_name = "Finance (/v3/finance/transaction/list)"
-        try:
-            validated = OzonFinanceResponse(**response_data)
-
-            extra = APIValidator._get_extra_fields(response_data, set(OzonFinanceResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
-
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Finance API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Finance (/v3/finance/transaction/list)", "Ozon Finance", OzonFinanceResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_supply_list(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v3/supply-order/list"""
-        api_name = "Supply Orders (/v3/supply-order/list)"
-        try:
-            validated = OzonSupplyOrderListResponse(**response_data)
-
-            extra = APIValidator._get_extra_fields(response_data, set(OzonSupplyOrderListResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
-
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Supply List API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Supply Orders (/v3/supply-order/list)", "Ozon Supply List",
+            OzonSupplyOrderListResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_supply_get(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v3/supply-order/get"""
-        api_name = "Supply Orders Get (/v3/supply-order/get)"
-        try:
-            validated = OzonSupplyOrderGetResponse(**response_data)
-
-            extra = APIValidator._get_extra_fields(response_data, set(OzonSupplyOrderGetResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
-
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Supply Get API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Supply Orders Get (/v3/supply-order/get)", "Ozon Supply Get",
+            OzonSupplyOrderGetResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_bundle(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v1/supply-order/bundle"""
-        api_name = "Supply Bundle (/v1/supply-order/bundle)"
-        try:
-            validated = OzonBundleResponse(**response_data)
-
-            extra = APIValidator._get_extra_fields(response_data, set(OzonBundleResponse.model_fields.keys()))
-            if extra:
-                APIValidationNotifier.notify_new_fields("Ozon", api_name, extra)
-
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Bundle API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Supply Bundle (/v1/supply-order/bundle)", "Ozon Bundle", OzonBundleResponse, response_data
+        )
 
     @staticmethod
     def validate_ozon_report_create(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v1/report/products/create"""
-        api_name = "Report Create (/v1/report/products/create)"
-        try:
-            validated = OzonReportCreateResponse(**response_data)
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Report Create API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Report Create (/v1/report/products/create)", "Ozon Report Create",
+            OzonReportCreateResponse, response_data, check_extra=False
+        )
 
     @staticmethod
     def validate_ozon_report_info(response_data: dict) -> Tuple[bool, Optional[str]]:
         """Валидация ответа /v1/report/info"""
-        api_name = "Report Info (/v1/report/info)"
-        try:
-            validated = OzonReportInfoResponse(**response_data)
-            return True, None
-        except ValidationError as e:
-            error_msg = str(e)
-            logger.error(f"Ozon Report Info API validation error: {error_msg}")
-            APIValidationNotifier.notify_validation_error("Ozon", api_name, error_msg)
-            return False, error_msg
+        return APIValidator._validate(
+            "Ozon", "Report Info (/v1/report/info)", "Ozon Report Info",
+            OzonReportInfoResponse, response_data, check_extra=False
+        )
+
+
+# Режим из конфигурации проверяется при загрузке: опечатка в API_VALIDATION_MODE
+# останавливает запуск, а не меняет поведение валидации молча
+APIValidator.configure(
+    mode=getattr(DataCollectorConfig, 'API_VALIDATION_MODE', 'first_page'),
+    sample_rate=getattr(DataCollectorConfig, 'API_VALIDATION_SAMPLE_RATE', 10)
+)
@@ -0,0 +1,129 @@
+"""
+Группировка артикулов WB (wb_article_groups) для страницы article-grouping.
+
+Строка = остаток vendor_code на токене вместе с imt_id и "моим артикулом"
+(первые 4 символа vendor_code). Пересчёт инкрементальный:
+- collect_stocks пересчитывает строки своего токена из current_stock
+  в той же транзакции, что и снимок остатков;
+- collect_goods отмечает vendor_code, у которых сменился imt_id (mark_vendor_code),
+  и перед коммитом пересчитывает только их (refresh_marked).
+
+Полная перестройка:
+    python -m datacollector.article_groups
+"""
+import logging
+import sys
+from datetime import datetime
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from datacollector.config import DataCollectorConfig
+from app.models import CurrentStock, WBGood, WBArticleGroup
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'article_groups_vendor_codes'
+
+
+def ensure_table(engine):
+    """Создать таблицу wb_article_groups, если её ещё нет"""
+    WBArticleGroup.__table__.create(engine, checkfirst=True)
+
+
+def mark_vendor_code(session, vendor_code: str):
+    """Отметить vendor_code, группировку которого нужно пересчитать перед коммитом"""
+    if vendor_code:
+        session.info.setdefault(SESSION_KEY, set()).add(vendor_code)
+
+
+def _rebuild(session, *filters) -> int:
+    """Удалить и заново посчитать строки, попадающие под условия (по CurrentStock/WBGood)"""
+    rows = session.query(
+        CurrentStock.token_id,
+        func.substr(WBGood.vendor_code, 1, 4).label('my_article'),
+        WBGood.imt_id,
+        WBGood.vendor_code,
+        func.sum(CurrentStock.quantity).label('stock')
+    ).join(
+        WBGood, WBGood.id == CurrentStock.wb_good_id
+    ).filter(
+        WBGood.imt_id.isnot(None),
+        WBGood.vendor_code.isnot(None),
+        *filters
+    ).group_by(
+        CurrentStock.token_id, WBGood.imt_id, WBGood.vendor_code
+    ).having(
+        func.sum(CurrentStock.quantity) > 0
+    ).all()
+
+    now = datetime.utcnow()
+    mappings = [{
+        'token_id': row.token_id,
+        'my_article': row.my_article,
+        'imt_id': row.imt_id,
+        'vendor_code': row.vendor_code,
+        'stock': int(row.stock or 0),
+        'updated_at': now,
+    } for row in rows]
+    if mappings:
+        session.bulk_insert_mappings(WBArticleGroup, mappings)
+    return len(mappings)
+
+
+def refresh_token(session, token_id: int) -> int:
+    """Пересчитать группировку токена после смены снимка остатков (без коммита)"""
+    session.query(WBArticleGroup).filter(
+        WBArticleGroup.token_id == token_id
+    ).delete(synchronize_session=False)
+    session.flush()
+    return _rebuild(session, CurrentStock.token_id == token_id)
+
+
+def refresh_marked(session) -> int:
+    """Пересчитать отмеченные vendor_code по всем токенам (без коммита)"""
+    marked = session.info.pop(SESSION_KEY, None)
+    if not marked:
+        return 0
+
+    vendor_codes = list(marked)
+    session.query(WBArticleGroup).filter(
+        WBArticleGroup.vendor_code.in_(vendor_codes)
+    ).delete(synchronize_session=False)
+    session.flush()
+    return _rebuild(session, WBGood.vendor_code.in_(vendor_codes))
+
+
+def rebuild_all(session) -> int:
+    """Полная перестройка таблицы"""
+    session.query(WBArticleGroup).delete(synchronize_session=False)
+    session.flush()
+    return _rebuild(session, CurrentStock.marketplace == 'wildberries')
+
+
+def main():
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    engine = create_engine(DataCollectorConfig.DATABASE_URI)
+    ensure_table(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+
+    try:
+        stored = rebuild_all(session)
+        session.commit()
+        print(f"Записано строк: {stored}")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    print("\nПерестройка завершена!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Circuit breaker для API маркетплейсов.
+
+Один breaker на группу API (хост): после N подряд ошибок (5xx, таймауты, сетевые ошибки)
+breaker открывается, и задачи этой группы откладываются без обращения к API.
+По истечении recovery_timeout пропускается один пробный запрос (half-open):
+успех закрывает breaker, ошибка снова открывает его с увеличенным таймаутом.
+На каждый сбой отправляется одно уведомление в Telegram и одно - о восстановлении.
+"""
+import logging
+import threading
+import time
+
+from datacollector.config import DataCollectorConfig
+from datacollector.notifier import APIValidationNotifier
+
+logger = logging.getLogger(__name__)
+
+# Группы API
+WB_STATISTICS = 'wb_statistics'
+WB_CONTENT = 'wb_content'
+OZON_SELLER = 'ozon_seller'
+
+# Группа API для каждого endpoint задачи
+ENDPOINT_GROUPS = {
+    'incomes': WB_STATISTICS,
+    'sales': WB_STATISTICS,
+    'orders': WB_STATISTICS,
+    'stocks': WB_STATISTICS,
+    'goods': WB_CONTENT,
+    'ozon_stocks': OZON_SELLER,
+    'ozon_sales': OZON_SELLER,
+    'ozon_orders': OZON_SELLER,
+    'ozon_supply_orders': OZON_SELLER,
+}
+
+GROUP_NAMES = {
+    WB_STATISTICS: ('Wildberries', 'statistics-api.wildberries.ru'),
+    WB_CONTENT: ('Wildberries', 'content-api.wildberries.ru'),
+    OZON_SELLER: ('Ozon', 'api-seller.ozon.ru'),
+}
+
+# Пробный запрос считается потерянным, если не завершился за это время (в секундах)
+PROBE_TIMEOUT = 300
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker for one API group"""
+
+    def __init__(self, group: str, failure_threshold: int = 5, recovery_timeout: float = 120,
+                 max_recovery_timeout: float = 1800):
+        self.group = group
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.current_timeout = recovery_timeout
+        self.opened_at = None
+        self.outage_started_at = None
+        self.probe_in_flight = False
+        self.probe_started_at = None
+        self.last_error = None
+
+    def is_blocked(self) -> bool:
+        """Check without side effects: should queued tasks of this group be deferred"""
+        with self.lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.current_timeout
+            if self.state == HALF_OPEN:
+                return self._probe_active()
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed"""
+        with self.lock:
+            if self.state == OPEN:
+                return max(self.current_timeout - (time.monotonic() - self.opened_at), 1)
+            if self.state == HALF_OPEN:
+                return self.recovery_timeout
+            return 0
+
+    def allow_request(self) -> bool:
+        """Check before a request. In half-open state only one probe request is allowed"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.current_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+                logger.info(f"Circuit {self.group}: half-open, sending probe request")
+            if self._probe_active():
+                return False
+            self.probe_in_flight = True
+            self.probe_started_at = time.monotonic()
+            return True
+
+    def _probe_active(self) -> bool:
+        """Probe request is in flight and not lost (call under lock)"""
+        return self.probe_in_flight and time.monotonic() - self.probe_started_at < PROBE_TIMEOUT
+
+    def record_success(self):
+        """Request reached the API and got a non-error response"""
+        recovered_after = None
+        with self.lock:
+            if self.state != CLOSED:
+                recovered_after = time.monotonic() - self.outage_started_at
+                logger.info(f"Circuit {self.group}: closed, API recovered after {recovered_after:.0f}s")
+            self.state = CLOSED
+            self.failures = 0
+            self.current_timeout = self.recovery_timeout
+            self.probe_in_flight = False
+            self.outage_started_at = None
+
+        if recovered_after is not None:
+            marketplace, host = GROUP_NAMES.get(self.group, ('', self.group))
+            APIValidationNotifier.notify_api_recovered(marketplace, host, recovered_after)
+
+    def record_failure(self, error: str):
+        """Request failed with 5xx, timeout or network error"""
+        notify = False
+        with self.lock:
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                # Пробный запрос не прошёл - снова открываем с увеличенным таймаутом
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+                self.current_timeout = min(self.current_timeout * 2, self.max_recovery_timeout)
+                logger.warning(f"Circuit {self.group}: probe failed, open for {self.current_timeout:.0f}s")
+                return
+
+            self.failures += 1
+            if self.state == CLOSED and self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.outage_started_at = self.opened_at
+                notify = True
+                logger.error(f"Circuit {self.group}: open after {self.failures} consecutive failures: {error}")
+
+        if notify:
+            marketplace, host = GROUP_NAMES.get(self.group, ('', self.group))
+            APIValidationNotifier.notify_api_down(marketplace, host, self.failure_threshold, error)
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers by API group"""
+
+    _breakers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, group: str) -> CircuitBreaker:
+        """Получить breaker для группы API"""
+        with cls._lock:
+            breaker = cls._breakers.get(group)
+            if breaker is None:
+                breaker = cls._breakers[group] = CircuitBreaker(
+                    group,
+                    failure_threshold=getattr(DataCollectorConfig, 'CIRCUIT_FAILURE_THRESHOLD', 5),
+                    recovery_timeout=getattr(DataCollectorConfig, 'CIRCUIT_RECOVERY_TIMEOUT', 120),
+                )
+            return breaker
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str):
+        """Получить breaker для endpoint задачи (None, если группа неизвестна)"""
+        group = ENDPOINT_GROUPS.get(endpoint)
+        return cls.get(group) if group else None
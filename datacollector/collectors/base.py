@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.models import Product, Warehouse, SyncState, CollectionLog
@@ -14,6 +15,29 @@ class BaseCollector:
         self.engine = create_engine(database_uri)
         self.Session = sessionmaker(bind=self.engine)
 
+    @staticmethod
+    def get_retry_after(headers, default: float) -> float:
+        """
+        Get delay from Retry-After (seconds or HTTP date) or X-Ratelimit-Retry headers.
+        Returns default if the server did not provide a delay.
+        """
+        if not headers:
+            return default
+
+        value = headers.get('Retry-After') or headers.get('X-Ratelimit-Retry')
+        if not value:
+            return default
+
+        try:
+            delay = float(value)
+        except (TypeError, ValueError):
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return default
+
+        return min(max(delay, 1), 3600)
+
     def get_or_create_product(self, session, token_id: int, marketplace: str, data: dict) -> Product:
         """Get existing product or create new one"""
         article = data.get('supplierArticle')
@@ -41,6 +65,49 @@ class BaseCollector:
 
         return product
 
+    def get_or_create_products(self, session, token_id: int, marketplace: str, items: list) -> dict:
+        """
+        Batch version of get_or_create_product.
+        Loads all known articles with one query and creates missing ones with one flush.
+        Returns dict {article: Product}.
+        """
+        items_by_article = {}
+        for data in items:
+            article = data.get('supplierArticle')
+            if article not in items_by_article:
+                items_by_article[article] = data
+
+        if not items_by_article:
+            return {}
+
+        products = {
+            product.article: product
+            for product in session.query(Product).filter(
+                Product.token_id == token_id,
+                Product.marketplace == marketplace,
+                Product.article.in_(list(items_by_article.keys()))
+            ).all()
+        }
+
+        for article, data in items_by_article.items():
+            if article in products:
+                continue
+            product = Product(
+                token_id=token_id,
+                marketplace=marketplace,
+                article=article,
+                nm_id=data.get('nmId'),
+                barcode=data.get('barcode'),
+                brand=data.get('brand'),
+                category=data.get('category'),
+                subject=data.get('subject')
+            )
+            session.add(product)
+            products[article] = product
+
+        session.flush()
+        return products
+
     def get_or_create_warehouse(self, session, marketplace: str, warehouse_name: str) -> Warehouse:
         """Get existing warehouse or create new one"""
         if not warehouse_name:
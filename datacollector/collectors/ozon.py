@@ -1,19 +1,31 @@
 import json
 import logging
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
 from datacollector.collectors.base import BaseCollector
 from datacollector.api_validator import APIValidator
+from datacollector.queue_manager import RetryLater
+from datacollector.circuit_breaker import CircuitBreakerRegistry, OZON_SELLER
+from datacollector import rollup
+from datacollector import current_stock
 from app.models import OzonStock, OzonSale, OzonOrder, OzonSupplyOrder, OzonSupplyItem
+from app.services.offer_utils import split_offer_id, split_stored_offer_id, extract_buyer_id
 
 logger = logging.getLogger(__name__)
 
 # Таймаут для API запросов (в секундах)
 API_TIMEOUT = 120
-# Максимальное количество попыток
-MAX_RETRIES = 3
+# Задержка по умолчанию, если сервер не вернул Retry-After (в секундах)
+RATE_LIMIT_RETRY_DELAY = 30
+TRANSIENT_RETRY_DELAY = 10
+# Параллельная загрузка состава поставок (bundle)
+BUNDLE_WORKERS = 3
+# Минимальный интервал между запросами bundle одного токена (в секундах)
+BUNDLE_MIN_INTERVAL = 0.4
 
 
 class OzonCollector(BaseCollector):
@@ -33,78 +45,52 @@ class OzonCollector(BaseCollector):
             'Content-Type': 'application/json'
         }
 
+        self._throttle_lock = threading.Lock()
+        self._next_request_at = 0.0
+
     def _request_with_retry(self, method: str, url: str, **kwargs) -> requests.Response:
         """
-        Выполнить HTTP запрос с retry и увеличенным timeout.
+        Выполнить HTTP запрос с увеличенным timeout.
+        При 429, 5xx и сетевых ошибках выбрасывает RetryLater с задержкой из Retry-After:
+        задача возвращается в очередь, а воркер не спит и берёт следующую.
         """
         kwargs.setdefault('timeout', API_TIMEOUT)
         kwargs.setdefault('headers', self.headers)
-        last_error = None
-
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                if method.upper() == 'GET':
-                    response = requests.get(url, **kwargs)
-                else:
-                    response = requests.post(url, **kwargs)
-
-                # Для 429 делаем retry с ожиданием
-                if response.status_code == 429:
-                    logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: Rate limit 429, waiting 30s")
-                    time.sleep(30)
-                    continue
-
-                return response
-
-            except requests.exceptions.Timeout:
-                last_error = f"Request timeout after {kwargs.get('timeout')}s"
-                logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: {last_error}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(10)
-            except requests.exceptions.RequestException as e:
-                last_error = f"Request error: {e}"
-                logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: {last_error}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(10)
 
-        logger.error(f"Max retries exceeded for {url}")
-        raise requests.exceptions.RequestException(last_error)
+        # Если API недоступен, не обращаемся к нему до пробного запроса
+        breaker = CircuitBreakerRegistry.get(OZON_SELLER)
+        if not breaker.allow_request():
+            raise RetryLater(f"Circuit open for {OZON_SELLER}", retry_after=breaker.retry_after())
 
-    @staticmethod
-    def parse_offer_id(offer_id: str) -> tuple:
-        """
-        Parse offer_id to extract article and size
-        Format: article/size
-
-        Examples:
-        - 3031080131/S -> (3031080131, S)
-        - 3031080131/65 -> (3031080131, 6,5)
-        - 3031080131/685 -> (3031080131, 6-8,5)
-        """
-        if not offer_id or '/' not in offer_id:
-            return (offer_id, '')
-
-        parts = offer_id.split('/')
-        article = parts[0]
-        size_raw = parts[1] if len(parts) > 1 else ''
-
-        # Parse numeric sizes
-        if size_raw.isdigit():
-            size_num = int(size_raw)
-
-            # Special case: 685 -> "6-8,5"
-            if size_num == 685:
-                size = "6-8,5"
-            # Standard sizes: 65->6,5, 75->7,5, etc.
-            elif size_num >= 65 and size_num % 10 == 5:
-                size = f"{size_num // 10},{size_num % 10}"
+        try:
+            if method.upper() == 'GET':
+                response = requests.get(url, **kwargs)
             else:
-                size = size_raw
-        else:
-            # Letter sizes (S, M, L, etc.)
-            size = size_raw
-
-        return (article, size)
+                response = requests.post(url, **kwargs)
+        except requests.exceptions.Timeout:
+            error = f"Request timeout after {kwargs.get('timeout')}s: {url}"
+            breaker.record_failure(error)
+            raise RetryLater(error, retry_after=TRANSIENT_RETRY_DELAY)
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure(str(e))
+            raise RetryLater(f"Request error: {e}", retry_after=TRANSIENT_RETRY_DELAY)
+
+        if response.status_code >= 500:
+            error = f"Server error {response.status_code}: {url}"
+            breaker.record_failure(error)
+            retry_after = self.get_retry_after(response.headers, TRANSIENT_RETRY_DELAY)
+            logger.warning(f"Server error {response.status_code} for {url}, retry after {retry_after:.0f}s")
+            raise RetryLater(error, retry_after=retry_after)
+
+        # API отвечает (в том числе 429) - хост доступен
+        breaker.record_success()
+
+        if response.status_code == 429:
+            retry_after = self.get_retry_after(response.headers, RATE_LIMIT_RETRY_DELAY)
+            logger.warning(f"Rate limit 429 for {url}, retry after {retry_after:.0f}s")
+            raise RetryLater(f"Rate limit 429: {url}", retry_after=retry_after)
+
+        return response
 
     def collect_all(self):
         """Collect all data for initial sync"""
@@ -240,6 +226,8 @@ class OzonCollector(BaseCollector):
             # Save to database
             saved_count = 0
             current_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            # Снимок для current_stock: {product_id: row}
+            current_rows = {}
 
             for row in data_rows:
                 if len(row) <= fbo_stock_col_idx:
@@ -282,8 +270,12 @@ class OzonCollector(BaseCollector):
                         date=current_date
                     ).first()
 
+                    offer_article, size_norm = split_offer_id(article)
+
                     if existing_stock:
                         # Update existing record
+                        existing_stock.article = offer_article
+                        existing_stock.size_norm = size_norm
                         existing_stock.fbo_present = fbo_present
                         existing_stock.fbo_reserved = 0
                         existing_stock.fbs_present = 0
@@ -295,6 +287,8 @@ class OzonCollector(BaseCollector):
                             product_id=product.id,
                             warehouse_id=None,  # Report doesn't provide warehouse info
                             offer_id=article,
+                            article=offer_article,
+                            size_norm=size_norm,
                             product_sku=sku,
                             fbo_present=fbo_present,
                             fbo_reserved=0,
@@ -305,28 +299,50 @@ class OzonCollector(BaseCollector):
                         session.add(stock)
                         saved_count += 1
 
+                    if fbo_present > 0:
+                        current_rows[product.id] = {
+                            'product_id': product.id,
+                            'warehouse_id': None,
+                            'article': offer_article,
+                            'size_norm': size_norm,
+                            'quantity': fbo_present,
+                            'reserved': 0,
+                        }
+
                 except Exception as e:
                     logger.debug(f"  Error processing row: {e}")
                     continue
 
+            current_stock.replace_token_stock(session, self.token_id, self.marketplace, current_rows.values())
             session.commit()
             self.update_sync_state(session, self.token_id, 'ozon_stocks', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_stocks', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} Ozon stock records")
 
+        except RetryLater as e:
+            session.rollback()
+            self.log_collection(session, self.token_id, self.marketplace, 'ozon_stocks', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_stocks', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting Ozon stocks: {e}")
 
-    def collect_orders(self, session, initial: bool = False):
-        """Collect orders data (FBS and FBO orders) using /v3/posting/fbs/list and /v2/posting/fbo/list"""
+    def collect_orders(self, session, initial: bool = False, cursor: dict = None):
+        """
+        Collect orders data (FBS and FBO orders) using /v3/posting/fbs/list and /v2/posting/fbo/list.
+        cursor - continuation after RetryLater: {'start_date', 'stage', 'offset'}
+        """
         started_at = datetime.now(timezone.utc)
+        progress = dict(cursor) if cursor else {}
         try:
             sync_state = self.get_sync_state(session, self.token_id, 'ozon_orders')
 
             # Определяем начальную дату для сбора
-            if initial or not sync_state.last_successful_sync:
+            if progress.get('start_date'):
+                start_date = datetime.fromisoformat(progress['start_date'])
+                logger.info(f"Resuming Ozon orders: {progress.get('stage')} from offset {progress.get('offset', 0)}")
+            elif initial or not sync_state.last_successful_sync:
                 # Находим дату первой поставки (из supply_orders)
                 from app.models import OzonSupplyOrder
                 first_supply = session.query(OzonSupplyOrder).filter_by(
@@ -364,34 +380,53 @@ class OzonCollector(BaseCollector):
 
             logger.info(f"Collecting Ozon orders from {start_date.strftime('%Y-%m-%d %H:%M:%S')}")
 
+            progress['start_date'] = start_date.isoformat()
             saved_count = 0
 
             # Collect FBS orders
-            saved_count += self._collect_fbs_orders(session, start_date)
-            time.sleep(1)
+            if progress.get('stage', 'fbs') == 'fbs':
+                saved_count += self._collect_fbs_orders(session, start_date, progress)
+                progress['stage'] = 'fbo'
+                progress['offset'] = 0
+                time.sleep(1)
 
             # Collect FBO orders
-            saved_count += self._collect_fbo_orders(session, start_date)
+            saved_count += self._collect_fbo_orders(session, start_date, progress)
 
+            rollup.refresh_marked_days(session)
             session.commit()
             self.update_sync_state(session, self.token_id, 'ozon_orders', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_orders', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} Ozon orders")
 
+        except RetryLater as e:
+            # Сохраняем загруженные страницы и продолжаем с текущего offset
+            rollup.refresh_marked_days(session)
+            session.commit()
+            e.cursor = progress
+            self.log_collection(session, self.token_id, self.marketplace, 'ozon_orders', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_orders', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting Ozon orders: {e}")
 
-    def collect_sales(self, session, initial: bool = False):
-        """Collect sales data using /v3/finance/transaction/list with OperationAgentDeliveredToCustomer"""
+    def collect_sales(self, session, initial: bool = False, cursor: dict = None):
+        """
+        Collect sales data using /v3/finance/transaction/list with OperationAgentDeliveredToCustomer.
+        cursor - continuation after RetryLater: {'start_date', 'month', 'page'}
+        """
         started_at = datetime.now(timezone.utc)
+        progress = dict(cursor) if cursor else {}
         try:
             sync_state = self.get_sync_state(session, self.token_id, 'ozon_sales')
 
             # Определяем начальную дату для сбора
             # Если первая синхронизация, собираем помесячно с даты первой поставки
-            if initial or not sync_state.last_successful_sync:
+            if progress.get('start_date'):
+                start_date = datetime.fromisoformat(progress['start_date'])
+                logger.info(f"Resuming Ozon sales from {progress.get('month')} page {progress.get('page', 1)}")
+            elif initial or not sync_state.last_successful_sync:
                 # Находим дату первой поставки (из supply_orders)
                 from app.models import OzonSupplyOrder
                 first_supply = session.query(OzonSupplyOrder).filter_by(
@@ -410,13 +445,22 @@ class OzonCollector(BaseCollector):
 
             logger.info(f"Collecting Ozon sales from {start_date.strftime('%Y-%m-%d')}")
 
-            saved_count = self._collect_finance_transactions(session, start_date)
+            progress['start_date'] = start_date.isoformat()
+            saved_count = self._collect_finance_transactions(session, start_date, progress)
 
+            rollup.refresh_marked_days(session)
             session.commit()
             self.update_sync_state(session, self.token_id, 'ozon_sales', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_sales', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} Ozon sales")
 
+        except RetryLater as e:
+            # Сохраняем загруженные страницы и продолжаем с текущей страницы месяца
+            rollup.refresh_marked_days(session)
+            session.commit()
+            e.cursor = progress
+            self.log_collection(session, self.token_id, self.marketplace, 'ozon_sales', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_sales', 'error', 0, str(e), started_at)
@@ -449,15 +493,18 @@ class OzonCollector(BaseCollector):
             else:
                 logger.warning(f"Date range test failed with status {response.status_code}")
                 return -1  # Error
+        except RetryLater:
+            raise
         except Exception as e:
             logger.warning(f"Date range test exception: {e}")
             return -1
 
-    def _collect_fbs_orders(self, session, start_date: datetime) -> int:
-        """Collect FBS orders with pagination"""
+    def _collect_fbs_orders(self, session, start_date: datetime, progress: dict = None) -> int:
+        """Collect FBS orders with pagination (progress['offset'] is kept up to date for resuming)"""
         url = f"{self.base_url}/v3/posting/fbs/list"
+        progress = progress if progress is not None else {}
         saved_count = 0
-        offset = 0
+        offset = progress.get('offset', 0)
         limit = 1000
 
         while True:
@@ -500,6 +547,7 @@ class OzonCollector(BaseCollector):
                     break
 
                 offset += limit
+                progress['offset'] = offset
                 time.sleep(1)  # Rate limiting
             else:
                 logger.error(f"Ozon FBS API error {response.status_code}: {response.text}")
@@ -507,11 +555,12 @@ class OzonCollector(BaseCollector):
 
         return saved_count
 
-    def _collect_fbo_orders(self, session, start_date: datetime) -> int:
-        """Collect FBO orders with pagination"""
+    def _collect_fbo_orders(self, session, start_date: datetime, progress: dict = None) -> int:
+        """Collect FBO orders with pagination (progress['offset'] is kept up to date for resuming)"""
         url = f"{self.base_url}/v2/posting/fbo/list"
+        progress = progress if progress is not None else {}
         saved_count = 0
-        offset = 0
+        offset = progress.get('offset', 0)
         limit = 1000
 
         while True:
@@ -553,6 +602,7 @@ class OzonCollector(BaseCollector):
                     break
 
                 offset += limit
+                progress['offset'] = offset
                 time.sleep(1)  # Rate limiting
             else:
                 logger.error(f"Ozon FBO API error {response.status_code}: {response.text}")
@@ -568,7 +618,8 @@ class OzonCollector(BaseCollector):
 
         for product_data in products:
             offer_id = product_data.get('offer_id', '')
-            article, size = self.parse_offer_id(offer_id)
+            article, _ = split_stored_offer_id(offer_id)
+            offer_article, size_norm = split_offer_id(offer_id)
 
             # Get or create product
             product_dict = {
@@ -598,21 +649,28 @@ class OzonCollector(BaseCollector):
             if existing:
                 # Update existing order with new data
                 existing.status = posting.get('status')
+                existing.buyer_id = extract_buyer_id(posting_number)[:50]
+                existing.article = offer_article
+                existing.size_norm = size_norm
                 existing.quantity = product_data.get('quantity', 1)
                 existing.price = product_data.get('price')
                 if financial_data:
                     existing.commission_amount = financial_data.get('commission_amount')
                     existing.commission_percent = financial_data.get('commission_percent')
                     existing.payout = financial_data.get('payout')
+                rollup.mark_day(session, self.token_id, self.marketplace, existing.in_process_at)
                 continue
 
             order = OzonOrder(
                 token_id=self.token_id,
                 product_id=product.id,
                 posting_number=posting_number,
+                buyer_id=extract_buyer_id(posting_number)[:50],
                 order_id=posting.get('order_id'),
                 order_number=posting.get('order_number'),
                 offer_id=offer_id,
+                article=offer_article,
+                size_norm=size_norm,
                 sku=product_data.get('sku'),
                 quantity=product_data.get('quantity', 1),
                 shipment_date=datetime.fromisoformat(shipment_date.replace('Z', '+00:00')) if shipment_date else None,
@@ -629,13 +687,18 @@ class OzonCollector(BaseCollector):
                 order.payout = financial_data.get('payout')
 
             session.add(order)
+            rollup.mark_day(session, self.token_id, self.marketplace, order.in_process_at)
             saved_count += 1
 
         return saved_count
 
-    def _collect_finance_transactions(self, session, start_date: datetime) -> int:
-        """Collect sales from /v3/finance/transaction/list with monthly pagination"""
+    def _collect_finance_transactions(self, session, start_date: datetime, progress: dict = None) -> int:
+        """
+        Collect sales from /v3/finance/transaction/list with monthly pagination.
+        progress['month'] / progress['page'] are kept up to date for resuming after RetryLater.
+        """
         url = f"{self.base_url}/v3/finance/transaction/list"
+        progress = progress if progress is not None else {}
         saved_count = 0
         today = datetime.now(timezone.utc)
 
@@ -644,7 +707,10 @@ class OzonCollector(BaseCollector):
             start_date = start_date.replace(tzinfo=timezone.utc)
 
         # Iterate through each month from start_date to today
-        current_date = start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if progress.get('month'):
+            current_date = datetime.fromisoformat(progress['month'])
+        else:
+            current_date = start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
         while current_date <= today:
             # Define start and end of current month
@@ -662,11 +728,12 @@ class OzonCollector(BaseCollector):
             logger.info(f"  Collecting sales for {month_start.strftime('%B %Y')}")
 
             # Pagination - get all pages for current month
-            page = 1
-            has_next = True
+            page = progress.get('page', 1) if progress.get('month') == month_start.isoformat() else 1
+            progress['month'] = month_start.isoformat()
+            progress['page'] = page
             month_saved = 0
 
-            while has_next:
+            while True:
                 params = {
                     "filter": {
                         "date": {
@@ -681,53 +748,35 @@ class OzonCollector(BaseCollector):
                     "page_size": 1000
                 }
 
-                # Retry loop for 429 errors
-                max_retries = 5
-                retry_count = 0
-                request_successful = False
-
-                while retry_count < max_retries and not request_successful:
-                    response = self._request_with_retry('POST', url, json=params)
-
-                    if response.status_code == 200:
-                        request_successful = True
-                        data = response.json()
-
-                        # Validate API response schema
-                        APIValidator.validate_ozon_finance(data)
-
-                        result = data.get('result', {})
-                        operations = result.get('operations', [])
-
-                        # If no operations - exit loop
-                        if not operations:
-                            has_next = False
-                            break
-
-                        # Process operations from current page (все типы операций)
-                        for operation in operations:
-                            if self._save_finance_transaction(session, operation):
-                                month_saved += 1
-
-                        # Check if there are more pages
-                        # If we got less than 1000 records - this is the last page
-                        if len(operations) < 1000:
-                            has_next = False
-                        else:
-                            page += 1
-
-                    elif response.status_code == 429:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            logger.warning(f"    Error 429 for page {page} in {month_start.strftime('%B %Y')}. Retry {retry_count}/{max_retries}. Waiting 20 seconds...")
-                            time.sleep(20)
-                        else:
-                            logger.error(f"    Max retries exceeded for page {page} in {month_start.strftime('%B %Y')}. Skipping.")
-                            has_next = False
-                    else:
-                        logger.error(f"    Ozon finance API error {response.status_code} for page {page}: {response.text}")
-                        has_next = False
-                        break
+                # 429 и временные ошибки выбрасывают RetryLater с текущей страницей в progress
+                response = self._request_with_retry('POST', url, json=params)
+
+                if response.status_code != 200:
+                    logger.error(f"    Ozon finance API error {response.status_code} for page {page}: {response.text}")
+                    break
+
+                data = response.json()
+
+                # Validate API response schema
+                APIValidator.validate_ozon_finance(data)
+
+                result = data.get('result', {})
+                operations = result.get('operations', [])
+
+                # If no operations - exit loop
+                if not operations:
+                    break
+
+                # Process operations from current page (все типы операций)
+                month_saved += self._save_finance_operations(session, operations)
+
+                # Check if there are more pages
+                # If we got less than 1000 records - this is the last page
+                if len(operations) < 1000:
+                    break
+
+                page += 1
+                progress['page'] = page
 
             logger.info(f"    Saved {month_saved} sales for {month_start.strftime('%B %Y')}")
             saved_count += month_saved
@@ -738,83 +787,243 @@ class OzonCollector(BaseCollector):
 
         return saved_count
 
-    def _save_finance_transaction(self, session, operation: dict) -> bool:
-        """Save single finance transaction to ozon_sales database (all operation types)"""
-        try:
-            # Get operation_id as unique identifier
+    def _save_finance_operations(self, session, operations: list) -> int:
+        """
+        Save a page of finance transactions.
+        Existing operation_id are fetched with one IN query instead of a query per operation.
+        """
+        operation_ids = {op.get('operation_id') for op in operations if op.get('operation_id')}
+        if not operation_ids:
+            return 0
+
+        existing_ids = {
+            row[0] for row in session.query(OzonSale.operation_id).filter(
+                OzonSale.operation_id.in_(operation_ids)
+            ).all()
+        }
+
+        saved_count = 0
+        for operation in operations:
             operation_id = operation.get('operation_id')
-            if not operation_id:
-                return False
+            # Пропускаем уже сохранённые и дубликаты внутри страницы
+            if not operation_id or operation_id in existing_ids:
+                continue
+            try:
+                sale = self._build_finance_sale(operation)
+                session.add(sale)
+            except Exception as e:
+                logger.debug(f"    Error saving finance transaction: {e}")
+                continue
+            rollup.mark_day(session, self.token_id, self.marketplace, sale.operation_date)
+            existing_ids.add(operation_id)
+            saved_count += 1
 
-            # Check if this transaction already exists by operation_id
-            existing = session.query(OzonSale).filter_by(operation_id=operation_id).first()
-            if existing:
-                return False
+        return saved_count
 
-            # Parse dates
-            operation_date_str = operation.get('operation_date')
-            operation_date = datetime.fromisoformat(operation_date_str.replace('Z', '+00:00')) if operation_date_str else None
+    def _build_finance_sale(self, operation: dict) -> OzonSale:
+        """Build OzonSale record from finance transaction (all operation types)"""
+        # Parse dates
+        operation_date_str = operation.get('operation_date')
+        operation_date = datetime.fromisoformat(operation_date_str.replace('Z', '+00:00')) if operation_date_str else None
+
+        posting_info = operation.get('posting', {})
+        posting_order_date_str = posting_info.get('order_date')
+        posting_order_date = datetime.fromisoformat(posting_order_date_str.replace('Z', '+00:00')) if posting_order_date_str else None
+
+        # Get items and services
+        items = operation.get('items', [])
+        services = operation.get('services', [])
+
+        # Get first item info for compatibility fields
+        first_item = items[0] if items else {}
+        sku = first_item.get('sku')
+
+        # Create sale record with all fields
+        return OzonSale(
+            token_id=self.token_id,
+            product_id=None,
+
+            # Основные поля операции
+            operation_id=operation.get('operation_id'),
+            operation_type=operation.get('operation_type', ''),
+            operation_type_name=operation.get('operation_type_name'),
+            operation_date=operation_date,
+
+            # Финансовые поля
+            delivery_charge=operation.get('delivery_charge', 0),
+            return_delivery_charge=operation.get('return_delivery_charge', 0),
+            accruals_for_sale=operation.get('accruals_for_sale', 0),
+            sale_commission=operation.get('sale_commission', 0),
+            amount=operation.get('amount', 0),
+            type=operation.get('type'),
+
+            # Posting info
+            posting_delivery_schema=posting_info.get('delivery_schema'),
+            posting_order_date=posting_order_date,
+            posting_posting_number=posting_info.get('posting_number'),
+            posting_warehouse_id=posting_info.get('warehouse_id'),
+
+            # Items и Services как JSON
+            items=items if items else None,
+            services=services if services else None,
+
+            # Поля совместимости
+            posting_number=posting_info.get('posting_number'),
+            sku=sku,
+            shipment_date=operation_date,
+            delivery_schema=posting_info.get('delivery_schema'),
+            price=operation.get('accruals_for_sale', 0),
+            payout=operation.get('amount', 0),
+            status=operation.get('operation_type', '')
+        )
+
+    def _throttle(self):
+        """Keep concurrent requests of this collector within BUNDLE_MIN_INTERVAL"""
+        with self._throttle_lock:
+            wait = self._next_request_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next_request_at = time.monotonic() + BUNDLE_MIN_INTERVAL
+
+    def _fetch_bundle_items(self, url: str, bundle_id: str) -> list:
+        """Load all items of one bundle with last_id pagination"""
+        last_id = ''
+        bundle_items = []
+
+        while True:
+            payload_order_bundle = {
+                "bundle_ids": [bundle_id],
+                "limit": 100,
+                "last_id": last_id
+            }
 
-            posting_info = operation.get('posting', {})
-            posting_order_date_str = posting_info.get('order_date')
-            posting_order_date = datetime.fromisoformat(posting_order_date_str.replace('Z', '+00:00')) if posting_order_date_str else None
+            # 429 и временные ошибки выбрасывают RetryLater
+            self._throttle()
+            response_order_bundle = self._request_with_retry('POST', url, json=payload_order_bundle)
 
-            # Get items and services
-            items = operation.get('items', [])
-            services = operation.get('services', [])
+            if response_order_bundle.status_code != 200:
+                raise Exception(f"Bundle {bundle_id} error {response_order_bundle.status_code}: {response_order_bundle.text}")
 
-            # Get first item info for compatibility fields
-            first_item = items[0] if items else {}
-            sku = first_item.get('sku')
+            bundle_response = response_order_bundle.json()
 
-            # Create sale record with all fields
-            sale = OzonSale(
-                token_id=self.token_id,
-                product_id=None,
-
-                # Основные поля операции
-                operation_id=operation_id,
-                operation_type=operation.get('operation_type', ''),
-                operation_type_name=operation.get('operation_type_name'),
-                operation_date=operation_date,
-
-                # Финансовые поля
-                delivery_charge=operation.get('delivery_charge', 0),
-                return_delivery_charge=operation.get('return_delivery_charge', 0),
-                accruals_for_sale=operation.get('accruals_for_sale', 0),
-                sale_commission=operation.get('sale_commission', 0),
-                amount=operation.get('amount', 0),
-                type=operation.get('type'),
-
-                # Posting info
-                posting_delivery_schema=posting_info.get('delivery_schema'),
-                posting_order_date=posting_order_date,
-                posting_posting_number=posting_info.get('posting_number'),
-                posting_warehouse_id=posting_info.get('warehouse_id'),
-
-                # Items и Services как JSON
-                items=items if items else None,
-                services=services if services else None,
-
-                # Поля совместимости
-                posting_number=posting_info.get('posting_number'),
-                sku=sku,
-                shipment_date=operation_date,
-                delivery_schema=posting_info.get('delivery_schema'),
-                price=operation.get('accruals_for_sale', 0),
-                payout=operation.get('amount', 0),
-                status=operation.get('operation_type', '')
-            )
+            # Validate API response schema
+            APIValidator.validate_ozon_bundle(bundle_response)
 
-            session.add(sale)
-            return True
+            items = bundle_response.get('items', [])
+            bundle_items.extend(items)
 
-        except Exception as e:
-            logger.debug(f"    Error saving finance transaction: {e}")
-            return False
+            logger.info(f"    Loaded {len(items)} items from bundle {bundle_id} (total: {len(bundle_items)})")
+
+            if bundle_response.get('has_next') is True:
+                last_id = bundle_response.get('last_id')
+            else:
+                break
+
+        return bundle_items
+
+    def _collect_bundle_items(self, session, bundle_data: list) -> int:
+        """
+        Load items of bundles concurrently (HTTP only, DB writes stay in this thread) and save them in bulk.
+        bundle_data - list of (bundle_id, order_number, timeslot_from, supply_order).
+        Supply orders whose bundles were not loaded (error or rate limit) are deleted before commit,
+        so the next run sees them as new and loads their items again.
+        Raises RetryLater if some bundles were rate limited.
+        """
+        url_bundle = f"{self.base_url}/v1/supply-order/bundle"
+        bundle_items_map = {}
+
+        deferred = None  # RetryLater с максимальной задержкой
+        unloaded_bundles = set()
+
+        with ThreadPoolExecutor(max_workers=BUNDLE_WORKERS) as executor:
+            futures = {
+                executor.submit(self._fetch_bundle_items, url_bundle, bundle_id): bundle_id
+                for bundle_id, _, _, _ in bundle_data
+            }
+            for future in as_completed(futures):
+                bundle_id = futures[future]
+                try:
+                    bundle_items_map[bundle_id] = future.result()
+                except RetryLater as e:
+                    unloaded_bundles.add(bundle_id)
+                    if deferred is None or e.retry_after > deferred.retry_after:
+                        deferred = e
+                except Exception as e:
+                    logger.error(f"Failed to get bundle {bundle_id}: {e}")
+                    unloaded_bundles.add(bundle_id)
+
+        # Поставку без загруженных позиций не сохраняем: иначе она считается существующей
+        # и её bundle больше не запрашивается
+        if unloaded_bundles:
+            for bundle_id, _, _, supply_order in bundle_data:
+                if bundle_id in unloaded_bundles:
+                    session.delete(supply_order)
+            bundle_data = [row for row in bundle_data if row[0] not in unloaded_bundles]
+            logger.warning(f"{len(unloaded_bundles)} bundles not loaded, their supply orders will be retried")
+
+        # Save items in bulk
+        all_items = []
+        for bundle_id, order_number, timeslot_from, supply_order in bundle_data:
+            for item_data in bundle_items_map.get(bundle_id, []):
+                offer_id = item_data.get('offer_id', '')
+                article, size = split_stored_offer_id(offer_id)
+                all_items.append((supply_order, bundle_id, timeslot_from, item_data, offer_id, article, size))
+
+        products = self.get_or_create_products(session, self.token_id, self.marketplace, [
+            {
+                'supplierArticle': article,
+                'nmId': item_data.get('product_id'),
+                'barcode': item_data.get('barcode', ''),
+                'brand': None,
+                'category': None,
+                'subject': None
+            }
+            for _, _, _, item_data, _, article, _ in all_items
+        ])
+
+        # Уже сохранённые позиции по (supply_order_id, sku) одним запросом
+        supply_order_ids = [supply_order.id for _, _, _, supply_order in bundle_data]
+        existing_items = set()
+        if supply_order_ids:
+            existing_items = set(session.query(OzonSupplyItem.supply_order_id, OzonSupplyItem.sku).filter(
+                OzonSupplyItem.supply_order_id.in_(supply_order_ids)
+            ).all())
+
+        item_rows = []
+        for supply_order, bundle_id, timeslot_from, item_data, offer_id, article, size in all_items:
+            sku = item_data.get('sku')
+            if (supply_order.id, sku) in existing_items:
+                continue
+            existing_items.add((supply_order.id, sku))
+
+            item_rows.append({
+                'supply_order_id': supply_order.id,
+                'product_id': products[article].id,
+                'sku': sku,
+                'offer_id': offer_id,
+                'article': article,
+                'size': size,
+                'quantity': item_data.get('quantity', 0),
+                'barcode': item_data.get('barcode'),
+                'name': item_data.get('name'),
+                'bundle_id': bundle_id,
+                'timeslot_from': timeslot_from
+            })
+
+        if item_rows:
+            session.bulk_insert_mappings(OzonSupplyItem, item_rows)
+        session.commit()
+
+        if deferred is not None:
+            raise deferred
+
+        return len(item_rows)
 
     def collect_supply_orders(self, session, initial: bool = False):
-        """Collect supply orders (поставки FBO) using /v3/supply-order/list, /v3/supply-order/get, and /v1/supply-order/bundle"""
+        """
+        Collect supply orders (поставки FBO) using /v3/supply-order/list, /v3/supply-order/get, and /v1/supply-order/bundle.
+        Orders are committed together with their bundle items; orders with unloaded bundles stay new for the next run.
+        """
         started_at = datetime.now(timezone.utc)
         try:
             sync_state = self.get_sync_state(session, self.token_id, 'ozon_supply_orders')
@@ -845,17 +1054,17 @@ class OzonCollector(BaseCollector):
             orderid_list = response_data.get('order_ids', [])
             logger.info(f"API returned {len(orderid_list)} supply order IDs")
 
-            # Step 2: Filter out orders that already exist in database
+            # Step 2: Filter out orders that already exist in database (one IN query)
             existing_order_ids = set()
-            for order_id in orderid_list:
-                existing = session.query(OzonSupplyOrder).filter_by(
-                    token_id=self.token_id,
-                    supply_order_id=str(order_id)
-                ).first()
-                if existing:
-                    existing_order_ids.add(order_id)
+            if orderid_list:
+                existing_order_ids = {
+                    row[0] for row in session.query(OzonSupplyOrder.supply_order_id).filter(
+                        OzonSupplyOrder.token_id == self.token_id,
+                        OzonSupplyOrder.supply_order_id.in_([str(oid) for oid in orderid_list])
+                    ).all()
+                }
 
-            new_order_ids = [oid for oid in orderid_list if oid not in existing_order_ids]
+            new_order_ids = [oid for oid in orderid_list if str(oid) not in existing_order_ids]
             logger.info(f"Found {len(new_order_ids)} NEW orders (skipping {len(existing_order_ids)} existing)")
 
             if not new_order_ids:
@@ -933,108 +1142,17 @@ class OzonCollector(BaseCollector):
                 if bundle_id:
                     bundle_data.append((bundle_id, order_number, timeslot_from, supply_order))
 
-            session.commit()
-            logger.info(f"Saved {len(bundle_data)} NEW supply orders to database")
-
-            # Step 5: Collect items for each NEW bundle SEPARATELY with pagination
-            url_bundle = f"{self.base_url}/v1/supply-order/bundle"
-            saved_items_count = 0
-            bundle_count = 1
-
-            for bundle_id, order_number, timeslot_from, supply_order in bundle_data:
-                logger.info(f"  Processing bundle {bundle_count}/{len(bundle_data)}: {bundle_id}")
-
-                last_id = ''
-                bundle_items = []
-
-                while True:
-                    payload_order_bundle = {
-                        "bundle_ids": [bundle_id],
-                        "limit": 100,
-                        "last_id": last_id
-                    }
-
-                    # Retry loop for 429 errors
-                    retry_count = 0
-                    max_retries = 10
-                    while retry_count < max_retries:
-                        response_order_bundle = self._request_with_retry('POST', url_bundle, json=payload_order_bundle)
-
-                        if response_order_bundle.status_code == 200:
-                            break
-                        else:
-                            retry_count += 1
-                            logger.warning(f"    Bundle {bundle_id} - Error {response_order_bundle.status_code}, retry {retry_count}/{max_retries}")
-                            time.sleep(10)
-
-                    if response_order_bundle.status_code != 200:
-                        logger.error(f"Failed to get bundle {bundle_id} after {max_retries} retries")
-                        break
-
-                    bundle_response = response_order_bundle.json()
-
-                    # Validate API response schema
-                    APIValidator.validate_ozon_bundle(bundle_response)
-
-                    items = bundle_response.get('items', [])
-                    bundle_items.extend(items)
-
-                    logger.info(f"    Loaded {len(items)} items from bundle {bundle_id} (total: {len(bundle_items)})")
-
-                    if bundle_response.get('has_next') is True:
-                        last_id = bundle_response.get('last_id')
-                    else:
-                        time.sleep(5)
-                        break
-
-                # Save items to database
-                for item_data in bundle_items:
-                    offer_id = item_data.get('offer_id', '')
-                    article, size = self.parse_offer_id(offer_id)
-
-                    # Get or create product
-                    product_dict = {
-                        'supplierArticle': article,
-                        'nmId': item_data.get('product_id'),
-                        'barcode': item_data.get('barcode', ''),
-                        'brand': None,
-                        'category': None,
-                        'subject': None
-                    }
-                    product = self.get_or_create_product(session, self.token_id, self.marketplace, product_dict)
-
-                    # Check if item already exists
-                    sku = item_data.get('sku')
-                    existing_item = session.query(OzonSupplyItem).filter_by(
-                        supply_order_id=supply_order.id,
-                        sku=sku
-                    ).first()
-
-                    if not existing_item:
-                        item = OzonSupplyItem(
-                            supply_order_id=supply_order.id,
-                            product_id=product.id,
-                            sku=sku,
-                            offer_id=offer_id,
-                            article=article,
-                            size=size,
-                            quantity=item_data.get('quantity', 0),
-                            barcode=item_data.get('barcode'),
-                            name=item_data.get('name'),
-                            bundle_id=bundle_id,
-                            timeslot_from=timeslot_from
-                        )
-                        session.add(item)
-                        saved_items_count += 1
-
-                session.commit()
-                logger.info(f"  Bundle {bundle_count}/{len(bundle_data)}: saved {len(bundle_items)} items")
-                bundle_count += 1
+            # Step 5-6: Load and save bundle items (commits supply orders together with items)
+            saved_items_count = self._collect_bundle_items(session, bundle_data)
 
             self.update_sync_state(session, self.token_id, 'ozon_supply_orders', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_supply_orders', 'success', saved_items_count, started_at=started_at)
             logger.info(f"Saved {saved_items_count} supply items from {len(bundle_data)} bundles")
 
+        except RetryLater as e:
+            session.rollback()
+            self.log_collection(session, self.token_id, self.marketplace, 'ozon_supply_orders', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'ozon_supply_orders', 'error', 0, str(e), started_at)
@@ -1,18 +1,35 @@
 import logging
+import threading
 import time
 import requests
 from datetime import datetime, timezone, timedelta
+from sqlalchemy import select
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from wb_api import WBApi
 from datacollector.collectors.base import BaseCollector
+from datacollector.queue_manager import RetryLater
+from datacollector.circuit_breaker import CircuitBreakerRegistry, WB_STATISTICS, WB_CONTENT
+from datacollector import rollup
+from datacollector import current_stock
+from datacollector import article_groups
 from app.models import WBSale, WBOrder, WBIncome, WBIncomeItem, WBStock, WBGood
 
 logger = logging.getLogger(__name__)
 
 # Таймаут для API запросов (в секундах)
 API_TIMEOUT = 120
-# Максимальное количество попыток
-MAX_RETRIES = 3
+# Задержка по умолчанию, если сервер не вернул Retry-After (в секундах)
+RATE_LIMIT_RETRY_DELAY = 60
+TRANSIENT_RETRY_DELAY = 10
+# Штрихкодов в одном IN при поиске карточек
+BARCODE_CHUNK_SIZE = 1000
+# Statistics API: не больше одного запроса в минуту на токен
+STATISTICS_CALL_INTERVAL = 60
+
+# token_id -> time.monotonic(), раньше которого следующий запрос к Statistics API не делается.
+# Общий для всех воркеров процесса: задача не спит в потоке, а откладывается до этого момента
+_statistics_next_call_at = {}
+_statistics_lock = threading.Lock()
 
 
 class WildberriesCollector(BaseCollector):
@@ -24,42 +41,66 @@ class WildberriesCollector(BaseCollector):
         self.api = WBApi(token)
         self.marketplace = 'wildberries'
 
+    def _reserve_statistics_call(self):
+        """
+        Занять слот запроса к Statistics API для токена.
+        Если с прошлого запроса не прошло STATISTICS_CALL_INTERVAL секунд, выбрасывает
+        RetryLater до момента, когда запрос будет разрешён.
+        """
+        now = time.monotonic()
+        with _statistics_lock:
+            next_call_at = _statistics_next_call_at.get(self.token_id, 0)
+            if now < next_call_at:
+                raise RetryLater(f"Statistics API interval for token {self.token_id}",
+                                 retry_after=next_call_at - now, count=False)
+            _statistics_next_call_at[self.token_id] = now + STATISTICS_CALL_INTERVAL
+
     def _call_api_with_timeout(self, func, *args, **kwargs):
         """
-        Вызов API с таймаутом и retry.
+        Вызов API с таймаутом.
         Использует ThreadPoolExecutor для ограничения времени выполнения.
+        Запросы к Statistics API по токену разнесены на STATISTICS_CALL_INTERVAL секунд.
+        При 429, 5xx, таймаутах, ошибках соединения и до истечения интервала выбрасывает
+        RetryLater: задача возвращается в очередь с задержкой, а воркер не спит и берёт следующую.
+        Остальные 4xx пробрасываются без отсрочки.
         """
-        last_error = None
-
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(func, *args, **kwargs)
-                    result = future.result(timeout=API_TIMEOUT)
-                    return result
-            except FuturesTimeoutError:
-                last_error = f"API timeout after {API_TIMEOUT}s"
-                logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: {last_error}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(10)
-            except requests.exceptions.RequestException as e:
-                last_error = f"Request error: {e}"
-                logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: {last_error}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(10)
-            except Exception as e:
-                last_error = str(e)
-                # Для ошибок 429 (rate limit) не делаем retry сразу
-                if '429' in str(e) or 'Too Many Requests' in str(e):
-                    logger.warning(f"Rate limit hit, waiting 60s before retry")
-                    time.sleep(60)
-                else:
-                    logger.warning(f"Attempt {attempt}/{MAX_RETRIES}: {last_error}")
-                    if attempt < MAX_RETRIES:
-                        time.sleep(10)
+        self._reserve_statistics_call()
+
+        # Если API недоступен, не обращаемся к нему до пробного запроса
+        breaker = CircuitBreakerRegistry.get(WB_STATISTICS)
+        if not breaker.allow_request():
+            raise RetryLater(f"Circuit open for {WB_STATISTICS}", retry_after=breaker.retry_after())
+
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(func, *args, **kwargs)
+                result = future.result(timeout=API_TIMEOUT)
+        except FuturesTimeoutError:
+            error = f"API timeout after {API_TIMEOUT}s"
+            breaker.record_failure(error)
+            raise RetryLater(error, retry_after=TRANSIENT_RETRY_DELAY)
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code == 429:
+                breaker.record_success()
+                retry_after = self.get_retry_after(response.headers, RATE_LIMIT_RETRY_DELAY)
+                raise RetryLater(f"Rate limit 429: {e}", retry_after=retry_after)
+            if response is not None and response.status_code < 500:
+                # 400/401/403/404 - ошибка запроса или токена, повтор не поможет (как в Ozon).
+                # Хост ответил, поэтому пробный запрос закрывает выключатель
+                breaker.record_success()
+                raise
+            breaker.record_failure(str(e))
+            raise RetryLater(f"Request error: {e}", retry_after=TRANSIENT_RETRY_DELAY)
+        except Exception as e:
+            if '429' in str(e) or 'Too Many Requests' in str(e):
+                breaker.record_success()
+                logger.warning(f"Rate limit hit, retry after {RATE_LIMIT_RETRY_DELAY}s")
+                raise RetryLater(f"Rate limit 429: {e}", retry_after=RATE_LIMIT_RETRY_DELAY)
+            raise
 
-        logger.error(f"Max retries exceeded")
-        raise Exception(last_error)
+        breaker.record_success()
+        return result
 
     def collect_all(self):
         """Collect all data for initial sync"""
@@ -101,7 +142,6 @@ class WildberriesCollector(BaseCollector):
             logger.info(f"Collecting incomes from {start_date.strftime('%Y-%m-%d')}")
 
             # Step 1: Fetch all incomes from API
-            time.sleep(60)
             all_incomes_data = self._call_api_with_timeout(
                 self.api.statistics.get_data,
                 endpoint="incomes",
@@ -178,19 +218,29 @@ class WildberriesCollector(BaseCollector):
             self.log_collection(session, self.token_id, self.marketplace, 'incomes', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} NEW income items")
 
+        except RetryLater as e:
+            session.rollback()
+            self.log_collection(session, self.token_id, self.marketplace, 'incomes', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'incomes', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting incomes: {e}")
 
-    def collect_sales(self, session, initial: bool = False):
-        """Collect sales data with pagination using flag=1 (daily iteration)"""
+    def collect_sales(self, session, initial: bool = False, cursor: dict = None):
+        """
+        Collect sales data with pagination using flag=1 (daily iteration).
+        cursor - continuation after RetryLater: {'start_date', 'date'}
+        """
         started_at = datetime.now(timezone.utc)
+        progress = dict(cursor) if cursor else {}
         try:
             sync_state = self.get_sync_state(session, self.token_id, 'sales')
 
-            if initial or not sync_state.last_successful_sync:
-                time.sleep(60)
+            if progress.get('start_date'):
+                start_date = datetime.fromisoformat(progress['start_date'])
+                logger.info(f"Resuming sales from {progress.get('date')}")
+            elif initial or not sync_state.last_successful_sync:
                 incomes = self._call_api_with_timeout(
                     self.api.statistics.get_data,
                     endpoint="incomes",
@@ -210,14 +260,18 @@ class WildberriesCollector(BaseCollector):
             logger.info(f"Collecting sales from {start_date.strftime('%Y-%m-%d')}")
 
             # Use flag=1 to get all data for each date
+            progress['start_date'] = start_date.isoformat()
             saved_count = 0
-            current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            if progress.get('date'):
+                current_date = datetime.fromisoformat(progress['date'])
+            else:
+                current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
 
             while current_date <= end_date:
                 logger.info(f"  Fetching sales for date: {current_date.strftime('%Y-%m-%d')}")
-                time.sleep(60)
-
+                # Со второго дня запрос откладывает задачу на STATISTICS_CALL_INTERVAL (RetryLater),
+                # загруженные дни сохраняются и сбор продолжается с progress['date']
                 sales_data = self._call_api_with_timeout(
                     self.api.statistics.get_data,
                     endpoint="sales",
@@ -227,6 +281,7 @@ class WildberriesCollector(BaseCollector):
 
                 if sales_data:
                     logger.info(f"  Received {len(sales_data)} sales for {current_date.strftime('%Y-%m-%d')}")
+                    goods = self._wb_goods_by_barcode(session, [s.get('barcode') for s in sales_data])
 
                     for sale_data in sales_data:
                         existing = session.query(WBSale).filter_by(srid=sale_data.get('srid')).first()
@@ -240,11 +295,14 @@ class WildberriesCollector(BaseCollector):
 
                         product = self.get_or_create_product(session, self.token_id, self.marketplace, sale_data)
                         warehouse = self.get_or_create_warehouse(session, self.marketplace, sale_data.get('warehouseName'))
+                        wb_good_id, good_size = goods.get(sale_data.get('barcode'), (None, None))
 
                         sale = WBSale(
                             token_id=self.token_id,
                             product_id=product.id,
                             warehouse_id=warehouse.id if warehouse else None,
+                            wb_good_id=wb_good_id,
+                            tech_size=sale_data.get('techSize') or good_size,
                             date=datetime.fromisoformat(sale_data.get('date').replace('Z', '+00:00')),
                             last_change_date=last_change,
                             sale_id=sale_data.get('saleID'),
@@ -261,31 +319,46 @@ class WildberriesCollector(BaseCollector):
                             oblast_okrug_name=sale_data.get('oblastOkrugName')
                         )
                         session.add(sale)
+                        rollup.mark_day(session, self.token_id, self.marketplace, sale.date)
                         saved_count += 1
                 else:
                     logger.info(f"  No sales for {current_date.strftime('%Y-%m-%d')}")
 
                 # Move to next day
                 current_date += timedelta(days=1)
+                progress['date'] = current_date.isoformat()
 
+            rollup.refresh_marked_days(session)
             session.commit()
             self.update_sync_state(session, self.token_id, 'sales', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'sales', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} sales")
 
+        except RetryLater as e:
+            # Сохраняем загруженные дни и продолжаем с текущего дня
+            rollup.refresh_marked_days(session)
+            session.commit()
+            e.cursor = progress
+            self.log_collection(session, self.token_id, self.marketplace, 'sales', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'sales', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting sales: {e}")
 
-    def collect_orders(self, session, initial: bool = False):
-        """Collect orders data using flag=0 (all data from date)"""
+    def collect_orders(self, session, initial: bool = False, cursor: dict = None):
+        """
+        Collect orders data using flag=0 (all data from date).
+        cursor - continuation after RetryLater: {'start_date'} already found from incomes
+        """
         started_at = datetime.now(timezone.utc)
+        progress = dict(cursor) if cursor else {}
         try:
             sync_state = self.get_sync_state(session, self.token_id, 'orders')
 
-            if initial or not sync_state.last_successful_sync:
-                time.sleep(60)
+            if progress.get('start_date'):
+                start_date = datetime.fromisoformat(progress['start_date'])
+            elif initial or not sync_state.last_successful_sync:
                 incomes = self._call_api_with_timeout(
                     self.api.statistics.get_data,
                     endpoint="incomes",
@@ -301,8 +374,7 @@ class WildberriesCollector(BaseCollector):
                 start_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(weeks=3)
 
             logger.info(f"Collecting orders from {start_date.strftime('%Y-%m-%d')}")
-
-            time.sleep(60)
+            progress['start_date'] = start_date.isoformat()
 
             # Используем flag=0 для получения всех данных от даты
             orders_data = self._call_api_with_timeout(
@@ -317,6 +389,7 @@ class WildberriesCollector(BaseCollector):
 
             if orders_data:
                 logger.info(f"Received {len(orders_data)} orders from API")
+                goods = self._wb_goods_by_barcode(session, [o.get('barcode') for o in orders_data])
 
                 for order_data in orders_data:
                     srid = order_data.get('srid')
@@ -332,6 +405,8 @@ class WildberriesCollector(BaseCollector):
                     if order_data.get('cancelDate'):
                         cancel_date = datetime.fromisoformat(order_data.get('cancelDate').replace('Z', '+00:00'))
 
+                    wb_good_id, good_size = goods.get(order_data.get('barcode'), (None, None))
+
                     if existing:
                         # Обновляем существующую запись (статус отмены и другие поля)
                         existing.is_cancel = order_data.get('isCancel', False)
@@ -343,6 +418,9 @@ class WildberriesCollector(BaseCollector):
                         existing.spp = order_data.get('spp')
                         existing.finished_price = order_data.get('finishedPrice')
                         existing.price_with_disc = order_data.get('priceWithDisc')
+                        if existing.wb_good_id is None:
+                            existing.wb_good_id = wb_good_id
+                        rollup.mark_day(session, self.token_id, self.marketplace, existing.date)
                         updated_count += 1
                     else:
                         # Создаём новую запись
@@ -353,6 +431,7 @@ class WildberriesCollector(BaseCollector):
                             token_id=self.token_id,
                             product_id=product.id,
                             warehouse_id=warehouse.id if warehouse else None,
+                            wb_good_id=wb_good_id,
                             # Основные идентификаторы
                             srid=srid,
                             g_number=order_data.get('gNumber'),
@@ -366,7 +445,7 @@ class WildberriesCollector(BaseCollector):
                             category=order_data.get('category'),
                             subject=order_data.get('subject'),
                             brand=order_data.get('brand'),
-                            tech_size=order_data.get('techSize'),
+                            tech_size=order_data.get('techSize') or good_size,
                             # Склад
                             warehouse_name=order_data.get('warehouseName'),
                             warehouse_type=order_data.get('warehouseType'),
@@ -391,15 +470,23 @@ class WildberriesCollector(BaseCollector):
                             sticker=order_data.get('sticker'),
                         )
                         session.add(order)
+                        rollup.mark_day(session, self.token_id, self.marketplace, order.date)
                         saved_count += 1
             else:
                 logger.info("No orders from API")
 
+            rollup.refresh_marked_days(session)
             session.commit()
             self.update_sync_state(session, self.token_id, 'orders', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'orders', 'success', saved_count, started_at=started_at)
             logger.info(f"Orders: saved {saved_count}, updated {updated_count}")
 
+        except RetryLater as e:
+            session.rollback()
+            # Начальная дата уже известна: при повторе запрос incomes не нужен
+            e.cursor = progress or None
+            self.log_collection(session, self.token_id, self.marketplace, 'orders', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'orders', 'error', 0, str(e), started_at)
@@ -411,7 +498,6 @@ class WildberriesCollector(BaseCollector):
         try:
             logger.info(f"Collecting stocks for token {self.token_id}")
 
-            time.sleep(60)
             stocks_data = self._call_api_with_timeout(
                 self.api.statistics.get_stocks,
                 date_from="2019-01-01"
@@ -420,6 +506,8 @@ class WildberriesCollector(BaseCollector):
             today = datetime.now(timezone.utc).date()
             saved_count = 0
             updated_count = 0
+            # Снимок для current_stock: {(wb_good_id, warehouse_id): row}
+            current_rows = {}
 
             for stock_obj in stocks_data:
                 # Остаток = только quantity (доступно к продаже)
@@ -466,20 +554,42 @@ class WildberriesCollector(BaseCollector):
                     session.add(stock)
                     saved_count += 1
 
+                wb_good_id = wb_good.id if wb_good else None
+                warehouse_id = warehouse.id if warehouse else None
+                current_rows[(wb_good_id, warehouse_id)] = {
+                    'wb_good_id': wb_good_id,
+                    'warehouse_id': warehouse_id,
+                    'quantity': quantity,
+                    'quantity_full': stock_obj.quantity_full,
+                    'in_way_to_client': stock_obj.in_way_to_client,
+                    'in_way_from_client': stock_obj.in_way_from_client,
+                }
+
+            current_stock.replace_token_stock(session, self.token_id, self.marketplace, current_rows.values())
+            article_groups.refresh_token(session, self.token_id)
             session.commit()
             self.update_sync_state(session, self.token_id, 'stocks', success=True)
             self.log_collection(session, self.token_id, self.marketplace, 'stocks', 'success', saved_count, started_at=started_at)
             logger.info(f"Saved {saved_count} new stock records, updated {updated_count}")
 
+        except RetryLater as e:
+            session.rollback()
+            self.log_collection(session, self.token_id, self.marketplace, 'stocks', 'deferred', 0, str(e), started_at)
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'stocks', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting stocks: {e}")
             raise
 
-    def collect_goods(self, session):
-        """Collect goods (product cards) from WB Content API"""
+    def collect_goods(self, session, cursor: dict = None):
+        """
+        Collect goods (product cards) from WB Content API.
+        cursor - continuation after RetryLater: {'cursor': <Content API cursor>}
+        """
         started_at = datetime.now(timezone.utc)
+        inserted = 0
+        updated = 0
         try:
             logger.info(f"Collecting goods for token {self.token_id}")
 
@@ -490,41 +600,45 @@ class WildberriesCollector(BaseCollector):
             }
 
             all_cards = []
-            cursor = {"limit": 100}
+            api_cursor = (cursor or {}).get('cursor') or {"limit": 100}
+            breaker = CircuitBreakerRegistry.get(WB_CONTENT)
+            if cursor:
+                logger.info(f"Resuming goods from cursor {api_cursor}")
 
             while True:
                 payload = {
                     "settings": {
-                        "cursor": cursor,
+                        "cursor": api_cursor,
                         "filter": {"withPhoto": -1}
                     }
                 }
 
-                # Retry logic for 429 errors
-                max_retries = 5
-                retry_count = 0
-                response = None
-
-                while retry_count < max_retries:
+                deferred = None
+                if not breaker.allow_request():
+                    deferred = RetryLater(f"Circuit open for {WB_CONTENT}", retry_after=breaker.retry_after())
+                else:
                     try:
                         response = requests.post(url, headers=headers, json=payload, timeout=30)
-                        if response.status_code == 429:
-                            retry_count += 1
-                            logger.warning(f"Rate limit 429, retry {retry_count}/{max_retries}, waiting 15s")
-                            time.sleep(15)
-                            continue
-                        break
-                    except requests.exceptions.Timeout:
-                        retry_count += 1
-                        logger.warning(f"Request timeout, retry {retry_count}/{max_retries}")
-                        time.sleep(5)
                     except requests.exceptions.RequestException as e:
-                        logger.error(f"Request error: {e}")
-                        break
-
-                if response is None or retry_count >= max_retries:
-                    logger.error("Max retries exceeded")
-                    break
+                        breaker.record_failure(str(e))
+                        deferred = RetryLater(f"Request error: {e}", retry_after=TRANSIENT_RETRY_DELAY)
+                    else:
+                        if response.status_code >= 500:
+                            breaker.record_failure(f"Server error {response.status_code}")
+                            deferred = RetryLater(f"Server error {response.status_code}: content cards list",
+                                                  retry_after=TRANSIENT_RETRY_DELAY)
+                        else:
+                            breaker.record_success()
+                            if response.status_code == 429:
+                                retry_after = self.get_retry_after(response.headers, RATE_LIMIT_RETRY_DELAY)
+                                deferred = RetryLater("Rate limit 429: content cards list", retry_after=retry_after)
+
+                if deferred is not None:
+                    # Сохраняем уже полученные карточки и продолжаем с текущего курсора
+                    inserted, updated = self._save_cards(session, all_cards)
+                    article_groups.refresh_marked(session)
+                    deferred.cursor = {'cursor': api_cursor}
+                    raise deferred
 
                 if response.status_code != 200:
                     logger.error(f"API error: {response.status_code}")
@@ -545,7 +659,7 @@ class WildberriesCollector(BaseCollector):
                 if not cursor_data.get("updatedAt") and not cursor_data.get("nmID"):
                     break
 
-                cursor = {
+                api_cursor = {
                     "limit": 100,
                     "updatedAt": cursor_data.get("updatedAt"),
                     "nmID": cursor_data.get("nmID")
@@ -554,94 +668,144 @@ class WildberriesCollector(BaseCollector):
             logger.info(f"Received {len(all_cards)} cards from API")
 
             # Save cards to wb_goods
-            inserted = 0
-            updated = 0
-
-            for card in all_cards:
-                vendor_code = card.get("vendorCode", "")
-                brand = card.get("brand", "")
-                title = card.get("title", "")
-                description = card.get("description", "")
-                imt_id = card.get("imtID")  # ID объединения карточек
-
-                # Parse dates
-                created_at_str = card.get("createdAt")
-                updated_at_str = card.get("updatedAt")
-                card_created_at = None
-                card_updated_at = None
-                if created_at_str:
-                    try:
-                        card_created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-                    except ValueError:
-                        pass
-                if updated_at_str:
-                    try:
-                        card_updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                    except ValueError:
-                        pass
-
-                # Get photos
-                photos = card.get("photos", [])
-                photo_urls = []
-                for photo in photos:
-                    photo_url = photo.get("big") or photo.get("c246x328") or photo.get("c516x688") or ""
-                    if photo_url:
-                        photo_urls.append(photo_url)
-                photos_str = ",".join(photo_urls)
-
-                sizes = card.get("sizes", [])
-                for size in sizes:
-                    tech_size = size.get("techSize", "")
-                    wb_size = size.get("wbSize", "")
-                    skus = size.get("skus", [])
-                    barcode = skus[0] if skus else ""
-
-                    if not barcode:
-                        continue
-
-                    # Check if exists
-                    existing = session.query(WBGood).filter_by(barcode=barcode).first()
-
-                    if existing:
-                        # Update imt_id if changed
-                        needs_update = False
-                        if existing.imt_id != imt_id:
-                            existing.imt_id = imt_id
-                            needs_update = True
-                        # Update photos if changed
-                        if existing.photos != photos_str and photos_str:
-                            existing.photos = photos_str
-                            needs_update = True
-                        if needs_update:
-                            updated += 1
-                    else:
-                        # Insert new
-                        good = WBGood(
-                            vendor_code=vendor_code,
-                            brand=brand,
-                            title=title,
-                            description=description,
-                            tech_size=tech_size,
-                            wb_size=wb_size,
-                            barcode=barcode,
-                            imt_id=imt_id,
-                            photos=photos_str,
-                            card_created_at=card_created_at,
-                            card_updated_at=card_updated_at
-                        )
-                        session.add(good)
-                        inserted += 1
+            inserted, updated = self._save_cards(session, all_cards)
+            article_groups.refresh_marked(session)
 
             session.commit()
             self.log_collection(session, self.token_id, self.marketplace, 'goods', 'success', inserted, started_at=started_at)
             logger.info(f"Goods: inserted {inserted}, updated photos {updated}")
 
+        except RetryLater as e:
+            session.commit()
+            self.log_collection(session, self.token_id, self.marketplace, 'goods', 'deferred', inserted, str(e), started_at)
+            logger.info(f"Goods deferred: inserted {inserted}, updated photos {updated}")
+            raise
         except Exception as e:
             session.rollback()
             self.log_collection(session, self.token_id, self.marketplace, 'goods', 'error', 0, str(e), started_at)
             logger.error(f"Error collecting goods: {e}")
             raise
 
+    def _save_cards(self, session, cards: list) -> tuple:
+        """Save cards to wb_goods, returns (inserted, updated)"""
+        inserted = 0
+        updated = 0
+        new_barcodes = []
+
+        for card in cards:
+            vendor_code = card.get("vendorCode", "")
+            brand = card.get("brand", "")
+            title = card.get("title", "")
+            description = card.get("description", "")
+            imt_id = card.get("imtID")  # ID объединения карточек
+
+            # Parse dates
+            created_at_str = card.get("createdAt")
+            updated_at_str = card.get("updatedAt")
+            card_created_at = None
+            card_updated_at = None
+            if created_at_str:
+                try:
+                    card_created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
+                except ValueError:
+                    pass
+            if updated_at_str:
+                try:
+                    card_updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
+                except ValueError:
+                    pass
+
+            # Get photos
+            photos = card.get("photos", [])
+            photo_urls = []
+            for photo in photos:
+                photo_url = photo.get("big") or photo.get("c246x328") or photo.get("c516x688") or ""
+                if photo_url:
+                    photo_urls.append(photo_url)
+            photos_str = ",".join(photo_urls)
+
+            sizes = card.get("sizes", [])
+            for size in sizes:
+                tech_size = size.get("techSize", "")
+                wb_size = size.get("wbSize", "")
+                skus = size.get("skus", [])
+                barcode = skus[0] if skus else ""
+
+                if not barcode:
+                    continue
+
+                # Check if exists
+                existing = session.query(WBGood).filter_by(barcode=barcode).first()
+
+                if existing:
+                    # Update imt_id if changed
+                    needs_update = False
+                    if existing.imt_id != imt_id:
+                        existing.imt_id = imt_id
+                        article_groups.mark_vendor_code(session, existing.vendor_code)
+                        needs_update = True
+                    # Update photos if changed
+                    if existing.photos != photos_str and photos_str:
+                        existing.photos = photos_str
+                        needs_update = True
+                    if needs_update:
+                        updated += 1
+                else:
+                    # Insert new
+                    good = WBGood(
+                        vendor_code=vendor_code,
+                        brand=brand,
+                        title=title,
+                        description=description,
+                        tech_size=tech_size,
+                        wb_size=wb_size,
+                        barcode=barcode,
+                        imt_id=imt_id,
+                        photos=photos_str,
+                        card_created_at=card_created_at,
+                        card_updated_at=card_updated_at
+                    )
+                    session.add(good)
+                    new_barcodes.append(barcode)
+                    inserted += 1
+
+        self._link_new_goods(session, new_barcodes)
+        return inserted, updated
+
+    def _wb_goods_by_barcode(self, session, barcodes) -> dict:
+        """Карточки размеров по штрихкодам одним запросом: {barcode: (wb_good_id, tech_size)}"""
+        barcodes = list({b for b in barcodes if b})
+        goods = {}
+        for i in range(0, len(barcodes), BARCODE_CHUNK_SIZE):
+            for good_id, barcode, tech_size in session.query(
+                WBGood.id, WBGood.barcode, WBGood.tech_size
+            ).filter(WBGood.barcode.in_(barcodes[i:i + BARCODE_CHUNK_SIZE])).all():
+                goods[barcode] = (good_id, tech_size)
+        return goods
+
+    def _link_new_goods(self, session, barcodes: list):
+        """
+        Проставить wb_good_id заказам и продажам, загруженным раньше карточки.
+        Заказы связываются по своему штрихкоду, продажи - через заказ с тем же srid.
+        """
+        if not barcodes:
+            return
+        session.flush()
+
+        for i in range(0, len(barcodes), BARCODE_CHUNK_SIZE):
+            chunk = barcodes[i:i + BARCODE_CHUNK_SIZE]
+            good_id = select(WBGood.id).where(WBGood.barcode == WBOrder.barcode).scalar_subquery()
+            session.query(WBOrder).filter(
+                WBOrder.wb_good_id.is_(None),
+                WBOrder.barcode.in_(chunk)
+            ).update({WBOrder.wb_good_id: good_id}, synchronize_session=False)
+
+            order_good_id = select(WBOrder.wb_good_id).where(WBOrder.srid == WBSale.srid).scalar_subquery()
+            session.query(WBSale).filter(
+                WBSale.wb_good_id.is_(None),
+                WBSale.srid.in_(select(WBOrder.srid).where(WBOrder.barcode.in_(chunk)))
+            ).update({WBSale.wb_good_id: order_good_id}, synchronize_session=False)
+
     def update_data(self):
         """Update data (called every 10 minutes)"""
         session = self.Session()
@@ -0,0 +1,46 @@
+"""
+Актуальные остатки (current_stock).
+
+collect_stocks пишет дневной снимок в wb_stocks / ozon_stocks и в той же транзакции
+заменяет строки токена в current_stock: удаление старых и вставка новых коммитятся
+вместе, поэтому читатели видят либо прежний, либо новый снимок целиком.
+Читателям не нужно фильтровать историю по func.date(date) == today.
+"""
+import logging
+from datetime import datetime, timezone
+
+from app.models import CurrentStock
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_table(engine):
+    """Создать таблицу current_stock, если её ещё нет"""
+    CurrentStock.__table__.create(engine, checkfirst=True)
+
+
+def replace_token_stock(session, token_id: int, marketplace: str, rows) -> int:
+    """
+    Заменить остатки токена новым снимком (без коммита - коммитит коллектор).
+
+    Args:
+        rows: словари с полями CurrentStock (wb_good_id/product_id, warehouse_id,
+              article, size_norm, quantity, quantity_full, reserved, in_way_*)
+
+    Returns количество записанных строк
+    """
+    as_of = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    session.query(CurrentStock).filter(
+        CurrentStock.token_id == token_id
+    ).delete(synchronize_session=False)
+
+    mappings = [
+        dict(row, token_id=token_id, marketplace=marketplace, as_of=as_of)
+        for row in rows
+    ]
+    if mappings:
+        session.bulk_insert_mappings(CurrentStock, mappings)
+
+    logger.debug(f"current_stock: token {token_id} replaced with {len(mappings)} rows")
+    return len(mappings)
@@ -0,0 +1,309 @@
+"""
+Параллельный возобновляемый импорт финансовых транзакций Ozon в ozon_sales.
+
+Работа разбивается на единицы (токен, месяц), которые выполняются в пуле потоков
+с ограничением параллельности на каждый токен. Завершённые единицы записываются
+в import_progress, поэтому после падения импорт продолжается с места остановки.
+
+Запуск:
+    python -m datacollector.finance_importer --months 36 --per-token 2
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from datacollector.config import DataCollectorConfig
+from datacollector.collectors.ozon import OzonCollector
+from datacollector.queue_manager import RetryLater
+from datacollector import rollup
+from app.models import Token
+from app.models.sync import ImportProgress
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'ozon_finance'
+PAGE_SIZE = 1000
+# Сколько раз можно ждать Retry-After в одной единице работы
+MAX_DEFERRALS = 20
+
+
+class ImportStats:
+    """Thread-safe counters for import throughput"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.operations = 0
+        self.saved = 0
+        self.pages = 0
+        self.units_done = 0
+        self.units_failed = 0
+
+    def add_page(self, operations: int, saved: int):
+        with self.lock:
+            self.operations += operations
+            self.saved += saved
+            self.pages += 1
+
+    def summary(self) -> str:
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started_at, 0.001)
+            return (
+                f"единиц {self.units_done} (ошибок {self.units_failed}), "
+                f"операций {self.operations} (новых {self.saved}), страниц {self.pages}, "
+                f"{self.operations / elapsed:.1f} оп/с, {self.pages / elapsed:.2f} стр/с, "
+                f"{elapsed:.0f} с"
+            )
+
+
+class OzonFinanceImporter:
+    """Fan-out importer over (token, month) work units"""
+
+    def __init__(self, database_uri: str, months_back: int = 36, per_token: int = 2,
+                 max_workers: int = None, token_ids: list = None):
+        self.database_uri = database_uri
+        self.months_back = months_back
+        self.per_token = max(1, per_token)
+        self.max_workers = max_workers
+        self.token_ids = token_ids
+        self.engine = create_engine(database_uri)
+        self.Session = sessionmaker(bind=self.engine)
+        self.stats = ImportStats()
+
+    def get_tokens(self) -> list:
+        """Получить активные токены Ozon"""
+        session = self.Session()
+        try:
+            query = session.query(Token).filter_by(marketplace='ozon', is_active=True)
+            if self.token_ids:
+                query = query.filter(Token.id.in_(self.token_ids))
+            return [(t.id, t.name, t.client_id, t.token) for t in query.all()]
+        finally:
+            session.close()
+
+    def get_completed_units(self) -> set:
+        """Получить уже выполненные единицы (token_id, unit_key)"""
+        session = self.Session()
+        try:
+            rows = session.query(ImportProgress.token_id, ImportProgress.unit_key).filter_by(job=JOB_NAME).all()
+            return {(row[0], row[1]) for row in rows}
+        finally:
+            session.close()
+
+    def reset_progress(self):
+        """Удалить записи о выполненных единицах (полная перезагрузка)"""
+        ImportProgress.__table__.create(self.engine, checkfirst=True)
+        session = self.Session()
+        try:
+            query = session.query(ImportProgress).filter_by(job=JOB_NAME)
+            if self.token_ids:
+                query = query.filter(ImportProgress.token_id.in_(self.token_ids))
+            query.delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def build_units(self, tokens: list, completed: set) -> list:
+        """
+        Build (token, month) units, skipping completed ones.
+        Units are interleaved across tokens so every token keeps its slots busy.
+        """
+        today = datetime.now(timezone.utc)
+        first_month = (today - relativedelta(months=self.months_back)).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+
+        months = []
+        current = first_month
+        while current <= today:
+            months.append(current)
+            current = current + relativedelta(months=1)
+
+        units = []
+        for month_start in months:
+            for token in tokens:
+                if (token[0], month_start.strftime('%Y-%m')) in completed:
+                    continue
+                units.append((token, month_start))
+        return units
+
+    def run(self):
+        """Выполнить импорт"""
+        ImportProgress.__table__.create(self.engine, checkfirst=True)
+        rollup.ensure_table(self.engine)
+
+        tokens = self.get_tokens()
+        if not tokens:
+            print("Не найдено активных токенов Ozon")
+            return
+
+        print(f"Найдено {len(tokens)} токенов:")
+        for token_id, name, _, _ in tokens:
+            print(f"  - {token_id}: {name}")
+
+        units = self.build_units(tokens, self.get_completed_units())
+        if not units:
+            print("Все месяцы уже импортированы")
+            return
+
+        collectors = {
+            token_id: OzonCollector(token_id, client_id, api_key, self.database_uri)
+            for token_id, _, client_id, api_key in tokens
+        }
+        semaphores = {token_id: threading.BoundedSemaphore(self.per_token) for token_id, _, _, _ in tokens}
+        max_workers = self.max_workers or len(tokens) * self.per_token
+
+        print(f"\nЕдиниц к импорту: {len(units)}, потоков: {max_workers}, на токен: {self.per_token}")
+        print("=" * 60)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.import_unit, collectors[token[0]], semaphores[token[0]], token, month_start):
+                    (token, month_start)
+                for token, month_start in units
+            }
+
+            for future in as_completed(futures):
+                token, month_start = futures[future]
+                try:
+                    saved, operations, pages = future.result()
+                    with self.stats.lock:
+                        self.stats.units_done += 1
+                    print(f"  {token[1]} {month_start.strftime('%Y-%m')}: "
+                          f"+{saved} новых из {operations}, страниц {pages}")
+                except Exception as e:
+                    with self.stats.lock:
+                        self.stats.units_failed += 1
+                    print(f"  {token[1]} {month_start.strftime('%Y-%m')}: ошибка {e}")
+                print(f"  [{self.stats.summary()}]")
+
+        print(f"\n{'=' * 60}")
+        print(f"Итого: {self.stats.summary()}")
+
+    def import_unit(self, collector: OzonCollector, semaphore: threading.BoundedSemaphore,
+                    token: tuple, month_start: datetime) -> tuple:
+        """
+        Import one month for one token.
+        Every page is committed, the unit is recorded only when all pages are loaded.
+        """
+        token_id = token[0]
+        today = datetime.now(timezone.utc)
+        month_end = (month_start + relativedelta(months=1)) - timedelta(seconds=1)
+        # Текущий месяц ещё пополняется, поэтому не отмечаем его выполненным
+        is_closed_month = month_end < today
+        if month_end > today:
+            month_end = today
+
+        params = {
+            "filter": {
+                "date": {
+                    "from": month_start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    "to": month_end.strftime('%Y-%m-%dT%H:%M:%S.999Z')
+                },
+                "posting_number": "",
+                "transaction_type": "all"
+            },
+            "page": 1,
+            "page_size": PAGE_SIZE
+        }
+        url = f"{collector.base_url}/v3/finance/transaction/list"
+
+        saved_total = 0
+        operations_total = 0
+        pages = 0
+        deferrals = 0
+
+        with semaphore:
+            session = collector.Session()
+            try:
+                while True:
+                    try:
+                        response = collector._request_with_retry('POST', url, json=params)
+                    except RetryLater as e:
+                        deferrals += 1
+                        if deferrals > MAX_DEFERRALS:
+                            raise
+                        # В импортёре ждём только этот поток, остальные единицы продолжают работу
+                        logger.warning(f"Token {token_id} {month_start.strftime('%Y-%m')}: {e}, waiting {e.retry_after:.0f}s")
+                        time.sleep(e.retry_after)
+                        continue
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Ozon finance API error {response.status_code}: {response.text[:200]}")
+
+                    operations = response.json().get('result', {}).get('operations', [])
+                    pages += 1
+                    if not operations:
+                        self.stats.add_page(0, 0)
+                        break
+
+                    saved = collector._save_finance_operations(session, operations)
+                    rollup.refresh_marked_days(session)
+                    session.commit()
+
+                    saved_total += saved
+                    operations_total += len(operations)
+                    self.stats.add_page(len(operations), saved)
+
+                    if len(operations) < PAGE_SIZE:
+                        break
+                    params['page'] += 1
+
+                if is_closed_month:
+                    session.add(ImportProgress(
+                        job=JOB_NAME,
+                        token_id=token_id,
+                        unit_key=month_start.strftime('%Y-%m'),
+                        operations_count=operations_total,
+                        saved_count=saved_total,
+                        pages_count=pages
+                    ))
+                    session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+        return saved_total, operations_total, pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Импорт финансовых транзакций Ozon в ozon_sales')
+    parser.add_argument('--months', type=int, default=36, help='Сколько месяцев назад загружать')
+    parser.add_argument('--per-token', type=int, default=2, help='Параллельных месяцев на один токен')
+    parser.add_argument('--workers', type=int, default=None, help='Общее число потоков')
+    parser.add_argument('--token', type=int, action='append', dest='token_ids', help='ID токена (можно несколько)')
+    parser.add_argument('--reset', action='store_true', help='Забыть прогресс и загрузить всё заново')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    importer = OzonFinanceImporter(
+        DataCollectorConfig.DATABASE_URI,
+        months_back=args.months,
+        per_token=args.per_token,
+        max_workers=args.workers,
+        token_ids=args.token_ids
+    )
+
+    if args.reset:
+        print("Сброс прогресса импорта...")
+        importer.reset_progress()
+
+    importer.run()
+    print("\nИмпорт завершён!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Индекс кодов маркировки (kiz_files / kiz_codes) для поиска КИЗ.
+
+Коды лежат в CSV "Коды_идентификации*.csv" в подпапках SMB_KIZ_KM_PATH.
+Обновление инкрементальное: файл перечитывается, только если изменились его
+размер или время изменения, строки файла заменяются и коммитятся вместе с
+записью kiz_files, поэтому поиск видит файл либо целиком, либо в прежнем виде.
+Файлы, исчезнувшие с шары, удаляются из индекса.
+Веб-интерфейс ищет только по индексу и к шаре не обращается.
+
+Фоновое обновление - поток в datacollector (раз в KIZ_INDEX_INTERVAL секунд).
+Ручной запуск:
+    python -m datacollector.kiz_index
+"""
+import logging
+import sys
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from datacollector.config import DataCollectorConfig
+from app.models import KizFile, KizCode
+from app.services.smb_service import SMBService
+
+logger = logging.getLogger(__name__)
+
+# Файлы с кодами маркировки внутри папок КМ
+KIZ_FILE_MARKER = 'Коды_идентификации'
+# Файлов в одной порции параллельного чтения
+READ_BATCH_SIZE = 16
+
+
+def ensure_table(engine):
+    """Создать таблицы индекса, если их ещё нет"""
+    KizFile.__table__.create(engine, checkfirst=True)
+    KizCode.__table__.create(engine, checkfirst=True)
+
+
+def is_configured() -> bool:
+    """Заданы ли параметры SMB шары и папки КМ"""
+    return bool(getattr(DataCollectorConfig, 'SMB_HOST', None) and
+                getattr(DataCollectorConfig, 'SMB_KIZ_KM_PATH', None))
+
+
+def open_smb() -> SMBService:
+    """SMB соединение с параметрами из DataCollectorConfig"""
+    return SMBService(
+        host=DataCollectorConfig.SMB_HOST,
+        port=DataCollectorConfig.SMB_PORT,
+        username=DataCollectorConfig.SMB_USER,
+        password=DataCollectorConfig.SMB_PASSWORD,
+        share=DataCollectorConfig.SMB_SHARE
+    )
+
+
+def parse_codes(content: str, file_id: int, folder: str) -> list:
+    """Строки CSV -> словари KizCode (код маркировки начинается с 01 + GTIN из 14 символов)"""
+    codes = []
+    for line_number, line in enumerate(content.split('\n'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        gtin = line[2:16] if line.startswith('01') and len(line) >= 16 else None
+        codes.append({
+            'file_id': file_id,
+            'folder': folder,
+            'line_number': line_number,
+            'code': line[:512],
+            'gtin': gtin,
+        })
+    return codes
+
+
+def _index_file(session, content: str, folder: str, file_name: str, size: int, mtime: float,
+                file_id: int = None) -> int:
+    """Заменить строки файла в индексе (с коммитом)"""
+    if file_id is None:
+        kiz_file = KizFile(folder=folder, file_name=file_name, size=size, mtime=mtime)
+        session.add(kiz_file)
+        session.flush()
+    else:
+        kiz_file = session.get(KizFile, file_id)
+        session.query(KizCode).filter(
+            KizCode.file_id == file_id
+        ).delete(synchronize_session=False)
+
+    codes = parse_codes(content, kiz_file.id, folder)
+    if codes:
+        session.bulk_insert_mappings(KizCode, codes)
+
+    kiz_file.size = size
+    kiz_file.mtime = mtime
+    kiz_file.codes_count = len(codes)
+    kiz_file.indexed_at = datetime.utcnow()
+    session.commit()
+    return len(codes)
+
+
+def refresh(session, smb, km_path: str) -> dict:
+    """
+    Обновить индекс по содержимому папки КМ.
+
+    Returns:
+        {'indexed': файлов перечитано, 'unchanged': без изменений,
+         'removed': удалено из индекса, 'codes': строк записано}
+    """
+    stats = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'codes': 0}
+    # {(folder, file_name): (id, size, mtime)} - снимок, коммиты по файлам его не трогают
+    known = {
+        (row.folder, row.file_name): (row.id, row.size, row.mtime)
+        for row in session.query(KizFile.id, KizFile.folder, KizFile.file_name, KizFile.size, KizFile.mtime).all()
+    }
+    # Файлы папок, которые не удалось прочитать, не удаляются из индекса
+    keep = set()
+    # [(path, folder, file_name, size, mtime, file_id)] - файлы для переиндексации
+    changed = []
+
+    for folder_info in smb.list_files(km_path):
+        if not folder_info['is_directory']:
+            continue
+
+        folder = folder_info['filename']
+        folder_path = f"{km_path}/{folder}"
+        try:
+            files = smb.list_files(folder_path)
+        except Exception as e:
+            logger.warning(f"KIZ index: cannot list {folder_path}: {e}")
+            keep.update(key for key in known if key[0] == folder)
+            continue
+
+        for file_info in files:
+            file_name = file_info['filename']
+            if not (file_name.endswith('.csv') and KIZ_FILE_MARKER in file_name):
+                continue
+
+            key = (folder, file_name)
+            keep.add(key)
+            size = file_info['size']
+            mtime = file_info['last_write_time']
+            file_id, known_size, known_mtime = known.get(key, (None, None, None))
+            if file_id is not None and known_size == size and known_mtime == mtime:
+                stats['unchanged'] += 1
+                continue
+            changed.append((f"{folder_path}/{file_name}", folder, file_name, size, mtime, file_id))
+
+    # Изменившиеся файлы читаются параллельно порциями, чтобы не держать в памяти весь архив
+    for i in range(0, len(changed), READ_BATCH_SIZE):
+        batch = changed[i:i + READ_BATCH_SIZE]
+        contents = smb.read_files([item[0] for item in batch])
+        for path, folder, file_name, size, mtime, file_id in batch:
+            try:
+                content = contents[path]
+                if isinstance(content, Exception):
+                    raise content
+                stats['codes'] += _index_file(session, content.read().decode('utf-8'),
+                                              folder, file_name, size, mtime, file_id)
+                stats['indexed'] += 1
+            except Exception as e:
+                session.rollback()
+                logger.warning(f"KIZ index: cannot index {path}: {e}")
+
+    removed_ids = [file_id for key, (file_id, _, _) in known.items() if key not in keep]
+    if removed_ids:
+        session.query(KizCode).filter(
+            KizCode.file_id.in_(removed_ids)
+        ).delete(synchronize_session=False)
+        session.query(KizFile).filter(
+            KizFile.id.in_(removed_ids)
+        ).delete(synchronize_session=False)
+        session.commit()
+        stats['removed'] = len(removed_ids)
+
+    return stats
+
+
+def refresh_from_config(Session) -> dict:
+    """Обновить индекс с параметрами шары из DataCollectorConfig"""
+    session = Session()
+    try:
+        with open_smb() as smb:
+            return refresh(session, smb, DataCollectorConfig.SMB_KIZ_KM_PATH)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    if not is_configured():
+        print("SMB_HOST / SMB_KIZ_KM_PATH не заданы в конфигурации")
+        sys.exit(1)
+
+    engine = create_engine(DataCollectorConfig.DATABASE_URI)
+    ensure_table(engine)
+    stats = refresh_from_config(sessionmaker(bind=engine))
+
+    print(f"Перечитано файлов: {stats['indexed']}, без изменений: {stats['unchanged']}, "
+          f"удалено: {stats['removed']}, кодов записано: {stats['codes']}")
+    print("\nОбновление индекса завершено!")
+
+
+if __name__ == '__main__':
+    main()
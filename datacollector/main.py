@@ -12,6 +12,11 @@ from datacollector.collectors.ozon import OzonCollector
 from datacollector.queue_manager import TaskQueue, Task, TaskPriority
 from datacollector.worker import WorkerPool
 from datacollector.notifier import APIValidationNotifier
+from datacollector.api_validator import APIValidator
+from datacollector import rollup
+from datacollector import current_stock
+from datacollector import article_groups
+from datacollector import kiz_index
 from app.models import Token, WBStock, OzonStock
 from app.models.sync import ManualTask
 from app.models.vpn import VPNUser
@@ -350,10 +355,11 @@ def retry_queue_processor():
     while running:
         try:
             task_queue.process_retry_queue()
-            time.sleep(60)  # Check every minute
+            # Проверяем часто, чтобы отложенные по Retry-After задачи возвращались вовремя
+            time.sleep(5)
         except Exception as e:
             logger.error(f"Error in retry queue processor: {e}")
-            time.sleep(60)
+            time.sleep(5)
 
     logger.info("Retry queue processor stopped")
 
@@ -449,6 +455,32 @@ def stocks_scheduler():
     logger.info("Stocks scheduler stopped")
 
 
+def kiz_index_refresher():
+    """Background thread to keep the KIZ marking-code index in sync with the SMB share"""
+    interval = getattr(DataCollectorConfig, 'KIZ_INDEX_INTERVAL', 600)
+    logger.info(f"KIZ index refresher started (every {interval}s)")
+
+    engine = create_engine(DataCollectorConfig.DATABASE_URI)
+    Session = sessionmaker(bind=engine)
+
+    while running:
+        try:
+            stats = kiz_index.refresh_from_config(Session)
+            if stats['indexed'] or stats['removed']:
+                logger.info(f"KIZ index: indexed {stats['indexed']} files ({stats['codes']} codes), "
+                            f"removed {stats['removed']}, unchanged {stats['unchanged']}")
+        except Exception as e:
+            logger.error(f"Error refreshing KIZ index: {e}")
+
+        # Спим короткими интервалами, чтобы быстро реагировать на остановку
+        for _ in range(int(interval // 5)):
+            if not running:
+                break
+            time.sleep(5)
+
+    logger.info("KIZ index refresher stopped")
+
+
 def initialize_telegram_notifier():
     """Initialize Telegram notifier for API validation alerts"""
     logger.info("Initializing Telegram notifier...")
@@ -494,6 +526,13 @@ def main():
     # Initialize Telegram notifier for API validation alerts
     initialize_telegram_notifier()
 
+    # Таблицы дневных итогов и актуальных остатков обновляются коллекторами
+    engine = create_engine(DataCollectorConfig.DATABASE_URI)
+    rollup.ensure_table(engine)
+    current_stock.ensure_table(engine)
+    article_groups.ensure_table(engine)
+    kiz_index.ensure_table(engine)
+
     # Initialize task queue
     task_queue = TaskQueue()
 
@@ -525,6 +564,13 @@ def main():
     manual_tasks_thread = threading.Thread(target=process_manual_tasks, daemon=True)
     manual_tasks_thread.start()
 
+    # Start KIZ index refresher in background (if SMB share is configured)
+    if kiz_index.is_configured():
+        kiz_thread = threading.Thread(target=kiz_index_refresher, daemon=True)
+        kiz_thread.start()
+    else:
+        logger.info("SMB share is not configured, KIZ index refresher disabled")
+
     # Main loop - two different intervals
     last_10min_update = time.time()
     last_hourly_update = time.time()
@@ -546,6 +592,7 @@ def main():
             # Hourly updates (stocks and supply orders)
             if current_time - last_hourly_update >= interval_hourly:
                 schedule_hourly_updates()
+                APIValidator.log_stats()
                 last_hourly_update = current_time
 
             time.sleep(60)
@@ -1,6 +1,6 @@
 """
 Модуль уведомлений для datacollector.
-Отправляет сообщения в Telegram при ошибках валидации API.
+Отправляет сообщения в Telegram при ошибках валидации и недоступности API.
 """
 import logging
 import requests
@@ -104,6 +104,40 @@ class APIValidationNotifier:
             cls._notified_errors.add(error_key)
             logger.info(f"Sent new fields notification for {marketplace}/{api_name}")
 
+    @classmethod
+    def notify_api_down(cls, marketplace: str, host: str, failures: int, error: str):
+        """Уведомить о недоступности API (одно сообщение на сбой, дедупликацию делает circuit breaker)"""
+        if cls._notifier is None:
+            return
+
+        message = (
+            f"<b>API Unavailable</b>\n\n"
+            f"<b>Marketplace:</b> {marketplace}\n"
+            f"<b>Host:</b> {host}\n"
+            f"<b>Failures in a row:</b> {failures}\n"
+            f"<b>Last error:</b>\n<code>{error[:500]}</code>\n\n"
+            f"<i>Задачи отложены до восстановления API.</i>"
+        )
+
+        if cls._notifier.send_message(message):
+            logger.info(f"Sent API down notification for {marketplace}/{host}")
+
+    @classmethod
+    def notify_api_recovered(cls, marketplace: str, host: str, downtime_seconds: float):
+        """Уведомить о восстановлении API"""
+        if cls._notifier is None:
+            return
+
+        message = (
+            f"<b>API Recovered</b>\n\n"
+            f"<b>Marketplace:</b> {marketplace}\n"
+            f"<b>Host:</b> {host}\n"
+            f"<b>Downtime:</b> {int(downtime_seconds // 60)} мин"
+        )
+
+        if cls._notifier.send_message(message):
+            logger.info(f"Sent API recovered notification for {marketplace}/{host}")
+
     @classmethod
     def clear_cache(cls):
         """Очистить кэш уведомлений (для тестов или периодической очистки)"""
@@ -15,6 +15,21 @@ class TaskPriority(IntEnum):
     LOW = 3
 
 
+class RetryLater(Exception):
+    """
+    Rate limit or transient API error.
+    The task is put back to the queue after retry_after seconds and resumed from cursor,
+    so the worker can process other tokens meanwhile.
+    count=False - planned pacing between requests (not an API error), does not use up max_deferrals.
+    """
+
+    def __init__(self, message: str, retry_after: float = 60, cursor: dict = None, count: bool = True):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.cursor = cursor
+        self.count = count
+
+
 class Task:
     """Task for data collection"""
 
@@ -26,6 +41,10 @@ class Task:
         self.attempts = 0
         self.max_attempts = 5
         self.next_retry = None
+        # Продолжение после RetryLater: позиция, с которой возобновить сбор
+        self.cursor = None
+        self.deferrals = 0
+        self.max_deferrals = 20
 
     def __lt__(self, other):
         if self.priority != other.priority:
@@ -47,6 +66,22 @@ class Task:
         self.next_retry = datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds)
         logger.info(f"Task {self.token_id}:{self.endpoint} scheduled for retry #{self.attempts} at {self.next_retry}")
 
+    def can_defer(self) -> bool:
+        """Check if task can be deferred once more"""
+        return self.deferrals < self.max_deferrals
+
+    def defer(self, retry_after: float, cursor: dict = None, count: bool = True):
+        """
+        Schedule continuation after server-provided delay (does not count as failed attempt).
+        count=False - task was short-circuited without calling API (open circuit breaker)
+        or paced by the API request interval.
+        """
+        if count:
+            self.deferrals += 1
+        self.cursor = cursor
+        self.next_retry = datetime.now(timezone.utc) + timedelta(seconds=retry_after)
+        logger.info(f"Task {self.token_id}:{self.endpoint} deferred #{self.deferrals} for {retry_after:.0f}s, cursor={cursor}")
+
 
 class TaskQueue:
     """Priority queue for tasks"""
@@ -71,10 +106,20 @@ class TaskQueue:
         """Mark task as done"""
         self.queue.task_done()
 
-    def add_to_retry(self, task: Task):
-        """Add task to retry queue"""
+    def add_to_retry(self, task: Task, dedupe: bool = False):
+        """
+        Add task to retry queue.
+        dedupe=True - skip if the same token/endpoint task is already waiting
+        (scheduler keeps adding tasks while API is down).
+        """
         with self.lock:
+            if dedupe and any(
+                waiting.token_id == task.token_id and waiting.endpoint == task.endpoint
+                for waiting in self.retry_queue
+            ):
+                return False
             self.retry_queue.append(task)
+            return True
 
     def process_retry_queue(self):
         """Process retry queue and move ready tasks to main queue"""
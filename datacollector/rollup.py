@@ -0,0 +1,367 @@
+"""
+Дневные итоги заказов и продаж по токенам (daily_token_totals) и куб статусов
+заказов по артикулам и размерам (order_status_cube).
+
+Коллекторы отмечают дни, затронутые записью (mark_day), и перед коммитом
+пересчитывают только эти дни (refresh_marked_days). Пересчёт идёт по сырым
+строкам одного токена за один день, поэтому он идемпотентен и учитывает
+обновления существующих записей (отмены WB, статусы Ozon).
+
+Задачи заказов и продаж одного токена выполняются разными воркерами одновременно
+и пересчитывают одни и те же дни. На PostgreSQL пересчёт токена берёт
+pg_advisory_xact_lock до подсчёта, поэтому записи итогов не конфликтуют по
+уникальному ключу, а последняя транзакция считает итоги с уже закоммиченными
+строками предыдущей. Блокировка снимается при коммите или откате.
+
+Коллекторы пишут только свежие дни, поэтому итоги токена считаются полными лишь
+с дня, записанного перестройкой в rollup_coverage.covered_from; более ранние дни
+читатели берут из сырых таблиц.
+
+Полная перестройка:
+    python -m datacollector.rollup --token 5 --days 90
+"""
+import argparse
+import logging
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, func, case, literal, text
+from sqlalchemy.orm import sessionmaker
+
+from datacollector.config import DataCollectorConfig
+from app.models import Token, WBOrder, WBSale, OzonOrder, OzonSale, DailyTokenTotal, OrderStatusCube, RollupCoverage
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'daily_totals_days'
+OZON_DELIVERED = 'OperationAgentDeliveredToCustomer'
+# Статусы постингов Ozon "в доставке"
+OZON_DELIVERING = ('delivering', 'awaiting_deliver', 'awaiting_packaging')
+# Первый ключ pg_advisory_xact_lock пересчёта итогов (второй - token_id)
+ROLLUP_LOCK_CLASS = 7301
+
+
+def ensure_table(engine):
+    """Создать таблицы daily_token_totals, order_status_cube и rollup_coverage, если их ещё нет"""
+    DailyTokenTotal.__table__.create(engine, checkfirst=True)
+    OrderStatusCube.__table__.create(engine, checkfirst=True)
+    RollupCoverage.__table__.create(engine, checkfirst=True)
+
+
+def lock_token(session, token_id: int):
+    """Заблокировать пересчёт итогов токена до конца транзакции (только PostgreSQL)"""
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(
+            text('SELECT pg_advisory_xact_lock(:lock_class, :token_id)'),
+            {'lock_class': ROLLUP_LOCK_CLASS, 'token_id': token_id}
+        )
+
+
+def mark_day(session, token_id: int, marketplace: str, value: datetime):
+    """Отметить день, итоги которого нужно пересчитать перед коммитом"""
+    if value is None:
+        return
+    marked = session.info.setdefault(SESSION_KEY, set())
+    if isinstance(value, datetime):
+        day = value.date()
+        if value.tzinfo is not None:
+            # Время с часовым поясом БД приводит к своему поясу - день может сдвинуться
+            marked.add((token_id, marketplace, day - timedelta(days=1)))
+            marked.add((token_id, marketplace, day + timedelta(days=1)))
+    else:
+        day = value
+    marked.add((token_id, marketplace, day))
+
+
+def refresh_marked_days(session) -> int:
+    """Пересчитать все отмеченные в сессии дни. Возвращает количество пересчитанных дней"""
+    marked = session.info.pop(SESSION_KEY, None)
+    if not marked:
+        return 0
+
+    session.flush()
+
+    days_by_token = defaultdict(set)
+    for token_id, marketplace, day in marked:
+        days_by_token[(token_id, marketplace)].add(day)
+
+    # Токены в одном порядке во всех воркерах - блокировки не перекрещиваются
+    for (token_id, marketplace), days in sorted(days_by_token.items()):
+        refresh_days(session, token_id, marketplace, days)
+
+    return len(marked)
+
+
+def _to_date(value) -> date:
+    """func.date возвращает date в PostgreSQL и строку в SQLite"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _day_bounds(days) -> tuple:
+    start = min(days)
+    end = max(days) + timedelta(days=1)
+    return datetime(start.year, start.month, start.day), datetime(end.year, end.month, end.day)
+
+
+def _grouped(session, date_column, columns, filters, date_from: datetime, date_to: datetime) -> dict:
+    """Агрегаты по дням: {day: row}"""
+    day_column = func.date(date_column)
+    rows = session.query(day_column.label('day'), *columns).filter(
+        *filters,
+        date_column >= date_from,
+        date_column < date_to
+    ).group_by(day_column).all()
+    return {_to_date(row.day): row for row in rows}
+
+
+def compute_days(session, token_id: int, marketplace: str, date_from: datetime, date_to: datetime) -> dict:
+    """
+    Посчитать итоги по сырым строкам за [date_from, date_to).
+    Returns {day: {'orders_count', 'orders_sum', 'sales_count', 'sales_sum', 'cancellations_count'}}
+    Метрики совпадают с SalesService.
+    """
+    if marketplace == 'wildberries':
+        orders = _grouped(session, WBOrder.date, [
+            func.count(WBOrder.id).label('count'),
+            func.sum(WBOrder.price_with_disc).label('total'),
+            func.sum(case((WBOrder.is_cancel == True, 1), else_=0)).label('cancelled'),
+        ], [WBOrder.token_id == token_id], date_from, date_to)
+        sales = _grouped(session, WBSale.date, [
+            func.count(WBSale.id).label('count'),
+            func.sum(WBSale.finished_price).label('total'),
+        ], [WBSale.token_id == token_id], date_from, date_to)
+    elif marketplace == 'ozon':
+        orders = _grouped(session, OzonOrder.in_process_at, [
+            func.count(OzonOrder.id).label('count'),
+            func.sum(OzonOrder.price).label('total'),
+            func.sum(case((OzonOrder.status == 'cancelled', 1), else_=0)).label('cancelled'),
+        ], [OzonOrder.token_id == token_id], date_from, date_to)
+        # Количество - только доставленные покупателю, сумма - по всем операциям
+        sales = _grouped(session, OzonSale.operation_date, [
+            func.sum(case((OzonSale.operation_type == OZON_DELIVERED, 1), else_=0)).label('count'),
+            func.sum(OzonSale.amount).label('total'),
+        ], [OzonSale.token_id == token_id], date_from, date_to)
+    else:
+        return {}
+
+    totals = {}
+    for day in set(orders) | set(sales):
+        order_row = orders.get(day)
+        sale_row = sales.get(day)
+        totals[day] = {
+            'orders_count': int(order_row.count or 0) if order_row else 0,
+            'orders_sum': (order_row.total or 0) if order_row else 0,
+            'cancellations_count': int(order_row.cancelled or 0) if order_row else 0,
+            'sales_count': int(sale_row.count or 0) if sale_row else 0,
+            'sales_sum': (sale_row.total or 0) if sale_row else 0,
+        }
+    return totals
+
+
+def _store(session, token_id: int, marketplace: str, days, totals: dict):
+    """Записать итоги за дни (дни без данных обнуляются)"""
+    existing = {
+        row.day: row for row in session.query(DailyTokenTotal).filter(
+            DailyTokenTotal.token_id == token_id,
+            DailyTokenTotal.day.in_(list(days))
+        ).all()
+    }
+
+    empty = {'orders_count': 0, 'orders_sum': 0, 'sales_count': 0, 'sales_sum': 0, 'cancellations_count': 0}
+    for day in days:
+        values = totals.get(day, empty)
+        row = existing.get(day)
+        if row is None:
+            if day not in totals:
+                continue
+            row = DailyTokenTotal(token_id=token_id, marketplace=marketplace, day=day)
+            session.add(row)
+        for field, value in values.items():
+            setattr(row, field, value)
+
+
+def compute_cube(session, token_id: int, marketplace: str, date_from: datetime, date_to: datetime) -> list:
+    """
+    Куб статусов заказов по сырым строкам за [date_from, date_to).
+    Returns список словарей с полями OrderStatusCube (без token_id/marketplace).
+    WB: выкуп - заказ без отмены (как на странице выкупов), "в доставке" не различается.
+    """
+    if marketplace == 'wildberries':
+        date_column = WBOrder.date
+        article = func.coalesce(WBOrder.supplier_article, '')
+        size = func.coalesce(WBOrder.tech_size, '')
+        columns = [
+            func.count(WBOrder.id).label('ordered_count'),
+            func.sum(WBOrder.price_with_disc).label('ordered_sum'),
+            func.sum(case((WBOrder.is_cancel == False, 1), else_=0)).label('delivered_count'),
+            func.sum(case((WBOrder.is_cancel == False, WBOrder.price_with_disc), else_=0)).label('delivered_sum'),
+            func.sum(case((WBOrder.is_cancel == True, 1), else_=0)).label('cancelled_count'),
+            literal(0).label('delivering_count'),
+        ]
+        token_filter = WBOrder.token_id == token_id
+    elif marketplace == 'ozon':
+        date_column = OzonOrder.in_process_at
+        article = func.coalesce(OzonOrder.article, '')
+        size = func.coalesce(OzonOrder.size_norm, '')
+        columns = [
+            func.count(OzonOrder.id).label('ordered_count'),
+            func.sum(OzonOrder.price).label('ordered_sum'),
+            func.sum(case((OzonOrder.status == 'delivered', 1), else_=0)).label('delivered_count'),
+            func.sum(case((OzonOrder.status == 'delivered', OzonOrder.price), else_=0)).label('delivered_sum'),
+            func.sum(case((OzonOrder.status == 'cancelled', 1), else_=0)).label('cancelled_count'),
+            func.sum(case((OzonOrder.status.in_(OZON_DELIVERING), 1), else_=0)).label('delivering_count'),
+        ]
+        token_filter = OzonOrder.token_id == token_id
+    else:
+        return []
+
+    day_column = func.date(date_column)
+    rows = session.query(
+        day_column.label('day'), article.label('article'), size.label('size_norm'), *columns
+    ).filter(
+        token_filter,
+        date_column >= date_from,
+        date_column < date_to
+    ).group_by(day_column, article, size).all()
+
+    return [{
+        'day': _to_date(row.day),
+        'article': row.article[:200],
+        'size_norm': row.size_norm[:50],
+        'ordered_count': int(row.ordered_count or 0),
+        'ordered_sum': row.ordered_sum or 0,
+        'delivered_count': int(row.delivered_count or 0),
+        'delivered_sum': row.delivered_sum or 0,
+        'cancelled_count': int(row.cancelled_count or 0),
+        'delivering_count': int(row.delivering_count or 0),
+    } for row in rows]
+
+
+def _store_cube(session, token_id: int, marketplace: str, days, cells: list):
+    """Заменить строки куба токена за дни"""
+    session.query(OrderStatusCube).filter(
+        OrderStatusCube.token_id == token_id,
+        OrderStatusCube.day.in_(list(days))
+    ).delete(synchronize_session=False)
+    if cells:
+        session.bulk_insert_mappings(OrderStatusCube, [
+            dict(cell, token_id=token_id, marketplace=marketplace) for cell in cells
+        ])
+
+
+def refresh_days(session, token_id: int, marketplace: str, days):
+    """Пересчитать итоги и куб статусов токена за указанные дни"""
+    days = set(days)
+    if not days:
+        return
+    lock_token(session, token_id)
+    date_from, date_to = _day_bounds(days)
+    totals = compute_days(session, token_id, marketplace, date_from, date_to)
+    _store(session, token_id, marketplace, days, {day: totals[day] for day in days if day in totals})
+    cells = compute_cube(session, token_id, marketplace, date_from, date_to)
+    _store_cube(session, token_id, marketplace, days, [cell for cell in cells if cell['day'] in days])
+
+
+def _set_coverage(session, token_id: int, covered_from: date):
+    """Расширить покрытие rollup токена до covered_from (покрытие только растёт)"""
+    coverage = session.query(RollupCoverage).filter(RollupCoverage.token_id == token_id).first()
+    if coverage is None:
+        session.add(RollupCoverage(token_id=token_id, covered_from=covered_from))
+    else:
+        coverage.covered_from = min(coverage.covered_from, covered_from)
+        coverage.rebuilt_at = datetime.utcnow()
+    session.commit()
+
+
+def rebuild_token(session, token_id: int, marketplace: str, days_back: int = None, chunk_days: int = 31) -> int:
+    """
+    Перестроить итоги и куб статусов токена по сырым строкам, окнами по chunk_days дней,
+    и записать покрытие rollup (с первого перестроенного дня).
+    Returns количество записанных дней.
+    """
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    if days_back is not None:
+        start = end - timedelta(days=days_back + 1)
+    else:
+        if marketplace == 'wildberries':
+            candidates = [
+                session.query(func.min(WBOrder.date)).filter(WBOrder.token_id == token_id).scalar(),
+                session.query(func.min(WBSale.date)).filter(WBSale.token_id == token_id).scalar(),
+            ]
+        else:
+            candidates = [
+                session.query(func.min(OzonOrder.in_process_at)).filter(OzonOrder.token_id == token_id).scalar(),
+                session.query(func.min(OzonSale.operation_date)).filter(OzonSale.token_id == token_id).scalar(),
+            ]
+        candidates = [value for value in candidates if value is not None]
+        if not candidates:
+            # Данных ещё нет - всё, что появится, запишут коллекторы
+            _set_coverage(session, token_id, (end - timedelta(days=1)).date())
+            return 0
+        start = min(candidates).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+    stored = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        lock_token(session, token_id)
+        totals = compute_days(session, token_id, marketplace, chunk_start, chunk_end)
+        days = [
+            (chunk_start + timedelta(days=offset)).date()
+            for offset in range((chunk_end - chunk_start).days)
+        ]
+        _store(session, token_id, marketplace, days, totals)
+        _store_cube(session, token_id, marketplace, days,
+                    compute_cube(session, token_id, marketplace, chunk_start, chunk_end))
+        session.commit()
+        stored += len(totals)
+        chunk_start = chunk_end
+
+    _set_coverage(session, token_id, start.date())
+    return stored
+
+
+def rebuild_all(engine, token_ids=None, days_back: int = None):
+    """Создать таблицы и перестроить итоги и куб по токенам WB и Ozon (все или token_ids)"""
+    ensure_table(engine)
+    session = sessionmaker(bind=engine)()
+
+    try:
+        query = session.query(Token).filter(Token.marketplace.in_(['wildberries', 'ozon']))
+        if token_ids:
+            query = query.filter(Token.id.in_(token_ids))
+        tokens = [(t.id, t.name, t.marketplace) for t in query.all()]
+
+        for token_id, name, marketplace in tokens:
+            stored = rebuild_token(session, token_id, marketplace, days_back=days_back)
+            print(f"  {token_id} {name} ({marketplace}): {stored} дней")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Перестройка daily_token_totals и order_status_cube')
+    parser.add_argument('--token', type=int, action='append', dest='token_ids', help='ID токена (можно несколько)')
+    parser.add_argument('--days', type=int, default=None, help='Сколько последних дней перестроить (по умолчанию - все)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    rebuild_all(create_engine(DataCollectorConfig.DATABASE_URI), args.token_ids, args.days)
+    print("\nПерестройка завершена!")
+
+
+if __name__ == '__main__':
+    main()
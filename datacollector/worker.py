@@ -2,10 +2,12 @@ import logging
 import threading
 import time
 from datetime import datetime
-from datacollector.queue_manager import Task, TaskQueue
+from datacollector.queue_manager import Task, TaskQueue, RetryLater
 from datacollector.collectors.wildberries import WildberriesCollector
 from datacollector.collectors.ozon import OzonCollector
 from datacollector.config import DataCollectorConfig
+from datacollector.api_validator import APIValidator
+from datacollector.circuit_breaker import CircuitBreakerRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -38,8 +40,24 @@ class Worker(threading.Thread):
 
         self.last_request_time[token_id] = time.time()
 
+    def short_circuit(self, task: Task) -> bool:
+        """Defer task without calling API if circuit breaker of its API group is open"""
+        breaker = CircuitBreakerRegistry.for_endpoint(task.endpoint)
+        if breaker is None or not breaker.is_blocked():
+            return False
+
+        task.defer(breaker.retry_after(), task.cursor, count=False)
+        if self.task_queue.add_to_retry(task, dedupe=True):
+            logger.debug(f"Worker {self.worker_id}: {task.endpoint} for token {task.token_id} short-circuited ({breaker.group} is open)")
+        else:
+            logger.debug(f"Worker {self.worker_id}: {task.endpoint} for token {task.token_id} dropped, already waiting for {breaker.group}")
+        return True
+
     def process_task(self, task: Task) -> bool:
-        """Process single task, return True if successful"""
+        """
+        Process single task, return True if successful.
+        RetryLater is propagated to the caller so the task can be deferred with its cursor.
+        """
         try:
             collector = self.collectors.get(task.token_id)
             if not collector:
@@ -48,6 +66,9 @@ class Worker(threading.Thread):
 
             logger.info(f"Worker {self.worker_id}: Processing {task.endpoint} for token {task.token_id}")
 
+            # Новый запуск для режима валидации first_page
+            APIValidator.start_run()
+
             # Wait for rate limit
             self.wait_for_rate_limit(task.token_id)
 
@@ -64,20 +85,20 @@ class Worker(threading.Thread):
                 if task.endpoint == 'incomes':
                     collector.collect_incomes(session)
                 elif task.endpoint == 'sales':
-                    collector.collect_sales(session)
+                    collector.collect_sales(session, cursor=task.cursor)
                 elif task.endpoint == 'orders':
-                    collector.collect_orders(session)
+                    collector.collect_orders(session, cursor=task.cursor)
                 elif task.endpoint == 'stocks':
                     collector.collect_stocks(session)
                 elif task.endpoint == 'goods':
-                    collector.collect_goods(session)
+                    collector.collect_goods(session, cursor=task.cursor)
                 # Ozon endpoints
                 elif task.endpoint == 'ozon_stocks':
                     collector.collect_stocks(session)
                 elif task.endpoint == 'ozon_sales':
-                    collector.collect_sales(session)
+                    collector.collect_sales(session, cursor=task.cursor)
                 elif task.endpoint == 'ozon_orders':
-                    collector.collect_orders(session)
+                    collector.collect_orders(session, cursor=task.cursor)
                 elif task.endpoint == 'ozon_supply_orders':
                     collector.collect_supply_orders(session)
                 else:
@@ -87,6 +108,8 @@ class Worker(threading.Thread):
                 logger.info(f"Worker {self.worker_id}: Successfully processed {task.endpoint} for token {task.token_id}")
                 return True
 
+            except RetryLater:
+                raise
             except Exception as e:
                 # Check if it's a 429 rate limit error
                 if '429' in str(e) or 'Too Many Requests' in str(e):
@@ -98,6 +121,8 @@ class Worker(threading.Thread):
             finally:
                 session.close()
 
+        except RetryLater:
+            raise
         except Exception as e:
             logger.error(f"Worker {self.worker_id}: Task failed: {e}")
             return False
@@ -113,6 +138,9 @@ class Worker(threading.Thread):
                 continue
 
             try:
+                if self.short_circuit(task):
+                    continue
+
                 success = self.process_task(task)
 
                 if not success:
@@ -124,6 +152,15 @@ class Worker(threading.Thread):
                     else:
                         logger.error(f"Worker {self.worker_id}: Task exhausted all retries")
 
+            except RetryLater as e:
+                # Не спим в воркере: возвращаем задачу в очередь с задержкой и курсором
+                if not e.count or task.can_defer():
+                    task.defer(e.retry_after, e.cursor, count=e.count)
+                    self.task_queue.add_to_retry(task)
+                    logger.info(f"Worker {self.worker_id}: {task.endpoint} for token {task.token_id} deferred for {e.retry_after:.0f}s: {e}")
+                else:
+                    logger.error(f"Worker {self.worker_id}: Task {task.endpoint} for token {task.token_id} exhausted all deferrals: {e}")
+
             except Exception as e:
                 logger.error(f"Worker {self.worker_id}: Exception in task processing: {e}")
                 # Schedule retry for 429 errors
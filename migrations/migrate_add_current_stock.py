@@ -0,0 +1,74 @@
+"""
+Миграция: таблица актуальных остатков current_stock
+
+Таблица заполняется последним снимком из wb_stocks / ozon_stocks,
+дальше её обновляет collect_stocks при каждом сборе остатков.
+Запускать после migrate_ozon_add_article_size.py (нужны ozon_stocks.article/size_norm).
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS current_stock (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL REFERENCES tokens(id),
+    marketplace VARCHAR(50) NOT NULL,
+    wb_good_id INTEGER REFERENCES wb_goods(id),
+    product_id INTEGER REFERENCES products(id),
+    warehouse_id INTEGER REFERENCES warehouses(id),
+    article VARCHAR(200),
+    size_norm VARCHAR(50),
+    quantity INTEGER DEFAULT 0,
+    quantity_full INTEGER,
+    reserved INTEGER,
+    in_way_to_client INTEGER,
+    in_way_from_client INTEGER,
+    as_of TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_current_stock_token ON current_stock (token_id);
+CREATE INDEX IF NOT EXISTS idx_current_stock_wb_good ON current_stock (wb_good_id);
+CREATE INDEX IF NOT EXISTS idx_current_stock_token_article_size ON current_stock (token_id, article, size_norm);
+INSERT INTO current_stock (token_id, marketplace, wb_good_id, warehouse_id, quantity, quantity_full,
+                           in_way_to_client, in_way_from_client, as_of)
+SELECT s.token_id, 'wildberries', s.product_id, s.warehouse_id, s.quantity, s.quantity_full,
+       s.in_way_to_client, s.in_way_from_client, s.date
+FROM wb_stocks s
+JOIN (SELECT token_id, MAX(date) AS date FROM wb_stocks GROUP BY token_id) last
+    ON last.token_id = s.token_id AND last.date = s.date
+WHERE NOT EXISTS (SELECT 1 FROM current_stock c WHERE c.token_id = s.token_id);
+INSERT INTO current_stock (token_id, marketplace, product_id, warehouse_id, article, size_norm,
+                           quantity, reserved, as_of)
+SELECT s.token_id, 'ozon', s.product_id, s.warehouse_id, s.article, s.size_norm,
+       COALESCE(s.fbo_present, 0) + COALESCE(s.fbs_present, 0), COALESCE(s.fbo_reserved, 0) + COALESCE(s.fbs_reserved, 0), s.date
+FROM ozon_stocks s
+JOIN (SELECT token_id, MAX(date) AS date FROM ozon_stocks GROUP BY token_id) last
+    ON last.token_id = s.token_id AND last.date = s.date
+WHERE COALESCE(s.fbo_present, 0) + COALESCE(s.fbs_present, 0) > 0
+  AND NOT EXISTS (SELECT 1 FROM current_stock c WHERE c.token_id = s.token_id)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    print(f"SKIP: {statement[:60]}... ({e})")
+        conn.commit()
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,54 @@
+"""
+Миграция: таблица дневных итогов daily_token_totals и индекс ozon_orders по in_process_at
+
+После миграции нужно построить итоги по уже загруженным данным:
+    python -m datacollector.rollup
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS daily_token_totals (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL REFERENCES tokens(id),
+    marketplace VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    orders_count INTEGER DEFAULT 0,
+    orders_sum NUMERIC(14, 2) DEFAULT 0,
+    sales_count INTEGER DEFAULT 0,
+    sales_sum NUMERIC(14, 2) DEFAULT 0,
+    cancellations_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    CONSTRAINT uix_daily_token_totals_token_day UNIQUE (token_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_token_totals_day ON daily_token_totals (day);
+CREATE INDEX IF NOT EXISTS idx_ozon_orders_token_in_process ON ozon_orders (token_id, in_process_at)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    print(f"SKIP: {statement[:60]}... ({e})")
+        conn.commit()
+    print("\nМиграция завершена!")
+    print("Постройте итоги: python -m datacollector.rollup")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,64 @@
+"""
+Миграция: индекс кодов маркировки kiz_files / kiz_codes для поиска КИЗ
+
+Таблицы заполняет datacollector (фоновый поток раз в KIZ_INDEX_INTERVAL секунд)
+или ручной запуск:
+    python -m datacollector.kiz_index
+GIN pg_trgm по коду нужен для поиска по части кода маркировки; если расширение
+недоступно, индекс пропускается и поиск идёт без него.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS kiz_files (
+    id SERIAL PRIMARY KEY,
+    folder VARCHAR(255) NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    size BIGINT NOT NULL,
+    mtime DOUBLE PRECISION NOT NULL,
+    codes_count INTEGER DEFAULT 0,
+    indexed_at TIMESTAMP,
+    CONSTRAINT uix_kiz_files_folder_file UNIQUE (folder, file_name)
+);
+CREATE TABLE IF NOT EXISTS kiz_codes (
+    id SERIAL PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES kiz_files(id) ON DELETE CASCADE,
+    folder VARCHAR(255) NOT NULL,
+    line_number INTEGER NOT NULL,
+    code VARCHAR(512) NOT NULL,
+    gtin VARCHAR(14)
+);
+CREATE INDEX IF NOT EXISTS idx_kiz_codes_gtin_folder ON kiz_codes (gtin, folder);
+CREATE INDEX IF NOT EXISTS idx_kiz_codes_file ON kiz_codes (file_id);
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_kiz_codes_code_trgm ON kiz_codes USING gin (code gin_trgm_ops)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    conn.commit()
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"SKIP: {statement[:60]}... ({e})")
+    print("\nМиграция завершена!")
+    print("Постройте индекс: python -m datacollector.kiz_index")
+
+
+if __name__ == '__main__':
+    run_migration()
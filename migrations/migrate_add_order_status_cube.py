@@ -0,0 +1,61 @@
+"""
+Миграция: куб статусов заказов order_status_cube (токен x день x артикул x размер)
+
+Куб пересчитывается вместе с daily_token_totals. Страницы выкупов, расширение
+и выгрузка выкупов читают только куб, поэтому миграция сразу строит его (и
+daily_token_totals) по уже загруженным данным - это может занять несколько минут.
+Повторная перестройка:
+    python -m datacollector.rollup
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+from datacollector.rollup import rebuild_all
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS order_status_cube (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL REFERENCES tokens(id),
+    marketplace VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    article VARCHAR(200) NOT NULL DEFAULT '',
+    size_norm VARCHAR(50) NOT NULL DEFAULT '',
+    ordered_count INTEGER DEFAULT 0,
+    ordered_sum NUMERIC(14, 2) DEFAULT 0,
+    delivered_count INTEGER DEFAULT 0,
+    delivered_sum NUMERIC(14, 2) DEFAULT 0,
+    cancelled_count INTEGER DEFAULT 0,
+    delivering_count INTEGER DEFAULT 0,
+    CONSTRAINT uix_order_status_cube_key UNIQUE (token_id, day, article, size_norm)
+);
+CREATE INDEX IF NOT EXISTS idx_order_status_cube_article ON order_status_cube (article, size_norm, day);
+CREATE INDEX IF NOT EXISTS idx_order_status_cube_day ON order_status_cube (day)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    print(f"SKIP: {statement[:60]}... ({e})")
+        conn.commit()
+
+    print("\nПостроение куба по загруженным данным...")
+    rebuild_all(engine)
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
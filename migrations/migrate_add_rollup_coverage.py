@@ -0,0 +1,46 @@
+"""
+Миграция: покрытие rollup по токенам rollup_coverage
+
+Итоги токена (daily_token_totals, order_status_cube) читаются из rollup только
+с covered_from; до перестройки истории страницы считают по сырым таблицам.
+Покрытие записывает перестройка:
+    python -m datacollector.rollup
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS rollup_coverage (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL UNIQUE REFERENCES tokens(id),
+    covered_from DATE NOT NULL,
+    rebuilt_at TIMESTAMP
+)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    print(f"SKIP: {statement[:60]}... ({e})")
+        conn.commit()
+    print("\nМиграция завершена!")
+    print("Постройте итоги: python -m datacollector.rollup")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,59 @@
+"""
+Миграция: таблица группировки артикулов WB wb_article_groups
+
+Запускать после migrate_add_current_stock.py. Таблица заполняется здесь
+из current_stock, дальше её пересчитывают collect_stocks / collect_goods.
+Полная перестройка: python -m datacollector.article_groups
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE TABLE IF NOT EXISTS wb_article_groups (
+    id SERIAL PRIMARY KEY,
+    token_id INTEGER NOT NULL REFERENCES tokens(id),
+    my_article VARCHAR(4) NOT NULL,
+    imt_id BIGINT NOT NULL,
+    vendor_code VARCHAR(200) NOT NULL,
+    stock INTEGER DEFAULT 0,
+    updated_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_wb_article_groups_order ON wb_article_groups (my_article, imt_id, vendor_code);
+CREATE INDEX IF NOT EXISTS idx_wb_article_groups_token ON wb_article_groups (token_id);
+CREATE INDEX IF NOT EXISTS idx_wb_article_groups_vendor_code ON wb_article_groups (vendor_code);
+INSERT INTO wb_article_groups (token_id, my_article, imt_id, vendor_code, stock, updated_at)
+SELECT s.token_id, LEFT(g.vendor_code, 4), g.imt_id, g.vendor_code, SUM(s.quantity), NOW()
+FROM current_stock s
+JOIN wb_goods g ON g.id = s.wb_good_id
+WHERE g.imt_id IS NOT NULL
+  AND g.vendor_code IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM wb_article_groups)
+GROUP BY s.token_id, g.imt_id, g.vendor_code
+HAVING SUM(s.quantity) > 0
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    print(f"SKIP: {statement[:60]}... ({e})")
+        conn.commit()
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,87 @@
+"""
+Миграция: колонки article/size_norm в ozon_orders и ozon_stocks
+
+Колонки заполняются коллектором при записи, уже загруженные строки
+заполняются здесь порциями по id (повторный запуск продолжает с незаполненных).
+Индексы (token_id, article, size_norm) создаются после заполнения.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+from app.services.offer_utils import split_offer_id
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+# Строк в одной порции заполнения
+CHUNK_SIZE = 5000
+
+columns_sql = """
+ALTER TABLE ozon_orders ADD COLUMN IF NOT EXISTS article VARCHAR(200);
+ALTER TABLE ozon_orders ADD COLUMN IF NOT EXISTS size_norm VARCHAR(50);
+ALTER TABLE ozon_stocks ADD COLUMN IF NOT EXISTS article VARCHAR(200);
+ALTER TABLE ozon_stocks ADD COLUMN IF NOT EXISTS size_norm VARCHAR(50)
+"""
+
+indexes_sql = """
+CREATE INDEX IF NOT EXISTS idx_ozon_orders_token_article_size ON ozon_orders (token_id, article, size_norm);
+CREATE INDEX IF NOT EXISTS idx_ozon_stocks_token_article_size ON ozon_stocks (token_id, article, size_norm)
+"""
+
+
+def execute_statements(conn, sql):
+    for statement in sql.strip().split(';'):
+        statement = statement.strip()
+        if statement and not statement.startswith('--'):
+            try:
+                conn.execute(text(statement))
+                print(f"OK: {statement[:60]}...")
+            except Exception as e:
+                print(f"SKIP: {statement[:60]}... ({e})")
+    conn.commit()
+
+
+def backfill(conn, table):
+    """Заполнить article/size_norm порциями по CHUNK_SIZE строк"""
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(text(
+            f"SELECT id, offer_id FROM {table} "
+            f"WHERE id > :last_id AND article IS NULL ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': CHUNK_SIZE}).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for row_id, offer_id in rows:
+            article, size_norm = split_offer_id(offer_id or '')
+            params.append({'id': row_id, 'article': article, 'size_norm': size_norm})
+
+        conn.execute(text(
+            f"UPDATE {table} SET article = :article, size_norm = :size_norm WHERE id = :id"
+        ), params)
+        conn.commit()
+
+        last_id = rows[-1][0]
+        total += len(rows)
+        print(f"  {table}: заполнено {total} строк")
+
+    print(f"OK: {table} - всего {total} строк")
+
+
+def run_migration():
+    with engine.connect() as conn:
+        execute_statements(conn, columns_sql)
+        backfill(conn, 'ozon_orders')
+        backfill(conn, 'ozon_stocks')
+        execute_statements(conn, indexes_sql)
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
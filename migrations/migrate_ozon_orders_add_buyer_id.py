@@ -0,0 +1,51 @@
+"""
+Миграция: колонка buyer_id в ozon_orders (первое число posting_number)
+
+Колонка заполняется коллектором при записи, уже загруженные заказы
+заполняются здесь порциями по диапазонам id. Индекс (buyer_id, in_process_at)
+создаётся после заполнения.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+# Диапазон id в одной порции заполнения
+CHUNK_SIZE = 20000
+
+
+def run_migration():
+    with engine.connect() as conn:
+        conn.execute(text("ALTER TABLE ozon_orders ADD COLUMN IF NOT EXISTS buyer_id VARCHAR(50)"))
+        conn.commit()
+        print("OK: ALTER TABLE ozon_orders ADD COLUMN buyer_id")
+
+        min_id, max_id = conn.execute(text("SELECT MIN(id), MAX(id) FROM ozon_orders")).one()
+        if min_id is not None:
+            total = 0
+            for start in range(min_id, max_id + 1, CHUNK_SIZE):
+                result = conn.execute(text(
+                    "UPDATE ozon_orders SET buyer_id = LEFT(split_part(posting_number, '-', 1), 50) "
+                    "WHERE id >= :start AND id < :end AND buyer_id IS NULL"
+                ), {'start': start, 'end': start + CHUNK_SIZE})
+                conn.commit()
+                total += result.rowcount
+                print(f"  ozon_orders: id до {start + CHUNK_SIZE}, заполнено {total}")
+
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_ozon_orders_buyer_in_process ON ozon_orders (buyer_id, in_process_at)"
+        ))
+        conn.commit()
+        print("OK: CREATE INDEX idx_ozon_orders_buyer_in_process")
+
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
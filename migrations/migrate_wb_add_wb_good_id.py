@@ -0,0 +1,90 @@
+"""
+Миграция: колонка wb_good_id в wb_orders и wb_sales, tech_size в wb_sales
+
+Колонки заполняются коллектором при записи, уже загруженные строки
+заполняются здесь порциями по диапазонам id:
+- заказы - по своему штрихкоду (wb_goods.barcode);
+- продажи - из заказа с тем же srid (у продажи штрихкод не хранится).
+Индексы (token_id, wb_good_id) создаются после заполнения.
+Повторный запуск заполняет только строки с пустым wb_good_id.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+# Диапазон id в одной порции заполнения
+CHUNK_SIZE = 20000
+
+columns_sql = """
+ALTER TABLE wb_orders ADD COLUMN IF NOT EXISTS wb_good_id INTEGER REFERENCES wb_goods(id);
+ALTER TABLE wb_sales ADD COLUMN IF NOT EXISTS wb_good_id INTEGER REFERENCES wb_goods(id);
+ALTER TABLE wb_sales ADD COLUMN IF NOT EXISTS tech_size VARCHAR(50)
+"""
+
+indexes_sql = """
+CREATE INDEX IF NOT EXISTS idx_wb_orders_token_wb_good ON wb_orders (token_id, wb_good_id);
+CREATE INDEX IF NOT EXISTS idx_wb_sales_token_wb_good ON wb_sales (token_id, wb_good_id)
+"""
+
+orders_sql = """
+UPDATE wb_orders o SET wb_good_id = g.id
+FROM wb_goods g
+WHERE g.barcode = o.barcode
+  AND o.id >= :start AND o.id < :end AND o.wb_good_id IS NULL
+"""
+
+sales_sql = """
+UPDATE wb_sales s SET wb_good_id = o.wb_good_id, tech_size = COALESCE(s.tech_size, o.tech_size)
+FROM wb_orders o
+WHERE o.srid = s.srid AND o.wb_good_id IS NOT NULL
+  AND s.id >= :start AND s.id < :end AND s.wb_good_id IS NULL
+"""
+
+
+def execute_statements(conn, sql):
+    for statement in sql.strip().split(';'):
+        statement = statement.strip()
+        if statement and not statement.startswith('--'):
+            try:
+                conn.execute(text(statement))
+                print(f"OK: {statement[:60]}...")
+            except Exception as e:
+                print(f"SKIP: {statement[:60]}... ({e})")
+    conn.commit()
+
+
+def backfill(conn, table, sql):
+    """Заполнить строки таблицы порциями по диапазонам id"""
+    min_id, max_id = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).one()
+    if min_id is None:
+        return
+
+    total = 0
+    for start in range(min_id, max_id + 1, CHUNK_SIZE):
+        result = conn.execute(text(sql), {'start': start, 'end': start + CHUNK_SIZE})
+        conn.commit()
+        total += result.rowcount
+        print(f"  {table}: id до {start + CHUNK_SIZE}, заполнено {total}")
+
+    print(f"OK: {table} - всего {total} строк")
+
+
+def run_migration():
+    with engine.connect() as conn:
+        execute_statements(conn, columns_sql)
+        # Продажи берут wb_good_id из заказов, поэтому заказы заполняются первыми
+        backfill(conn, 'wb_orders', orders_sql)
+        backfill(conn, 'wb_sales', sales_sql)
+        execute_statements(conn, indexes_sql)
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,45 @@
+"""
+Миграция: индексы поиска карточек wb_goods (страницы маркировки)
+
+- lower(vendor_code), barcode, gtin с text_pattern_ops - поиск по началу строки (LIKE 'abc%');
+- GIN pg_trgm по lower(vendor_code) - поиск подстроки артикула (LIKE '%abc%').
+Если расширение pg_trgm недоступно, trigram-индекс пропускается:
+поиск подстроки продолжит работать, но без индекса.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from config import Config
+
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+migration_sql = """
+CREATE INDEX IF NOT EXISTS idx_wb_goods_vendor_code_lower_pattern ON wb_goods (lower(vendor_code) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_wb_goods_barcode_pattern ON wb_goods (barcode text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_wb_goods_gtin_pattern ON wb_goods (gtin text_pattern_ops);
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_wb_goods_vendor_code_trgm ON wb_goods USING gin (lower(vendor_code) gin_trgm_ops)
+"""
+
+
+def run_migration():
+    with engine.connect() as conn:
+        for statement in migration_sql.strip().split(';'):
+            statement = statement.strip()
+            if statement and not statement.startswith('--'):
+                try:
+                    conn.execute(text(statement))
+                    conn.commit()
+                    print(f"OK: {statement[:60]}...")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"SKIP: {statement[:60]}... ({e})")
+    print("\nМиграция завершена!")
+
+
+if __name__ == '__main__':
+    run_migration()
@@ -5,11 +5,61 @@
 
 const API_BASE = 'http://192.168.0.66:5000/api/extension';
 
+/**
+ * Разбор компактного списка артикулов: строка "<длина общего префикса>:<остаток>"
+ */
+function decodeFrontCoded(text) {
+  const articles = [];
+  let previous = '';
+  if (!text) return articles;
+
+  text.split('\n').forEach(line => {
+    const sep = line.indexOf(':');
+    const prefix = parseInt(line.slice(0, sep), 10) || 0;
+    previous = previous.slice(0, prefix) + line.slice(sep + 1);
+    articles.push(previous);
+  });
+  return articles;
+}
+
+/**
+ * Список артикулов с локальным кешем в chrome.storage.
+ * Если кеш есть, запрашиваются только артикулы, добавленные после его версии.
+ */
+async function fetchArticles() {
+  const stored = await chrome.storage.local.get(['articlesVersion', 'articles']);
+  const hasCache = Array.isArray(stored.articles) && stored.articlesVersion !== undefined;
+
+  let url = `${API_BASE}/articles?format=compact`;
+  if (hasCache) {
+    url += `&since=${stored.articlesVersion}`;
+  }
+
+  const response = await fetch(url);
+  const data = await response.json();
+  if (!data.success) return data;
+
+  const received = data.encoding === 'front-coded' ? decodeFrontCoded(data.articles) : data.articles;
+
+  let articles = received;
+  if (data.delta && hasCache) {
+    articles = stored.articles;
+    if (received.length > 0) {
+      articles = Array.from(new Set([...stored.articles, ...received]));
+    }
+  }
+
+  if (!hasCache || data.version !== stored.articlesVersion) {
+    await chrome.storage.local.set({ articlesVersion: data.version, articles });
+  }
+
+  return { success: true, articles, count: articles.length, version: data.version };
+}
+
 // Обработка сообщений от content script
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
   if (request.action === 'fetchArticles') {
-    fetch(`${API_BASE}/articles`)
-      .then(response => response.json())
+    fetchArticles()
       .then(data => sendResponse(data))
       .catch(error => sendResponse({ success: false, error: error.message }));
     return true; // Указываем, что ответ будет асинхронным
@@ -36,6 +86,20 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
       .catch(error => sendResponse({ success: false, error: error.message }));
     return true;
   }
+
+  if (request.action === 'fetchProductInfoBatch') {
+    const { marketplace, items } = request;
+
+    fetch(`${API_BASE}/product-info/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ marketplace, items })
+    })
+      .then(response => response.json())
+      .then(data => sendResponse(data))
+      .catch(error => sendResponse({ success: false, error: error.message }));
+    return true;
+  }
 });
 
 console.log('[MarketPlacer Extension] Background service worker started');
@@ -30,7 +30,9 @@
     // Задержка перед показом тултипа (мс)
     HOVER_DELAY: 300,
     // Интервал сканирования новых элементов (мс)
-    SCAN_INTERVAL: 2000
+    SCAN_INTERVAL: 2000,
+    // Максимум товаров в одном пакетном запросе (как BATCH_MAX_ITEMS на сервере)
+    BATCH_SIZE: 200
   };
 
   // Кеш артикулов из базы
@@ -45,6 +47,56 @@
   // Кеш данных о товарах
   const productDataCache = new Map();
 
+  // Пакетные запросы в работе: cacheKey -> Promise
+  const pendingBatches = new Map();
+
+  /**
+   * Ключ кеша данных о товаре
+   */
+  function productCacheKey(article, size) {
+    return MARKETPLACE === 'ozon' ? `ozon:${article}/${size}` : `wb:${article}`;
+  }
+
+  /**
+   * Предзагрузка данных о товарах страницы одним запросом (через background script)
+   */
+  function prefetchProductInfo(parsedItems) {
+    const items = [];
+    const keys = new Set();
+
+    parsedItems.forEach(parsed => {
+      const key = productCacheKey(parsed.article, parsed.size);
+      if (productDataCache.has(key) || pendingBatches.has(key) || keys.has(key)) return;
+      keys.add(key);
+      items.push({ article: parsed.article, size: parsed.size || '' });
+    });
+
+    for (let i = 0; i < items.length; i += CONFIG.BATCH_SIZE) {
+      const chunk = items.slice(i, i + CONFIG.BATCH_SIZE);
+      const chunkKeys = chunk.map(item => productCacheKey(item.article, item.size));
+
+      const request = chrome.runtime.sendMessage({
+        action: 'fetchProductInfoBatch',
+        marketplace: MARKETPLACE,
+        items: chunk
+      }).then(data => {
+        if (data && data.success && data.items) {
+          data.items.forEach(item => {
+            if (item.success) {
+              productDataCache.set(productCacheKey(item.article, item.size), item);
+            }
+          });
+        }
+      }).catch(error => {
+        console.error('[MarketPlacer Extension] Ошибка пакетного запроса:', error);
+      }).finally(() => {
+        chunkKeys.forEach(key => pendingBatches.delete(key));
+      });
+
+      chunkKeys.forEach(key => pendingBatches.set(key, request));
+    }
+  }
+
   /**
    * Загрузка списка артикулов из API (через background script)
    */
@@ -120,7 +172,12 @@
    * Получение данных о товаре OZON (через background script)
    */
   async function getOzonProductInfo(article, size) {
-    const cacheKey = `ozon:${article}/${size}`;
+    const cacheKey = productCacheKey(article, size);
+
+    // Ждём пакетный запрос, если товар уже в нём
+    if (pendingBatches.has(cacheKey)) {
+      await pendingBatches.get(cacheKey);
+    }
 
     // Проверяем кеш
     if (productDataCache.has(cacheKey)) {
@@ -150,7 +207,12 @@
    * Получение данных о товаре WB (через background script)
    */
   async function getWBProductInfo(article, size) {
-    const cacheKey = `wb:${article}`;
+    const cacheKey = productCacheKey(article, size);
+
+    // Ждём пакетный запрос, если товар уже в нём
+    if (pendingBatches.has(cacheKey)) {
+      await pendingBatches.get(cacheKey);
+    }
 
     // Проверяем кеш
     if (productDataCache.has(cacheKey)) {
@@ -415,15 +477,15 @@
     const text = node.textContent.trim();
     const parsed = parseArticle(text);
 
-    if (!parsed) return;
-    if (!isKnownArticle(parsed.article)) return;
+    if (!parsed) return null;
+    if (!isKnownArticle(parsed.article)) return null;
 
     // Находим родительский элемент
     const parent = node.parentElement;
-    if (!parent) return;
+    if (!parent) return null;
 
     // Проверяем, не обработан ли уже
-    if (parent._mpProcessed) return;
+    if (parent._mpProcessed) return null;
 
     // Помечаем элемент
     parent._mpProcessed = true;
@@ -434,6 +496,8 @@
     parent.addEventListener('mouseenter', handleMouseEnter);
     parent.addEventListener('mouseleave', handleMouseLeave);
     parent.addEventListener('mousemove', handleMouseMove);
+
+    return parsed;
   }
 
   /**
@@ -481,7 +545,12 @@
       nodesToProcess.push(walker.currentNode);
     }
 
-    nodesToProcess.forEach(processTextNode);
+    const found = nodesToProcess.map(processTextNode).filter(Boolean);
+
+    // Данные по всем новым артикулам страницы - одним запросом
+    if (found.length > 0) {
+      prefetchProductInfo(found);
+    }
   }
 
   /**